@@ -42,10 +42,16 @@ INSTALLED_APPS = [
     'rest_framework.authtoken',
     'rest_framework',
     'core',
-    'user'
+    'user',
+    'operation',
+    'statement',
+    'benchmark',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.ProfilingMiddleware',
+    'core.middleware.SlowQueryMiddleware',
+    'core.middleware.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -53,6 +59,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'app.urls'
@@ -89,6 +96,121 @@ DATABASES = {
     }
 }
 
+# Read replicas of the default database, from the comma separated hosts in
+# DB_REPLICA_HOSTS. Pointing one at DB_HOST tries the routing out locally.
+
+REPLICA_DATABASES = []
+for host in filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(',')):
+    alias = f'replica{len(REPLICA_DATABASES) + 1}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASES.append(alias)
+
+# Databases holding the data of users, each user on the one the shard map
+# places it. DB_SHARDS adds databases, from comma separated names on
+# DB_HOST. New shards go last: the ids of a shard start at its index times
+# core.sharding.SHARD_ID_RANGE.
+
+SHARD_DATABASES = ['default']
+for name in filter(None, os.environ.get('DB_SHARDS', '').split(',')):
+    alias = f'shard{len(SHARD_DATABASES)}'
+    DATABASES[alias] = {**DATABASES['default'], 'NAME': name}
+    SHARD_DATABASES.append(alias)
+
+# Seconds the shard map of a user is kept in the default cache
+SHARD_MAP_CACHE_SECONDS = 30
+
+DATABASE_ROUTERS = [
+    'core.routers.ShardRouter',
+    'core.routers.ReplicaRouter',
+]
+
+# Seconds during which the reads of a client that wrote go to the primary,
+# kept in the default cache, which should be shared when there are
+# replicas
+REPLICA_PIN_SECONDS = 10
+
+# Range partition the operations by month of their date, see
+# core.partitions. This needs PostgreSQL 11 or later, so it is off unless
+# OPERATION_PARTITIONING is set when migrating or running the
+# operation_partitions command, which keeps partitions created
+# OPERATION_PARTITION_MONTHS_AHEAD months ahead.
+
+OPERATION_PARTITIONING = bool(os.environ.get('OPERATION_PARTITIONING'))
+OPERATION_PARTITION_MONTHS_AHEAD = 3
+
+# Operations dated before the month this many months back are moved to the
+# archive by archive_operations, see core.archive
+ARCHIVE_AFTER_MONTHS = 12
+
+# Queries run by requests for SLOW_QUERY_SECONDS or more are kept, the last
+# SLOW_QUERY_LOG_SIZE of each process, with the plan of a sampled
+# SLOW_QUERY_EXPLAIN_RATE of them, see core.slowqueries
+SLOW_QUERY_SECONDS = float(os.environ.get('SLOW_QUERY_SECONDS', 0.1))
+SLOW_QUERY_EXPLAIN_RATE = float(
+    os.environ.get('SLOW_QUERY_EXPLAIN_RATE', 0.1)
+)
+SLOW_QUERY_LOG_SIZE = 200
+
+# Seconds the reports of profiled requests are kept in the default cache,
+# which should be shared between the processes of the server for their
+# URL to work from any of them, see core.profiling
+PROFILE_REPORT_TTL = 60 * 60
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+# List responses are cached in each process unless RESPONSE_CACHE_BACKEND
+# names a shared backend, such as memcached, at RESPONSE_CACHE_LOCATION
+
+RESPONSE_CACHE_TIMEOUT = 5 * 60
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'responses',
+        'TIMEOUT': RESPONSE_CACHE_TIMEOUT,
+        'OPTIONS': {'MAX_ENTRIES': 2000},
+    },
+}
+if os.environ.get('RESPONSE_CACHE_BACKEND'):
+    CACHES['responses'] = {
+        'BACKEND': os.environ['RESPONSE_CACHE_BACKEND'],
+        'LOCATION': os.environ.get('RESPONSE_CACHE_LOCATION', ''),
+        'TIMEOUT': RESPONSE_CACHE_TIMEOUT,
+    }
+
+# Bytes above which a response is not cached, so a local cache holds at
+# most MAX_ENTRIES times this much
+RESPONSE_CACHE_MAX_ITEM_SIZE = 128 * 1024
+
+# Users of API tokens are cached for TOKEN_CACHE_TIMEOUT seconds. Deleted
+# tokens and saved users are dropped from the cache at once, but only from
+# the cache of the process that did it unless TOKEN_CACHE_BACKEND names a
+# shared backend at TOKEN_CACHE_LOCATION
+
+TOKEN_CACHE_TIMEOUT = 60
+
+CACHES['tokens'] = {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'tokens',
+    'TIMEOUT': TOKEN_CACHE_TIMEOUT,
+    'OPTIONS': {'MAX_ENTRIES': 10000},
+}
+if os.environ.get('TOKEN_CACHE_BACKEND'):
+    CACHES['tokens'] = {
+        'BACKEND': os.environ['TOKEN_CACHE_BACKEND'],
+        'LOCATION': os.environ.get('TOKEN_CACHE_LOCATION', ''),
+        'TIMEOUT': TOKEN_CACHE_TIMEOUT,
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -134,3 +256,13 @@ STATIC_URL = '/static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'core.User'
+
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': (
+        'user.authentication.CachedTokenAuthentication',
+    ),
+}
+
+# Seconds during which a create request retried with the same
+# Idempotency-Key header replays the stored response
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
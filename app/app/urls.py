@@ -1,8 +1,17 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from core import views as core_views
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/user/', include('user.urls')),
     path('api/operation/', include('operation.urls')),
+    path('api/statement/', include('statement.urls')),
+    path('healthz', core_views.healthz, name='healthz'),
+    path('readyz', core_views.readyz, name='readyz'),
+    path('metrics', core_views.metrics, name='metrics'),
+    path('slow-queries', core_views.slow_queries, name='slow-queries'),
+    path('profiles/<str:report_id>', core_views.profile_report,
+         name='profile-report'),
 ]
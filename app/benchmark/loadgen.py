@@ -0,0 +1,127 @@
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import router, transaction
+
+from core.models import Account, AccountType, Operation, Tag
+from core.versions import bump_version
+
+from operation.bulk import insert_operations
+
+
+MERCHANTS = (
+    'Supermarket', 'Bakery', 'Coffee shop', 'Pharmacy', 'Gas station',
+    'Restaurant', 'Bookstore', 'Cinema', 'Electricity', 'Water',
+    'Internet', 'Rent', 'Salary', 'Insurance', 'Gym', 'Taxi', 'Airline',
+    'Hotel', 'Hardware store', 'Pet shop',
+)
+TAG_NAMES = (
+    'Food', 'Home', 'Transport', 'Health', 'Leisure', 'Bills', 'Travel',
+    'Work', 'Gifts', 'Education',
+)
+ACCOUNT_TYPES = ('Checking', 'Savings', 'Credit card')
+# Number of tags of an operation, picked uniformly from these
+TAG_COUNTS = (0, 0, 1, 1, 1, 2, 3)
+
+
+def load_user(email, password_hash):
+    """Return the user with email, creating it with a hashed password"""
+    user_model = get_user_model()
+    user = user_model.objects.filter(email=email).first()
+    if user is None:
+        # Saving rather than bulk inserting places the user on a shard
+        user = user_model(email=email, name=email.split('@')[0])
+        user.password = password_hash
+        user.save()
+    return user
+
+
+def generate_user_data(user, rng, accounts, tags, operations, days,
+                       batch_size=1000, today=None):
+    """
+    Give a user accounts, tags and operations with random tags
+
+    Operations are spread over the last `days` days and inserted with the
+    bulk insert of the API, batch_size at a time, so the stored balances
+    and data version are kept as they would be. The data version is also
+    bumped for the accounts, account types and tags. Return the number of
+    inserted operations.
+    """
+    today = today or date.today()
+    using = router.db_for_write(Operation, instance=user)
+    with transaction.atomic(using=using):
+        AccountType.objects.using(using).bulk_create(
+            AccountType(user=user, name=name) for name in ACCOUNT_TYPES
+        )
+        acctypes = list(AccountType.objects.using(using).filter(
+            user=user
+        ).values_list('id', flat=True))
+        Account.objects.using(using).bulk_create(
+            Account(
+                user=user,
+                name=f'Account {index + 1}',
+                acctype_id=rng.choice(acctypes)
+            )
+            for index in range(accounts)
+        )
+        Tag.objects.using(using).bulk_create(
+            Tag(user=user, name=f'{TAG_NAMES[index % len(TAG_NAMES)]} '
+                                f'{index // len(TAG_NAMES) + 1}')
+            for index in range(tags)
+        )
+        # bulk_create skips the save() that bumps the data version
+        bump_version(user.pk, using)
+    account_ids = list(Account.objects.using(using).filter(
+        user=user
+    ).values_list('id', flat=True))
+    tag_ids = list(Tag.objects.using(using).filter(
+        user=user
+    ).values_list('id', flat=True))
+
+    inserted = 0
+    while inserted < operations:
+        rows = []
+        for _ in range(min(batch_size, operations - inserted)):
+            merchant = rng.choice(MERCHANTS)
+            rows.append({
+                'name': f'{merchant} {rng.randint(1, 500)}',
+                'description': merchant if rng.random() < 0.3 else '',
+                'value': Decimal(rng.randint(-50000, 50000)) / 100,
+                'date': today - timedelta(days=rng.randrange(days)),
+                'account': rng.choice(account_ids),
+                'tags': rng.sample(
+                    tag_ids, min(rng.choice(TAG_COUNTS), len(tag_ids))
+                ),
+            })
+        with transaction.atomic(using=using):
+            insert_operations(user, rows, using)
+        inserted += len(rows)
+
+    return inserted
+
+
+def generate_data(users, accounts, tags, operations, days, password,
+                  seed=None, email='loadgen{}@example.com', batch_size=1000,
+                  progress=None):
+    """
+    Generate the data of `users` users, the same for the same seed
+
+    email is formatted with the index of each user. Users that already
+    exist get more data. progress, when given, is called with each user
+    and its number of operations. Return the total of operations.
+    """
+    rng = random.Random(seed)
+    password_hash = make_password(password)
+    total = 0
+    for index in range(users):
+        user = load_user(email.format(index), password_hash)
+        count = generate_user_data(
+            user, rng, accounts, tags, operations, days, batch_size
+        )
+        total += count
+        if progress is not None:
+            progress(user, count)
+    return total
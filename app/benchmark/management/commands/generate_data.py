@@ -0,0 +1,67 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from benchmark.loadgen import generate_data
+
+
+class Command(BaseCommand):
+    """Django command to generate data to measure the API against"""
+    help = (
+        'Create users with accounts, tags and operations with random tags, '
+        'the same for the same --seed'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument(
+            '--accounts', type=int, default=3, help='Accounts per user'
+        )
+        parser.add_argument(
+            '--tags', type=int, default=10, help='Tags per user'
+        )
+        parser.add_argument(
+            '--operations',
+            type=int,
+            default=10000,
+            help='Operations per user'
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=730,
+            help='Operations are dated within this many days back'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--email',
+            default='loadgen{}@example.com',
+            help='Email of the users, formatted with their index'
+        )
+        parser.add_argument('--password', default='loadgen-pass')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        def progress(user, count):
+            self.stdout.write(f'{user.email}: {count} operations')
+
+        total = generate_data(
+            options['users'],
+            options['accounts'],
+            options['tags'],
+            options['operations'],
+            options['days'],
+            options['password'],
+            seed=options['seed'],
+            email=options['email'],
+            batch_size=options['batch_size'],
+            progress=progress
+        )
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {total} operations for {options["users"]} users in '
+            f'{elapsed:.2f}s ({total / max(elapsed, 1e-9):.0f} rows/s)'
+        ))
@@ -0,0 +1,116 @@
+import json
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from rest_framework.authtoken.models import Token
+
+from benchmark.runner import (ClientSender, HTTPSender, build_scenarios,
+                              run_benchmark)
+
+
+class Command(BaseCommand):
+    """Django command to measure the latency of every API route"""
+    help = (
+        'Drive every route of the operation and user APIs and report '
+        'latency percentiles, throughput and query counts as JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--email',
+            default='loadgen0@example.com',
+            help='User whose data is read, as made by generate_data'
+        )
+        parser.add_argument('--password', default='loadgen-pass')
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=100,
+            help='Requests per scenario'
+        )
+        parser.add_argument('--concurrency', type=int, default=1)
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=0,
+            help='Requests per scenario sent before measuring'
+        )
+        parser.add_argument(
+            '--url',
+            help='Base URL of a running server to send the requests to, '
+                 'instead of the test client, which counts queries'
+        )
+        parser.add_argument(
+            '--host',
+            help='Host of the test client requests, the first of '
+                 'ALLOWED_HOSTS by default'
+        )
+        parser.add_argument(
+            '--scenario',
+            action='append',
+            help='Only run the scenarios with these names'
+        )
+        parser.add_argument('--output', help='File to write the report to')
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.filter(email=options['email']).first()
+        if user is None:
+            raise CommandError(
+                f'User {options["email"]} not found, run generate_data first'
+            )
+        try:
+            scenarios = build_scenarios(user, options['password'])
+        except ValueError as error:
+            raise CommandError(str(error))
+        if options['scenario']:
+            scenarios = [
+                scenario for scenario in scenarios
+                if scenario.name in options['scenario']
+            ]
+
+        token, _ = Token.objects.get_or_create(user=user)
+        if options['url']:
+            send = HTTPSender(token.key, options['url'])
+        else:
+            host = options['host'] or next(
+                (host for host in settings.ALLOWED_HOSTS if host != '*'),
+                'localhost'
+            )
+            send = ClientSender(token.key, host)
+
+        def progress(result):
+            self.stderr.write(
+                f'{result["name"]}: p50 {result["p50_ms"]}ms, '
+                f'p99 {result["p99_ms"]}ms'
+            )
+
+        report = {
+            'started': datetime.now(timezone.utc).isoformat(),
+            'target': options['url'] or 'test client',
+            'database': connections[DEFAULT_DB_ALIAS].vendor,
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'warmup': options['warmup'],
+            'scenarios': run_benchmark(
+                send,
+                scenarios,
+                options['requests'],
+                options['concurrency'],
+                options['warmup'],
+                progress=progress
+            ),
+        }
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output + '\n')
+            self.stdout.write(self.style.SUCCESS(
+                f'Wrote the report to {options["output"]}'
+            ))
+        else:
+            self.stdout.write(output)
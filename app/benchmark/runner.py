@@ -0,0 +1,300 @@
+import json
+import math
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from datetime import date
+
+from django.conf import settings
+from django.db import connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver, reverse
+
+from core.models import Account, AccountType, Operation, Tag
+from core.sharding import acting_for
+
+
+# Namespaces whose every route is benchmarked
+NAMESPACES = ('operation', 'user')
+# Operations written by the benchmark get this date, so they can be told
+# apart from the generated ones and deleted by the last scenario
+WRITE_DATE = date(1999, 1, 1)
+
+Scenario = namedtuple('Scenario', 'name route method path data')
+Result = namedtuple('Result', 'seconds status queries cache_hit')
+
+
+def api_routes():
+    """Return the names of the routes of NAMESPACES, as namespace:name"""
+    resolver = get_resolver()
+    routes = set()
+    for namespace in NAMESPACES:
+        names = resolver.namespace_dict[namespace][1].reverse_dict
+        routes.update(
+            f'{namespace}:{name}' for name in names if isinstance(name, str)
+        )
+    return routes
+
+
+def build_scenarios(user, password):
+    """
+    Return the scenarios of the benchmark, for the data of user
+
+    Every route of NAMESPACES is read at least once, and the routes that
+    write are also written to. Reads go first. Writes only touch
+    operations dated WRITE_DATE, which the last scenario deletes, and
+    accounts, types and tags named after the run, so runs can be repeated
+    on the same data.
+    """
+    with acting_for(user.pk):
+        account = Account.objects.filter(user=user).order_by('pk').first()
+        acctype = AccountType.objects.filter(user=user).order_by('pk').first()
+        tag = Tag.objects.filter(user=user).order_by('pk').first()
+        operation = Operation.objects.filter(user=user).order_by(
+            '-date', '-pk'
+        ).first()
+    if None in (account, acctype, tag, operation):
+        raise ValueError(
+            f'User {user.email} needs accounts, account types, tags and '
+            f'operations, run generate_data first'
+        )
+
+    run = uuid.uuid4().hex[:8]
+
+    def url(route, *args):
+        return reverse(route, args=args)
+
+    def written(route):
+        return f'{url(route)}?year={WRITE_DATE.year}'
+
+    def new_operation(index):
+        return {
+            'name': f'Benchmark {index}',
+            'value': '-1.00',
+            'date': WRITE_DATE.isoformat(),
+            'account': account.pk,
+            'tags': [tag.pk],
+        }
+
+    this_year = {'year': date.today().year}
+    return [
+        Scenario('api-root', 'operation:api-root', 'get',
+                 url('operation:api-root'), None),
+        Scenario('accounttype-list', 'operation:accounttype-list', 'get',
+                 url('operation:accounttype-list'), None),
+        Scenario('accounttype-detail', 'operation:accounttype-detail', 'get',
+                 url('operation:accounttype-detail', acctype.pk), None),
+        Scenario('account-list', 'operation:account-list', 'get',
+                 url('operation:account-list'), None),
+        Scenario('account-detail', 'operation:account-detail', 'get',
+                 url('operation:account-detail', account.pk), None),
+        Scenario('tag-list', 'operation:tag-list', 'get',
+                 url('operation:tag-list'), None),
+        Scenario('tag-detail', 'operation:tag-detail', 'get',
+                 url('operation:tag-detail', tag.pk), None),
+        Scenario('operation-list', 'operation:operation-list', 'get',
+                 url('operation:operation-list'), None),
+        Scenario('operation-list-month', 'operation:operation-list', 'get',
+                 url('operation:operation-list'),
+                 {**this_year, 'month': date.today().month}),
+        Scenario('operation-list-search', 'operation:operation-list', 'get',
+                 url('operation:operation-list'), {'q': 'supermarket'}),
+        Scenario('operation-detail', 'operation:operation-detail', 'get',
+                 url('operation:operation-detail', operation.pk), None),
+        Scenario('account-balance', 'operation:operation-account-balance',
+                 'get', url('operation:operation-account-balance',
+                            account.pk), None),
+        Scenario('account-balance-year',
+                 'operation:operation-account-balance', 'get',
+                 url('operation:operation-account-balance', account.pk),
+                 this_year),
+        Scenario('operation-export', 'operation:operation-export', 'get',
+                 url('operation:operation-export'),
+                 {**this_year, 'output': 'csv'}),
+        Scenario('me', 'user:me', 'get', url('user:me'), None),
+        Scenario('token', 'user:token', 'post', url('user:token'),
+                 {'email': user.email, 'password': password}),
+        Scenario('create-user', 'user:create', 'post', url('user:create'),
+                 lambda index: {
+                     'email': f'benchmark-{uuid.uuid4().hex}@example.com',
+                     'password': 'benchmark-pass',
+                     'name': 'Benchmark',
+                 }),
+        Scenario('update-me', 'user:me', 'patch', url('user:me'),
+                 {'name': user.name or 'Benchmark'}),
+        Scenario('accounttype-create', 'operation:accounttype-list', 'post',
+                 url('operation:accounttype-list'),
+                 lambda index: {'name': f'Benchmark {run}-{index}'}),
+        Scenario('account-create', 'operation:account-list', 'post',
+                 url('operation:account-list'),
+                 lambda index: {
+                     'name': f'Benchmark {run}-{index}',
+                     'acctype': acctype.pk,
+                 }),
+        Scenario('tag-create', 'operation:tag-list', 'post',
+                 url('operation:tag-list'),
+                 lambda index: {'name': f'Benchmark {run}-{index}'}),
+        Scenario('operation-create', 'operation:operation-list', 'post',
+                 url('operation:operation-list'), new_operation),
+        Scenario('operation-bulk-create', 'operation:operation-bulk-create',
+                 'post', url('operation:operation-bulk-create'),
+                 lambda index: [
+                     new_operation(f'{index}.{item}') for item in range(10)
+                 ]),
+        Scenario('operation-bulk-update', 'operation:operation-bulk-update',
+                 'post', written('operation:operation-bulk-update'),
+                 {'set': {'description': 'Benchmark'}}),
+        Scenario('operation-bulk-tag', 'operation:operation-bulk-tag',
+                 'post', written('operation:operation-bulk-tag'),
+                 {'add': [tag.pk]}),
+        Scenario('operation-bulk-delete', 'operation:operation-bulk-delete',
+                 'post', written('operation:operation-bulk-delete'), {}),
+    ]
+
+
+class ClientSender:
+    """Send requests through the Django test client, counting queries"""
+
+    def __init__(self, token, host):
+        self.token = token
+        self.host = host
+        self.local = threading.local()
+
+    def _client(self):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = Client(
+                SERVER_NAME=self.host,
+                HTTP_AUTHORIZATION=f'Token {self.token}',
+                raise_request_exception=False
+            )
+            self.local.client = client
+        return client
+
+    def __call__(self, method, path, data):
+        client = self._client()
+        kwargs = {} if method == 'get' else {'content_type':
+                                             'application/json'}
+        with ExitStack() as stack:
+            captures = [
+                stack.enter_context(CaptureQueriesContext(connections[alias]))
+                for alias in settings.DATABASES
+            ]
+            started = time.perf_counter()
+            response = getattr(client, method)(path, data, **kwargs)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            seconds = time.perf_counter() - started
+        return Result(
+            seconds,
+            response.status_code,
+            sum(len(capture) for capture in captures),
+            response.get('X-Cache') == 'hit'
+        )
+
+
+class HTTPSender:
+    """Send requests to a running server, which hides its query counts"""
+
+    def __init__(self, token, base_url):
+        self.token = token
+        self.base_url = base_url.rstrip('/')
+
+    def __call__(self, method, path, data):
+        url = self.base_url + path
+        body = None
+        if method == 'get':
+            if data:
+                url += '?' + urllib.parse.urlencode(data)
+        else:
+            body = json.dumps(data).encode()
+        request = urllib.request.Request(
+            url,
+            data=body,
+            method=method.upper(),
+            headers={
+                'Authorization': f'Token {self.token}',
+                'Content-Type': 'application/json',
+            }
+        )
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+                status, cache = response.status, response.headers
+        except urllib.error.HTTPError as error:
+            error.read()
+            status, cache = error.code, error.headers
+        seconds = time.perf_counter() - started
+        return Result(seconds, status, None, cache.get('X-Cache') == 'hit')
+
+
+def percentile(values, fraction):
+    """Return the nearest rank percentile of sorted values"""
+    if not values:
+        return None
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+def run_scenario(send, scenario, requests, concurrency, warmup=0):
+    """Send the requests of a scenario and return its statistics"""
+    def request(index):
+        data = scenario.data
+        if callable(data):
+            data = data(index)
+        return send(scenario.method, scenario.path, data)
+
+    for index in range(warmup):
+        request(-index - 1)
+    started = time.perf_counter()
+    if concurrency == 1:
+        results = [request(index) for index in range(requests)]
+    else:
+        with ThreadPoolExecutor(concurrency) as executor:
+            results = list(executor.map(request, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    milliseconds = sorted(result.seconds * 1000 for result in results)
+    queries = [result.queries for result in results
+               if result.queries is not None]
+
+    def rounded(value):
+        return None if value is None else round(value, 3)
+
+    return {
+        'name': scenario.name,
+        'route': scenario.route,
+        'method': scenario.method.upper(),
+        'requests': len(results),
+        'errors': sum(result.status >= 400 for result in results),
+        'cache_hits': sum(result.cache_hit for result in results),
+        'p50_ms': rounded(percentile(milliseconds, 0.50)),
+        'p95_ms': rounded(percentile(milliseconds, 0.95)),
+        'p99_ms': rounded(percentile(milliseconds, 0.99)),
+        'mean_ms': rounded(sum(milliseconds) / len(milliseconds)),
+        'throughput_rps': rounded(len(results) / elapsed),
+        'queries_mean': (
+            rounded(sum(queries) / len(queries)) if queries else None
+        ),
+        'queries_max': max(queries) if queries else None,
+    }
+
+
+def run_benchmark(send, scenarios, requests, concurrency, warmup=0,
+                  progress=None):
+    """Run every scenario in turn and return their statistics"""
+    results = []
+    for scenario in scenarios:
+        results.append(
+            run_scenario(send, scenario, requests, concurrency, warmup)
+        )
+        if progress is not None:
+            progress(results[-1])
+    return results
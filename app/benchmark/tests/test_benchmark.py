@@ -0,0 +1,120 @@
+import json
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from core.models import Account, AccountBalance, Operation, Tag
+from core.versions import current_version
+
+from benchmark.runner import (WRITE_DATE, api_routes, build_scenarios,
+                              percentile)
+
+
+class GenerateDataCommandTests(TestCase):
+    """Test generating data to benchmark against"""
+
+    def _generate(self, email='loadgen{}@example.com', seed=0):
+        call_command(
+            'generate_data', users=2, accounts=2, tags=3, operations=40,
+            days=60, seed=seed, email=email, batch_size=15, stdout=StringIO()
+        )
+
+    def test_generate_data(self):
+        """Test the users get their data and consistent balances"""
+        self._generate()
+
+        user = get_user_model().objects.get(email='loadgen1@example.com')
+        self.assertTrue(user.check_password('loadgen-pass'))
+        self.assertEqual(Account.objects.filter(user=user).count(), 2)
+        self.assertEqual(Tag.objects.filter(user=user).count(), 3)
+        self.assertEqual(Operation.objects.filter(user=user).count(), 40)
+        self.assertTrue(Operation.tags.through.objects.exists())
+        for balance in AccountBalance.objects.filter(user=user):
+            values = Operation.objects.filter(
+                account=balance.account
+            ).values_list('value', flat=True)
+            self.assertEqual(balance.balance, sum(values))
+
+    def test_generate_data_bumps_the_data_version(self):
+        """Test adding accounts and tags to a user bumps its version"""
+        call_command(
+            'generate_data', users=1, accounts=1, tags=1, operations=0,
+            stdout=StringIO()
+        )
+        user = get_user_model().objects.get(email='loadgen0@example.com')
+        version = current_version(user.pk)
+
+        call_command(
+            'generate_data', users=1, accounts=1, tags=1, operations=0,
+            stdout=StringIO()
+        )
+
+        self.assertGreater(current_version(user.pk), version)
+        self.assertEqual(Account.objects.filter(user=user).count(), 2)
+
+    def test_same_seed_same_data(self):
+        """Test the same seed generates the same operations"""
+        self._generate(email='first{}@example.com')
+        self._generate(email='second{}@example.com')
+
+        def operations(prefix):
+            return list(Operation.objects.filter(
+                user__email__startswith=prefix
+            ).order_by('pk').values_list('name', 'value', 'date'))
+
+        self.assertEqual(operations('first'), operations('second'))
+
+
+class BenchmarkCommandTests(TestCase):
+    """Test the benchmark of the API routes"""
+
+    def setUp(self):
+        call_command(
+            'generate_data', users=1, accounts=2, tags=3, operations=20,
+            stdout=StringIO()
+        )
+        self.user = get_user_model().objects.get(email='loadgen0@example.com')
+
+    def test_every_route_is_benchmarked(self):
+        """Test the scenarios cover every route of the APIs"""
+        scenarios = build_scenarios(self.user, 'loadgen-pass')
+
+        self.assertTrue(api_routes())
+        self.assertEqual(
+            api_routes() - {scenario.route for scenario in scenarios}, set()
+        )
+
+    def test_run_benchmark(self):
+        """Test the report has the statistics of every scenario"""
+        out = StringIO()
+
+        call_command(
+            'run_benchmark', requests=3, stdout=out, stderr=StringIO()
+        )
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['requests'], 3)
+        for result in report['scenarios']:
+            self.assertEqual(result['errors'], 0, result['name'])
+            self.assertEqual(result['requests'], 3)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+            self.assertGreater(result['throughput_rps'], 0)
+            self.assertIsNotNone(result['queries_mean'])
+        self.assertFalse(Operation.objects.filter(date=WRITE_DATE).exists())
+
+    def test_unknown_user(self):
+        """Test benchmarking needs a generated user"""
+        with self.assertRaises(CommandError):
+            call_command('run_benchmark', email='nobody@example.com')
+
+    def test_percentile(self):
+        """Test the nearest rank percentile"""
+        values = list(range(1, 101))
+
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile([7], 0.95), 7)
+        self.assertIsNone(percentile([], 0.5))
@@ -1,6 +1,24 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.models.signals import post_migrate
+
+
+def reserve_shard_ids(sender, using, **kwargs):
+    """Give the ids of a migrated shard a range of their own"""
+    from core.sharding import reserve_id_range
+
+    if using in settings.SHARD_DATABASES:
+        reserve_id_range(using)
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from core import sharding  # noqa: F401
+        from core.metrics import register_collector
+        from core.slowqueries import metric_samples
+
+        post_migrate.connect(reserve_shard_ids, sender=self)
+        register_collector(metric_samples)
@@ -0,0 +1,190 @@
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, Sum
+
+from core.ledger import ArchiveDeltas
+from core.models import (AccountDailyBalance, AccountMonthlySummary,
+                         ArchivedOperation, Operation, Tag)
+from core.partitions import add_months, month_start
+from core.versions import bump_version
+
+
+ARCHIVED_FIELDS = (
+    'id',
+    'user_id',
+    'account_id',
+    'name',
+    'description',
+    'value',
+    'date',
+    'fingerprint',
+    'fingerprint_seq',
+)
+
+
+def archive_horizon(today=None):
+    """Return the first day kept live, ARCHIVE_AFTER_MONTHS months back"""
+    today = today or date.today()
+    return add_months(month_start(today), -settings.ARCHIVE_AFTER_MONTHS)
+
+
+def _tag_ids(operation_ids, using):
+    """Return the tag ids of each of the operations"""
+    tags = defaultdict(list)
+    rows = Operation.tags.through.objects.using(using).filter(
+        operation_id__in=operation_ids
+    ).order_by('tag_id').values_list('operation_id', 'tag_id')
+    for operation_id, tag_id in rows:
+        tags[operation_id].append(tag_id)
+    return tags
+
+
+def _finish_batch(deltas, user_ids, using):
+    """Apply the balance changes of a batch and bump the data versions"""
+    deltas.apply(using)
+    for model in (AccountDailyBalance, AccountMonthlySummary):
+        model.objects.using(using).filter(
+            user_id__in=user_ids, balance=0
+        )._raw_delete(using)
+    for user_id in sorted(user_ids):
+        bump_version(user_id, using)
+
+
+def archive_operations(before, using, user_id=None, batch_size=1000):
+    """
+    Move the operations dated before `before` to the archive
+
+    Each batch moves in its own transaction: its operations are copied to
+    ArchivedOperation with their tag ids and deleted, and their values move
+    from the daily balances to the monthly summaries of their accounts.
+    The running account balances keep counting them. Return the number of
+    archived operations.
+    """
+    operations = Operation.objects.using(using).filter(
+        date__lt=before
+    ).order_by('pk')
+    if user_id is not None:
+        operations = operations.filter(user_id=user_id)
+
+    archived = 0
+    while True:
+        with transaction.atomic(using=using):
+            rows = list(
+                operations.select_for_update().values(*ARCHIVED_FIELDS)[
+                    :batch_size
+                ]
+            )
+            if not rows:
+                break
+            ids = [row['id'] for row in rows]
+            tags = _tag_ids(ids, using)
+            ArchivedOperation.objects.using(using).bulk_create(
+                ArchivedOperation(tag_ids=tags[row['id']], **row)
+                for row in rows
+            )
+            Operation.tags.through.objects.using(using).filter(
+                operation_id__in=ids
+            )._raw_delete(using)
+            Operation.objects.using(using).filter(pk__in=ids)._raw_delete(
+                using
+            )
+
+            deltas = ArchiveDeltas()
+            deltas.add_rows(rows)
+            _finish_batch(deltas, {row['user_id'] for row in rows}, using)
+        archived += len(rows)
+
+    return archived
+
+
+def restore_operations(since, using, user_id=None, batch_size=1000):
+    """
+    Move the archived operations dated on or after `since` back
+
+    Operations get their ids back, and their tags unless they were deleted
+    meanwhile. Return the number of restored operations.
+    """
+    archive = ArchivedOperation.objects.using(using).filter(
+        date__gte=since
+    ).order_by('pk')
+    if user_id is not None:
+        archive = archive.filter(user_id=user_id)
+
+    restored = 0
+    while True:
+        with transaction.atomic(using=using):
+            rows = list(archive.select_for_update()[:batch_size])
+            if not rows:
+                break
+            Operation.objects.using(using).bulk_create(
+                Operation(**{
+                    field: getattr(row, field) for field in ARCHIVED_FIELDS
+                })
+                for row in rows
+            )
+            tag_ids = Tag.objects.using(using).filter(
+                pk__in={tag for row in rows for tag in row.tag_ids}
+            ).values_list('pk', flat=True)
+            tag_ids = set(tag_ids)
+            through = Operation.tags.through
+            through.objects.using(using).bulk_create(
+                through(operation_id=row.id, tag_id=tag)
+                for row in rows
+                for tag in row.tag_ids
+                if tag in tag_ids
+            )
+            ArchivedOperation.objects.using(using).filter(
+                pk__in=[row.id for row in rows]
+            )._raw_delete(using)
+
+            deltas = ArchiveDeltas()
+            for row in rows:
+                deltas.add(
+                    row.user_id, row.account_id, row.date, row.value, sign=-1
+                )
+            _finish_batch(deltas, {row.user_id for row in rows}, using)
+        restored += len(rows)
+
+    return restored
+
+
+def archived_balance(user_id, account_id, start, end):
+    """
+    Return the sum of the archived operations of an account in [start, end)
+
+    The monthly summaries of the months the range touches are read in one
+    query. Those of the months it covers whole are added up, and for the
+    others the archived operations of the days in range are summed. Either
+    side of the range is None when it is unbounded.
+    """
+    months = {}
+    if start is not None:
+        months['month__gte'] = month_start(start)
+    if end is not None:
+        months['month__lt'] = end
+    summaries = AccountMonthlySummary.objects.filter(
+        user_id=user_id, account_id=account_id, **months
+    ).values_list('month', 'balance')
+
+    total = Decimal('0.00')
+    partial = Q()
+    for month, balance in summaries:
+        month_end = add_months(month, 1)
+        if (start is None or start <= month) and (
+            end is None or month_end <= end
+        ):
+            total += balance
+        else:
+            partial |= Q(
+                date__gte=max(month, start or month),
+                date__lt=min(month_end, end or month_end)
+            )
+    if partial:
+        total += ArchivedOperation.objects.filter(
+            partial, user_id=user_id, account_id=account_id
+        ).aggregate(total=Sum('value'))['total'] or 0
+    return total
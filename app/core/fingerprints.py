@@ -0,0 +1,72 @@
+import hashlib
+import unicodedata
+from collections import Counter
+from decimal import Decimal
+
+
+_CENTS = Decimal('0.01')
+
+
+def normalize_name(name):
+    """Return name without accents, case or repeated whitespace"""
+    name = unicodedata.normalize('NFKD', name or '')
+    name = ''.join(char for char in name if not unicodedata.combining(char))
+    return ' '.join(name.casefold().split())
+
+
+def operation_fingerprint(account_id, date, value, name):
+    """
+    Return the content hash of an operation
+
+    Two operations have the same fingerprint when they were made on the same
+    account and day, for the same value and under the same normalized name.
+    """
+    value = Decimal(value).quantize(_CENTS) + 0
+    content = '|'.join((
+        str(account_id),
+        date.isoformat() if date is not None else '',
+        f'{value:.2f}',
+        normalize_name(name),
+    ))
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def lock_fingerprints(connection, fingerprints):
+    """
+    Hold a lock on each fingerprint until the end of the transaction
+
+    Writers giving ordinals to the same fingerprint then take turns, so
+    they never read the same largest ordinal. The locks are taken in order,
+    so writers of several fingerprints cannot deadlock. Only PostgreSQL
+    needs them, other backends write one transaction at a time.
+    """
+    if connection.vendor != 'postgresql' or not fingerprints:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT pg_advisory_xact_lock(hashtext(fingerprint)) FROM ('
+            'SELECT unnest(%s::text[]) AS fingerprint ORDER BY 1'
+            ') AS fingerprints',
+            [sorted(fingerprints)]
+        )
+
+
+class FingerprintSequence:
+    """
+    Fingerprint the operations of one statement or batch
+
+    A statement may legitimately hold identical lines, like two coffees on
+    the same day, so each one also gets its ordinal among the identical
+    lines seen so far. Importing the same lines again gives the same
+    (fingerprint, ordinal) pairs, which the unique index then rejects.
+    """
+
+    def __init__(self):
+        self.seen = Counter()
+
+    def __call__(self, account_id, date, value, name):
+        """Return the (fingerprint, ordinal) of the next operation"""
+        fingerprint = operation_fingerprint(account_id, date, value, name)
+        sequence = self.seen[fingerprint]
+        self.seen[fingerprint] += 1
+        return fingerprint, sequence
@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.db.migrations.executor import MigrationExecutor
+
+
+# Databases whose migrations were found applied, which they stay for the
+# life of the process, so they are only checked until then
+_migrated = set()
+
+
+def ping(connection):
+    """Run a trivial query, raising DatabaseError if it cannot be run"""
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+        cursor.fetchone()
+
+
+def unapplied_migrations(connection):
+    """Return the names of the migrations not applied to a database"""
+    executor = MigrationExecutor(connection)
+    plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+    return [f'{migration.app_label}.{migration.name}'
+            for migration, _ in plan]
+
+
+def readiness():
+    """
+    Return the problem of each database that cannot serve requests
+
+    Every database must answer a query, and the migrations of the shard
+    databases must be applied. Errors are not detailed, as the probes that
+    ask are not authenticated.
+    """
+    problems = {}
+    for alias in connections:
+        connection = connections[alias]
+        try:
+            ping(connection)
+            if alias in settings.SHARD_DATABASES and alias not in _migrated:
+                if unapplied_migrations(connection):
+                    problems[alias] = 'unapplied migrations'
+                    continue
+                _migrated.add(alias)
+        except DatabaseError:
+            problems[alias] = 'unavailable'
+    return problems
@@ -0,0 +1,134 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+
+class BalanceDeltas:
+    """
+    Accumulate changes to the stored account balances
+
+    Every write to operations records how much it adds to (or removes from)
+    each user/account/day and applies all of it at once with `apply`, which
+    must run inside the transaction that wrote the operations.
+    """
+
+    def __init__(self):
+        self.totals = defaultdict(Decimal)
+        self.days = defaultdict(Decimal)
+
+    def __bool__(self):
+        return any(self.totals.values()) or any(self.days.values())
+
+    def add(self, user_id, account_id, date, value, sign=1):
+        """Record that `value` was added to an account on `date`"""
+        from core.models import Operation
+
+        value = Operation._meta.get_field('value').to_python(value)
+        date = Operation._meta.get_field('date').to_python(date)
+        if value is None:
+            return
+        self.totals[(user_id, account_id)] += sign * value
+        if date is not None:
+            self.days[(user_id, account_id, date)] += sign * value
+
+    def add_operation(self, operation, sign=1):
+        """Record the contribution of an operation instance"""
+        self.add(
+            operation.user_id,
+            operation.account_id,
+            operation.date,
+            operation.value,
+            sign
+        )
+
+    def add_rows(self, rows, sign=1):
+        """
+        Record the contribution of operation rows
+
+        Rows are mappings with user_id, account_id, date and value keys, as
+        returned by `values()` on an operation queryset.
+        """
+        for row in rows:
+            self.add(
+                row['user_id'],
+                row['account_id'],
+                row['date'],
+                row['value'],
+                sign
+            )
+
+    def apply(self, using):
+        """Write the accumulated changes to the balance tables"""
+        from core.models import AccountBalance, AccountDailyBalance
+
+        for (user_id, account_id), amount in self.totals.items():
+            _add_to_balance(
+                AccountBalance, using, amount,
+                user_id=user_id, account_id=account_id
+            )
+        for (user_id, account_id, date), amount in self.days.items():
+            _add_to_balance(
+                AccountDailyBalance, using, amount,
+                user_id=user_id, account_id=account_id, date=date
+            )
+        self.totals.clear()
+        self.days.clear()
+
+
+class ArchiveDeltas(BalanceDeltas):
+    """
+    Accumulate the balance changes of moving operations to the archive
+
+    Archived operations leave the daily balances for the monthly summaries
+    but still count in the running balances. Archiving records operations
+    with sign=1 and restoring them with sign=-1.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.months = defaultdict(Decimal)
+
+    def __bool__(self):
+        return super().__bool__() or any(self.months.values())
+
+    def add(self, user_id, account_id, date, value, sign=1):
+        """Record that `value` moved to the archive of an account"""
+        from core.models import Operation
+
+        super().add(user_id, account_id, date, value, -sign)
+        value = Operation._meta.get_field('value').to_python(value)
+        date = Operation._meta.get_field('date').to_python(date)
+        if value is None or date is None:
+            return
+        self.months[(user_id, account_id, date.replace(day=1))] += (
+            sign * value
+        )
+
+    def apply(self, using):
+        """Write the accumulated changes to the daily and monthly balances"""
+        from core.models import AccountMonthlySummary
+
+        self.totals.clear()
+        super().apply(using)
+        for (user_id, account_id, month), amount in self.months.items():
+            _add_to_balance(
+                AccountMonthlySummary, using, amount,
+                user_id=user_id, account_id=account_id, month=month
+            )
+        self.months.clear()
+
+
+def _add_to_balance(model, using, amount, **lookup):
+    """Add amount to the balance row matching lookup, creating it if needed"""
+    if not amount:
+        return
+    queryset = model.objects.using(using).filter(**lookup)
+    if queryset.update(balance=F('balance') + amount):
+        return
+    try:
+        with transaction.atomic(using=using):
+            model.objects.using(using).create(balance=amount, **lookup)
+    except IntegrityError:
+        queryset.update(balance=F('balance') + amount)
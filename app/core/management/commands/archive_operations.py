@@ -0,0 +1,45 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from core.archive import archive_horizon, archive_operations
+
+
+class Command(BaseCommand):
+    """Django command to move old operations to the archive"""
+    help = (
+        'Move the operations older than ARCHIVE_AFTER_MONTHS months to the '
+        'archive, leaving monthly summaries behind'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--before',
+            type=date.fromisoformat,
+            help='Archive the operations dated before this date, as '
+                 'YYYY-MM-DD, instead of ARCHIVE_AFTER_MONTHS months back'
+        )
+        parser.add_argument(
+            '--user',
+            type=int,
+            help='Restrict to the operations of a single user id'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        before = options['before'] or archive_horizon()
+        started = time.monotonic()
+        archived = archive_operations(
+            before,
+            options['database'],
+            user_id=options['user'],
+            batch_size=options['batch_size']
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {archived} operations dated before {before} in '
+            f'{time.monotonic() - started:.2f}s'
+        ))
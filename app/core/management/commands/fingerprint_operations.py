@@ -0,0 +1,118 @@
+from itertools import groupby, islice
+from operator import itemgetter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.db.models import Count
+
+from core.models import Operation
+
+
+def duplicate_groups(operations):
+    """
+    Return the fingerprints shared by more than one operation
+
+    Only the fingerprint column is grouped, so the GROUP BY is read from the
+    unique fingerprint index instead of the whole table.
+    """
+    return operations.filter(fingerprint__isnull=False).values(
+        'fingerprint'
+    ).annotate(
+        count=Count('fingerprint')
+    ).filter(count__gt=1).order_by('fingerprint')
+
+
+class Command(BaseCommand):
+    """Django command to backfill operation fingerprints"""
+    help = (
+        'Fingerprint the operations that have none and report the '
+        'duplicated operations'
+    )
+    batch_size = 1000
+    attempts = 3
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--report-only',
+            action='store_true',
+            help='Only report the duplicates, without backfilling'
+        )
+        parser.add_argument(
+            '--user',
+            type=int,
+            help='Restrict to the operations of a single user id'
+        )
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        using = options['database']
+        operations = Operation.objects.using(using).order_by()
+        if options['user'] is not None:
+            operations = operations.filter(user_id=options['user'])
+
+        if not options['report_only']:
+            self._backfill(using, operations)
+        self._report(operations)
+
+    def _backfill(self, using, operations):
+        """Fingerprint the operations without one, oldest first"""
+        pending = operations.filter(fingerprint__isnull=True).order_by('id')
+        filled, last_id = 0, 0
+        while True:
+            batch = list(pending.filter(id__gt=last_id).only(
+                'id', 'account_id', 'date', 'value', 'name'
+            )[:self.batch_size])
+            if not batch:
+                break
+            for attempt in range(1, self.attempts + 1):
+                try:
+                    with transaction.atomic(using=using):
+                        self._fingerprint(using, batch)
+                    break
+                except IntegrityError:
+                    # An import took one of the ordinals in the meantime
+                    if attempt == self.attempts:
+                        raise CommandError(
+                            f'Unable to fingerprint operations after id '
+                            f'{last_id}, try again later'
+                        )
+            filled += len(batch)
+            last_id = batch[-1].id
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Fingerprinted {filled} operations'
+        ))
+
+    def _fingerprint(self, using, batch):
+        """Store the fingerprints of a batch after the existing ordinals"""
+        Operation.fingerprint_operations(batch, using)
+        Operation.objects.using(using).bulk_update(
+            batch, ['fingerprint', 'fingerprint_seq']
+        )
+
+    def _report(self, operations):
+        """Write every group of operations sharing a fingerprint"""
+        groups = duplicate_groups(operations).values_list(
+            'fingerprint', flat=True
+        )
+        groups, duplicates = groups.iterator(), 0
+        while True:
+            fingerprints = list(islice(groups, self.batch_size))
+            if not fingerprints:
+                break
+            rows = operations.filter(fingerprint__in=fingerprints).order_by(
+                'fingerprint', 'fingerprint_seq'
+            ).values_list(
+                'fingerprint', 'id', 'account_id', 'date', 'value', 'name'
+            )
+            for _, group in groupby(rows, key=itemgetter(0)):
+                group = list(group)
+                _, _, account_id, date, value, name = group[0]
+                ids = ', '.join(str(row[1]) for row in group)
+                duplicates += 1
+                self.stdout.write(
+                    f'Account {account_id} on {date}, {name} {value}: '
+                    f'operations {ids}'
+                )
+
+        self.stdout.write(f'{duplicates} groups of duplicated operations')
@@ -0,0 +1,45 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.sharding import move_user, shard_of
+
+
+class Command(BaseCommand):
+    """Django command to move the data of a user to another shard"""
+    help = 'Move the data of a user to another database of SHARD_DATABASES'
+
+    def add_arguments(self, parser):
+        parser.add_argument('user', type=int, help='Id of the user')
+        parser.add_argument('database', help='Alias of the target shard')
+        parser.add_argument(
+            '--grace',
+            type=float,
+            help='Seconds to wait for every process to see the shard map '
+                 'change, SHARD_MAP_CACHE_SECONDS by default'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(pk=options['user'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'User {options["user"]} not found')
+
+        source = shard_of(user.pk).database
+        started = time.monotonic()
+        try:
+            copied = move_user(
+                user,
+                options['database'],
+                grace=options['grace'],
+                batch_size=options['batch_size']
+            )
+        except (ValueError, RuntimeError) as error:
+            raise CommandError(str(error))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Moved {copied} rows of user {user.pk} from {source} to '
+            f'{options["database"]} in {time.monotonic() - started:.2f}s'
+        ))
@@ -0,0 +1,76 @@
+from datetime import date
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.partitions import (add_months, detach_partitions, ensure_partitions,
+                             is_partitioned, month_start,
+                             partition_operation_table,
+                             supports_partitioning)
+
+
+class Command(BaseCommand):
+    """Django command to maintain the partitions of the operations"""
+    help = (
+        'Create the monthly partitions of the operations ahead of time and '
+        'detach old ones once their operations are archived'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument(
+            '--months-ahead',
+            type=int,
+            default=settings.OPERATION_PARTITION_MONTHS_AHEAD,
+            help='Months after the current one to create partitions for'
+        )
+        parser.add_argument(
+            '--detach-before',
+            type=date.fromisoformat,
+            help='Detach the partitions ending on or before this date, '
+                 'as YYYY-MM-DD'
+        )
+        parser.add_argument(
+            '--convert',
+            action='store_true',
+            help='Partition the operations table first if it is not yet'
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if not supports_partitioning(connection):
+            raise CommandError(
+                'Partitioning the operations needs PostgreSQL 11 or later'
+            )
+        if not is_partitioned(connection):
+            if not options['convert']:
+                raise CommandError(
+                    'The operations table is not partitioned, '
+                    'use --convert to partition it'
+                )
+            for name in partition_operation_table(
+                connection, options['months_ahead']
+            ):
+                self.stdout.write(f'Created {name}')
+
+        today = date.today()
+        for name in ensure_partitions(
+            connection,
+            month_start(today),
+            add_months(month_start(today), options['months_ahead'])
+        ):
+            self.stdout.write(f'Created {name}')
+        if options['detach_before']:
+            try:
+                detached = detach_partitions(
+                    connection, options['detach_before']
+                )
+            except ValueError as error:
+                raise CommandError(error)
+            for name in detached:
+                self.stdout.write(f'Detached {name}')
+
+        self.stdout.write(self.style.SUCCESS(
+            'Operation partitions are up to date'
+        ))
@@ -0,0 +1,37 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from core.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    """Django command to delete the expired idempotency keys"""
+    help = 'Delete the idempotency keys older than IDEMPOTENCY_KEY_TTL'
+    batch_size = 1000
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(
+            seconds=settings.IDEMPOTENCY_KEY_TTL
+        )
+        keys = IdempotencyKey.objects.using(options['database'])
+        expired = keys.filter(created__lt=cutoff).order_by('created')
+
+        deleted = 0
+        while True:
+            batch = list(expired.values_list('pk', flat=True)[
+                :self.batch_size
+            ])
+            if not batch:
+                break
+            deleted += keys.filter(pk__in=batch)._raw_delete(keys.db)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {deleted} expired idempotency keys'
+        ))
@@ -0,0 +1,171 @@
+from heapq import merge
+from itertools import groupby, islice
+from operator import itemgetter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import DecimalField, Sum
+
+from core.models import (AccountBalance, AccountDailyBalance,
+                         AccountMonthlySummary, Operation)
+
+
+def _sum_of_values():
+    """Sum the operation values with the precision of a stored balance"""
+    return Sum(
+        'value',
+        output_field=DecimalField(max_digits=14, decimal_places=2)
+    )
+
+
+def computed_balances(operations):
+    """Return the account balances computed from raw operations"""
+    return operations.values('user_id', 'account_id').annotate(
+        balance=_sum_of_values()
+    ).order_by('user_id', 'account_id')
+
+
+def archived_balances(summaries):
+    """Return the account balances of the archived operations"""
+    return summaries.values('user_id', 'account_id').annotate(
+        balance=Sum('balance')
+    ).order_by('user_id', 'account_id')
+
+
+def combined_balances(*sources, key_fields=('user_id', 'account_id')):
+    """Merge balance rows ordered by key_fields, adding up equal keys"""
+    key = itemgetter(*key_fields)
+    for _, rows in groupby(merge(*sources, key=key), key=key):
+        rows = list(rows)
+        yield {**rows[0], 'balance': sum(row['balance'] for row in rows)}
+
+
+def computed_daily_balances(operations):
+    """Return the daily account balances computed from raw operations"""
+    return operations.exclude(date=None).values(
+        'user_id', 'account_id', 'date'
+    ).annotate(
+        balance=_sum_of_values()
+    ).order_by('user_id', 'account_id', 'date')
+
+
+def diff_balances(expected, stored, key_fields):
+    """
+    Yield (key, expected, stored) for every balance that does not match
+
+    Both iterables must be ordered by key_fields, so they are merged in a
+    single pass without holding either of them in memory.
+    """
+    def keyed(rows):
+        for row in rows:
+            yield tuple(row[field] for field in key_fields), row['balance']
+
+    expected, stored = keyed(expected), keyed(stored)
+    exp, sto = next(expected, None), next(stored, None)
+    while exp is not None or sto is not None:
+        if sto is None or (exp is not None and exp[0] < sto[0]):
+            if exp[1]:
+                yield exp[0], exp[1], None
+            exp = next(expected, None)
+        elif exp is None or sto[0] < exp[0]:
+            if sto[1]:
+                yield sto[0], None, sto[1]
+            sto = next(stored, None)
+        else:
+            if exp[1] != sto[1]:
+                yield exp[0], exp[1], sto[1]
+            exp, sto = next(expected, None), next(stored, None)
+
+
+class Command(BaseCommand):
+    """Django command to rebuild or verify the stored account balances"""
+    help = (
+        'Rebuild the stored account balances from the raw operations and '
+        'the monthly summaries of the archived ones'
+    )
+    batch_size = 1000
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Only compare the stored balances with the operations'
+        )
+        parser.add_argument(
+            '--user',
+            type=int,
+            help='Restrict to the balances of a single user id'
+        )
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        using = options['database']
+        operations = Operation.objects.using(using).order_by()
+        balances = AccountBalance.objects.using(using)
+        daily_balances = AccountDailyBalance.objects.using(using)
+        summaries = AccountMonthlySummary.objects.using(using)
+        if options['user'] is not None:
+            operations = operations.filter(user_id=options['user'])
+            balances = balances.filter(user_id=options['user'])
+            daily_balances = daily_balances.filter(user_id=options['user'])
+            summaries = summaries.filter(user_id=options['user'])
+
+        expected = (
+            combined_balances(
+                computed_balances(operations).iterator(),
+                archived_balances(summaries).iterator()
+            ),
+            computed_daily_balances(operations).iterator(),
+        )
+        if options['verify']:
+            self._verify(expected, balances, daily_balances)
+        else:
+            self._rebuild(using, expected, balances, daily_balances)
+
+    def _verify(self, expected, balances, daily_balances):
+        """Report every stored balance that differs from the operations"""
+        mismatches = 0
+        expected_balances, expected_daily_balances = expected
+        checks = (
+            (
+                expected_balances,
+                balances.order_by('user_id', 'account_id'),
+                ('user_id', 'account_id')
+            ),
+            (
+                expected_daily_balances,
+                daily_balances.order_by('user_id', 'account_id', 'date'),
+                ('user_id', 'account_id', 'date')
+            ),
+        )
+        for expected, stored, key_fields in checks:
+            stored = stored.values(*key_fields, 'balance')
+            for key, exp, sto in diff_balances(
+                expected, stored.iterator(), key_fields
+            ):
+                mismatches += 1
+                self.stdout.write(
+                    f'{dict(zip(key_fields, key))}: '
+                    f'expected {exp or 0}, stored {sto or 0}'
+                )
+
+        if mismatches:
+            raise CommandError(f'{mismatches} stored balances are wrong')
+        self.stdout.write(self.style.SUCCESS('Stored balances are correct'))
+
+    def _rebuild(self, using, expected, balances, daily_balances):
+        """Replace the stored balances with the ones computed from scratch"""
+        with transaction.atomic(using=using):
+            balances.delete()
+            daily_balances.delete()
+            for model, rows in zip(
+                (AccountBalance, AccountDailyBalance), expected
+            ):
+                batch = list(islice(rows, self.batch_size))
+                while batch:
+                    model.objects.using(using).bulk_create(
+                        model(**row) for row in batch
+                    )
+                    batch = list(islice(rows, self.batch_size))
+
+        self.stdout.write(self.style.SUCCESS('Stored balances rebuilt'))
@@ -0,0 +1,40 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from core.archive import restore_operations
+
+
+class Command(BaseCommand):
+    """Django command to move archived operations back"""
+    help = 'Move the archived operations dated on or after a date back'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'since',
+            type=date.fromisoformat,
+            help='First date to restore, as YYYY-MM-DD'
+        )
+        parser.add_argument(
+            '--user',
+            type=int,
+            help='Restrict to the operations of a single user id'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        restored = restore_operations(
+            options['since'],
+            options['database'],
+            user_id=options['user'],
+            batch_size=options['batch_size']
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Restored {restored} operations dated on or after '
+            f'{options["since"]} in {time.monotonic() - started:.2f}s'
+        ))
@@ -1,25 +1,65 @@
 import time
 
-from django.db import connections
+from django.db import DEFAULT_DB_ALIAS, connections
 from django.db.utils import OperationalError
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+
+from core.health import ping
 
 
 class Command(BaseCommand):
     """
     Django command to pause execution until database is available
 
-    I learned about this command in a Udemy course and it is very useful.
+    Each attempt opens a new connection and runs a query, waiting twice as
+    long after each failure, up to --max-delay seconds. The command fails
+    once --timeout seconds have passed.
     """
+    help = 'Wait until the database accepts queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument(
+            '--timeout',
+            type=float,
+            default=60,
+            help='Seconds to wait for in all before failing'
+        )
+        parser.add_argument(
+            '--delay',
+            type=float,
+            default=0.5,
+            help='Seconds to wait after the first failed attempt'
+        )
+        parser.add_argument('--max-delay', type=float, default=5)
+
+    def attempt(self, alias):
+        connection = connections.create_connection(alias)
+        try:
+            ping(connection)
+        finally:
+            connection.close()
 
     def handle(self, *args, **options):
         self.stdout.write('Waiting for database...')
-        db_conn = None
-        while not db_conn:
+        deadline = time.monotonic() + options['timeout']
+        delay = options['delay']
+        while True:
             try:
-                db_conn = connections['default']
-            except OperationalError:
-                self.stdout.write('Database unavailable waiting 1 second...')
-                time.sleep(1)
+                self.attempt(options['database'])
+                break
+            except OperationalError as error:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise CommandError(
+                        f'Database unavailable after {options["timeout"]:g} '
+                        f'seconds: {error}'
+                    )
+                wait = min(delay, remaining)
+                self.stdout.write(
+                    f'Database unavailable waiting {wait:g} seconds...'
+                )
+                time.sleep(wait)
+                delay = min(delay * 2, options['max_delay'])
 
         self.stdout.write(self.style.SUCCESS('Database available!'))
@@ -0,0 +1,213 @@
+import math
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from threading import Lock
+
+
+# Upper bounds of the histogram buckets
+SECONDS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+)
+QUERIES = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# name, help and buckets of the histograms kept for each view
+REQUEST_HISTOGRAMS = (
+    ('http_request_duration_seconds', 'Wall time of requests', SECONDS),
+    (
+        'http_request_db_seconds',
+        'Time requests spent running database queries',
+        SECONDS
+    ),
+    ('http_request_queries', 'Database queries run by requests', QUERIES),
+    (
+        'http_request_serializer_seconds',
+        'Time requests spent in serializers',
+        SECONDS
+    ),
+    (
+        'http_response_size_bytes',
+        'Size of response bodies, streamed ones excluded',
+        BYTES
+    ),
+)
+REQUEST_LABELS = ('view', 'action', 'method', 'status')
+
+# Timings of the request being served
+current_timings = ContextVar('current_timings', default=None)
+
+
+class RequestTimings:
+    """
+    Time spent by a request in database queries and serializers
+
+    It is installed as an execute wrapper on every connection, so it sees
+    each query the request runs.
+    """
+    __slots__ = ('started', 'db', 'queries', 'serializer', 'serializing')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db = 0.0
+        self.queries = 0
+        self.serializer = 0.0
+        self.serializing = False
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - started
+            self.queries += 1
+
+
+def timed_serialization(function, *args, **kwargs):
+    """
+    Call function, adding its time to the serializer time of the request
+
+    Nested calls, like those of nested serializers and of the items of list
+    serializers, are only counted once, by the outermost one.
+    """
+    timings = current_timings.get()
+    if timings is None or timings.serializing:
+        return function(*args, **kwargs)
+    timings.serializing = True
+    started = time.perf_counter()
+    try:
+        return function(*args, **kwargs)
+    finally:
+        timings.serializer += time.perf_counter() - started
+        timings.serializing = False
+
+
+class TimedSerializerMixin:
+    """Add the time spent validating and representing data to the request"""
+
+    def run_validation(self, *args, **kwargs):
+        return timed_serialization(super().run_validation, *args, **kwargs)
+
+    def to_representation(self, instance):
+        return timed_serialization(super().to_representation, instance)
+
+
+class Histogram:
+    """Counts of observed values per bucket, with their sum"""
+    __slots__ = ('buckets', 'counts', 'sum')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def samples(self, name, labels):
+        """Yield the lines of the histogram in the Prometheus text format"""
+        cumulative = 0
+        for bound, count in zip((*self.buckets, math.inf), self.counts):
+            cumulative += count
+            yield (
+                f'{name}_bucket'
+                f'{format_labels({**labels, "le": format_value(bound)})} '
+                f'{cumulative}'
+            )
+        yield f'{name}_sum{format_labels(labels)} {format_value(self.sum)}'
+        yield f'{name}_count{format_labels(labels)} {cumulative}'
+
+
+def format_value(value):
+    """Return a sample value or bucket bound as Prometheus writes it"""
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float):
+        return repr(round(value, 9))
+    return str(value)
+
+
+def format_labels(labels):
+    """Return the {name="value",...} part of a sample"""
+    if not labels:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', r'\\').replace(
+            '"', r'\"'
+        ).replace('\n', r'\n'))
+        for name, value in labels.items()
+    )
+    return f'{{{pairs}}}'
+
+
+class RequestMetrics:
+    """
+    Histograms of the requests served by this process, per view
+
+    Each process of a server keeps its own, which Prometheus adds up
+    across the scraped instances.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self.reset()
+
+    def observe(self, labels, values):
+        """Record the REQUEST_HISTOGRAMS values of a request"""
+        with self._lock:
+            histograms = self._histograms.get(labels)
+            if histograms is None:
+                histograms = self._histograms[labels] = [
+                    Histogram(buckets)
+                    for _, _, buckets in REQUEST_HISTOGRAMS
+                ]
+            for histogram, value in zip(histograms, values):
+                if value is not None:
+                    histogram.observe(value)
+
+    def samples(self):
+        """Yield the lines of every histogram"""
+        with self._lock:
+            rows = [
+                (labels, [
+                    (histogram.counts[:], histogram.sum)
+                    for histogram in histograms
+                ])
+                for labels, histograms in sorted(self._histograms.items())
+            ]
+        for index, (name, help_text, buckets) in enumerate(
+            REQUEST_HISTOGRAMS
+        ):
+            yield f'# HELP {name} {help_text}'
+            yield f'# TYPE {name} histogram'
+            for labels, histograms in rows:
+                histogram = Histogram(buckets)
+                histogram.counts, histogram.sum = histograms[index]
+                yield from histogram.samples(
+                    name, dict(zip(REQUEST_LABELS, labels))
+                )
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+
+
+request_metrics = RequestMetrics()
+
+# Functions yielding more lines of the metrics, added by other apps
+collectors = [request_metrics.samples]
+
+
+def register_collector(collector):
+    """Add the lines yielded by collector() to the metrics"""
+    if collector not in collectors:
+        collectors.append(collector)
+
+
+def render_metrics():
+    """Return the metrics in the Prometheus text exposition format"""
+    lines = []
+    for collector in collectors:
+        lines.extend(collector())
+    return '\n'.join(lines) + '\n'
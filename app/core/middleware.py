@@ -0,0 +1,159 @@
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.urls import reverse
+
+from core.metrics import RequestTimings, current_timings, request_metrics
+from core.profiling import (REPORT_HEADER, is_staff, profile_request,
+                            wants_profile)
+from core.routers import (SAFE_METHODS, RequestRouting, client_key,
+                          current_routing, is_pinned, pin_to_primary)
+from core.slowqueries import SlowQueryCapture
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Pick the database the reads of each request go to
+
+    Safe requests read from a random replica, the same for the whole
+    request, unless their client wrote less than REPLICA_PIN_SECONDS ago,
+    so clients always read their own writes. Other requests, and anything
+    outside of a request, read from the primary.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        key = client_key(request)
+        alias = DEFAULT_DB_ALIAS
+        if (request.method in SAFE_METHODS and settings.REPLICA_DATABASES
+                and not (key and is_pinned(key))):
+            alias = random.choice(settings.REPLICA_DATABASES)
+
+        token = current_routing.set(RequestRouting(request, alias))
+        try:
+            response = self.get_response(request)
+        finally:
+            current_routing.reset(token)
+
+        if (key and request.method not in SAFE_METHODS
+                and response.status_code < 400):
+            pin_to_primary(key)
+        return response
+
+
+# Methods labelled by name in the metrics, the others are counted as other
+METRIC_METHODS = frozenset(
+    ('GET', 'HEAD', 'OPTIONS', 'POST', 'PUT', 'PATCH', 'DELETE')
+)
+
+
+def view_labels(request):
+    """Return the view name and viewset action the request resolved to"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched', ''
+    actions = getattr(match.func, 'actions', None) or {}
+    return match.view_name, actions.get(request.method.lower(), '')
+
+
+def server_timing(total, timings):
+    """Return the Server-Timing header of a request, in milliseconds"""
+    return (
+        f'total;dur={total * 1000:.3f}, '
+        f'db;dur={timings.db * 1000:.3f};desc="{timings.queries} queries", '
+        f'serializer;dur={timings.serializer * 1000:.3f}'
+    )
+
+
+class InstrumentationMiddleware:
+    """
+    Measure each request and report the measures in a Server-Timing header
+
+    The wall time, time spent in queries and serializers, query count and
+    response size of each request are added to the histograms of its view
+    and action in core.metrics. It goes before the Django middleware, so its
+    wall time covers them.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(
+                        connections[alias].execute_wrapper(timings)
+                    )
+                response = self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        total = time.perf_counter() - timings.started
+
+        view, action = view_labels(request)
+        method = request.method if request.method in METRIC_METHODS else (
+            'other'
+        )
+        request_metrics.observe(
+            (view, action, method, f'{response.status_code // 100}xx'),
+            (
+                total,
+                timings.db,
+                timings.queries,
+                timings.serializer,
+                None if response.streaming else len(response.content),
+            )
+        )
+        response['Server-Timing'] = server_timing(total, timings)
+        return response
+
+
+class SlowQueryMiddleware:
+    """
+    Log the queries of each request slower than SLOW_QUERY_SECONDS
+
+    It goes before InstrumentationMiddleware, so the EXPLAIN of a slow
+    query is counted as a query of its own rather than as part of the slow
+    one. See core.slowqueries.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        capture = SlowQueryCapture(request)
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(capture)
+                )
+            return self.get_response(request)
+
+
+class ProfilingMiddleware:
+    """
+    Profile the requests of staff users who ask for it
+
+    They send an X-Profile header or a profile query parameter, and get the
+    URL of the report in the X-Profile-Report header. Other requests only
+    pay for looking the header and parameter up. See core.profiling.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not (wants_profile(request) and is_staff(request)):
+            return self.get_response(request)
+        response, report = profile_request(request, self.get_response)
+        response[REPORT_HEADER] = reverse(
+            'profile-report', args=[report['id']]
+        )
+        return response
@@ -0,0 +1,69 @@
+# Generated by Django 3.2.25 on 2026-10-17 00:04
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_balances(apps, schema_editor):
+    """Compute the stored balances of the existing operations"""
+    db = schema_editor.connection.alias
+    Operation = apps.get_model('core', 'Operation')
+    AccountBalance = apps.get_model('core', 'AccountBalance')
+    AccountDailyBalance = apps.get_model('core', 'AccountDailyBalance')
+    operations = Operation.objects.using(db).order_by()
+    total = models.Sum(
+        'value',
+        output_field=models.DecimalField(max_digits=14, decimal_places=2)
+    )
+
+    AccountBalance.objects.using(db).bulk_create(
+        AccountBalance(**row) for row in operations.values(
+            'user_id', 'account_id'
+        ).annotate(balance=total).iterator()
+    )
+    AccountDailyBalance.objects.using(db).bulk_create(
+        AccountDailyBalance(**row) for row in operations.exclude(
+            date=None
+        ).values('user_id', 'account_id', 'date').annotate(
+            balance=total
+        ).iterator()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_alter_operation_tags'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountDailyBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.account')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AccountBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.account')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='accountdailybalance',
+            constraint=models.UniqueConstraint(fields=('user', 'account', 'date'), name='core_accountdailybalance_user_account_date'),
+        ),
+        migrations.AddConstraint(
+            model_name='accountbalance',
+            constraint=models.UniqueConstraint(fields=('user', 'account'), name='core_accountbalance_user_account'),
+        ),
+        migrations.RunPython(populate_balances, migrations.RunPython.noop),
+    ]
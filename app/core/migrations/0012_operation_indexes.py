@@ -0,0 +1,26 @@
+# Generated by Django 3.2.25 on 2026-10-17 00:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_account_balances'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='operation',
+            index=models.Index(fields=['user', 'date', 'id'], name='core_operation_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='operation',
+            index=models.Index(fields=['user', 'account', 'date'], name='core_operation_user_acc_idx'),
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX core_operation_tags_tag_op_idx '
+            'ON core_operation_tags (tag_id, operation_id)',
+            'DROP INDEX core_operation_tags_tag_op_idx'
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.2.25 on 2026-10-17 00:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_operation_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='operation',
+            name='fingerprint',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='operation',
+            name='fingerprint_seq',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddConstraint(
+            model_name='operation',
+            constraint=models.UniqueConstraint(condition=models.Q(('fingerprint__isnull', False)), fields=('fingerprint', 'fingerprint_seq'), name='core_operation_fingerprint_uniq'),
+        ),
+    ]
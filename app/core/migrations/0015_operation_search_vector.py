@@ -0,0 +1,65 @@
+# Generated by Django 3.2.25 on 2026-10-17 00:23
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('pg_catalog.simple', "
+    "coalesce({row}name, '')), 'A') || "
+    "setweight(to_tsvector('pg_catalog.simple', "
+    "coalesce({row}description, '')), 'B')"
+)
+
+CREATE_SEARCH_SQL = [
+    'CREATE EXTENSION IF NOT EXISTS btree_gin',
+    'CREATE FUNCTION core_operation_search_vector_update() '
+    'RETURNS trigger AS $$ BEGIN '
+    'NEW.search_vector := ' + SEARCH_VECTOR_SQL.format(row='NEW.') + '; '
+    'RETURN NEW; END $$ LANGUAGE plpgsql',
+    'CREATE TRIGGER core_operation_search_vector_trigger '
+    'BEFORE INSERT OR UPDATE OF name, description ON core_operation '
+    'FOR EACH ROW EXECUTE PROCEDURE core_operation_search_vector_update()',
+    'UPDATE core_operation SET search_vector = ' +
+    SEARCH_VECTOR_SQL.format(row=''),
+    'CREATE INDEX core_operation_search_idx '
+    'ON core_operation USING gin (user_id, search_vector)',
+]
+
+DROP_SEARCH_SQL = [
+    'DROP INDEX IF EXISTS core_operation_search_idx',
+    'DROP TRIGGER IF EXISTS core_operation_search_vector_trigger '
+    'ON core_operation',
+    'DROP FUNCTION IF EXISTS core_operation_search_vector_update()',
+]
+
+
+def create_search(apps, schema_editor):
+    """Keep search_vector current with a trigger and index it, on PostgreSQL"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for sql in CREATE_SEARCH_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_search(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for sql in DROP_SEARCH_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='operation',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search, drop_search),
+    ]
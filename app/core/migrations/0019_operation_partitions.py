@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import migrations
+
+from core.partitions import partition_operation_table, supports_partitioning
+
+
+def partition_operations(apps, schema_editor):
+    """Partition core_operation by date when OPERATION_PARTITIONING is set"""
+    connection = schema_editor.connection
+    if not settings.OPERATION_PARTITIONING:
+        return
+    if connection.vendor != 'postgresql':
+        return
+    if not supports_partitioning(connection):
+        raise ImproperlyConfigured(
+            'OPERATION_PARTITIONING needs PostgreSQL 11 or later'
+        )
+    partition_operation_table(
+        connection, settings.OPERATION_PARTITION_MONTHS_AHEAD
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_user_shards'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            partition_operations, migrations.RunPython.noop
+        ),
+    ]
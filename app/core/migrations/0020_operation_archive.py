@@ -0,0 +1,52 @@
+# Generated by Django 3.2.25 on 2026-10-17 00:59
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_operation_partitions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOperation',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=255)),
+                ('description', models.TextField(blank=True, max_length=255)),
+                ('value', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('date', models.DateField()),
+                ('tag_ids', models.JSONField(default=list)),
+                ('fingerprint', models.CharField(max_length=64, null=True)),
+                ('fingerprint_seq', models.PositiveIntegerField(default=0)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.account')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AccountMonthlySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.account')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='archivedoperation',
+            index=models.Index(fields=['user', 'account', 'date'], name='core_archivedop_user_acc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedoperation',
+            index=models.Index(fields=['fingerprint'], name='core_archivedop_fprint_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='accountmonthlysummary',
+            constraint=models.UniqueConstraint(fields=('user', 'account', 'month'), name='core_accountmonthlysummary_user_account_month'),
+        ),
+    ]
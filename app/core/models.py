@@ -1,7 +1,18 @@
-from django.db import models
+import uuid
+
+from django.db import connections, models, router, transaction
 from django.contrib.auth.models import (AbstractBaseUser, BaseUserManager,
                                         PermissionsMixin)
 from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Max
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
+
+from core.fingerprints import lock_fingerprints, operation_fingerprint
+from core.ledger import BalanceDeltas
+from core.versions import bump_version
 
 
 class UserManager(BaseUserManager):
@@ -38,7 +49,47 @@ class User(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = 'email'
 
 
-class AccountType(models.Model):
+class UserDataQuerySet(models.QuerySet):
+
+    def create(self, **kwargs):
+        """
+        Create an object on the database of its user
+
+        Unlike QuerySet.create(), the object is saved without a database
+        when the queryset has none, so the routers pick it from the object.
+        """
+        obj = self.model(**kwargs)
+        self._for_write = True
+        obj.save(force_insert=True, using=self._db)
+
+        return obj
+
+
+class UserDataModel(models.Model):
+    """
+    Data of a user, whose saves and deletes bump the user data version
+
+    Deletes cascade only to data of the same user, so the bump of the
+    deleted object covers the cascade.
+    """
+    objects = UserDataQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        bump_version(self.user_id, self._state.db)
+
+    def delete(self, using=None, keep_parents=False):
+        using = using or router.db_for_write(type(self), instance=self)
+        result = super().delete(using=using, keep_parents=keep_parents)
+        bump_version(self.user_id, using)
+
+        return result
+
+
+class AccountType(UserDataModel):
     """Account type to be used for accounts"""
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -52,7 +103,7 @@ class AccountType(models.Model):
         return self.name
 
 
-class Account(models.Model):
+class Account(UserDataModel):
     """Account to keep tracking of operations"""
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -70,7 +121,7 @@ class Account(models.Model):
         return self.name
 
 
-class Tag(models.Model):
+class Tag(UserDataModel):
     """Tag to be attached to operations"""
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -83,7 +134,7 @@ class Tag(models.Model):
         return self.name
 
 
-class Operation(models.Model):
+class Operation(UserDataModel):
     """Operation object"""
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -95,3 +146,265 @@ class Operation(models.Model):
     date = models.DateField(auto_now=False, auto_now_add=False, null=True)
     tags = models.ManyToManyField('Tag')
     account = models.ForeignKey('Account', on_delete=models.CASCADE)
+    fingerprint = models.CharField(
+        max_length=64,
+        null=True,
+        blank=True,
+        editable=False
+    )
+    fingerprint_seq = models.PositiveIntegerField(default=0, editable=False)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        # Once partitioned by date, see core.partitions, the table has no
+        # primary key constraint and its fingerprint index holds the date
+        constraints = [
+            models.UniqueConstraint(
+                fields=['fingerprint', 'fingerprint_seq'],
+                condition=models.Q(fingerprint__isnull=False),
+                name='core_operation_fingerprint_uniq'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', 'date', 'id'],
+                name='core_operation_user_date_idx'
+            ),
+            models.Index(
+                fields=['user', 'account', 'date'],
+                name='core_operation_user_acc_idx'
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        """
+        Save the operation and update the stored account balances
+
+        The operation is fingerprinted again when its account, date, value
+        or name changed.
+        """
+        using = kwargs.get('using') or router.db_for_write(
+            type(self), instance=self
+        )
+        with transaction.atomic(using=using):
+            deltas = BalanceDeltas()
+            stored = None
+            if self.pk is not None:
+                stored = self._stored_rows(using).first()
+            if stored is not None:
+                deltas.add_rows([stored], sign=-1)
+            if stored is None or stored['fingerprint'] != self._fingerprint():
+                self.fingerprint_operations([self], using)
+                if kwargs.get('update_fields') is not None:
+                    kwargs['update_fields'] = {
+                        *kwargs['update_fields'],
+                        'fingerprint',
+                        'fingerprint_seq',
+                    }
+            super().save(*args, **kwargs)
+            deltas.add_operation(self)
+            deltas.apply(using)
+
+    def delete(self, using=None, keep_parents=False):
+        """Delete the operation and update the stored account balances"""
+        using = using or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            deltas = BalanceDeltas()
+            deltas.add_rows(list(self._stored_rows(using)), sign=-1)
+            result = super().delete(using=using, keep_parents=keep_parents)
+            deltas.apply(using)
+
+        return result
+
+    def _stored_rows(self, using):
+        """
+        Return the balance and fingerprint columns as stored
+
+        The row is locked until the transaction ends, so concurrent writes
+        of the operation wait and then see the values this one stores,
+        instead of taking the same old value off the balances twice. Must
+        run inside a transaction.
+        """
+        return type(self).objects.using(using).select_for_update().filter(
+            pk=self.pk
+        ).values('user_id', 'account_id', 'date', 'value', 'fingerprint')
+
+    def _fingerprint(self):
+        """Return the fingerprint of the current content of the operation"""
+        return operation_fingerprint(
+            self.account_id,
+            self._meta.get_field('date').to_python(self.date),
+            self._meta.get_field('value').to_python(self.value),
+            self.name
+        )
+
+    @classmethod
+    def fingerprint_operations(cls, operations, using):
+        """
+        Fingerprint operations after the ordinals already stored
+
+        Each operation gets the ordinal following the largest one stored,
+        live or archived, under its fingerprint, so it never takes the place
+        of a line imported later. The operations themselves are not counted
+        as stored. The fingerprints stay locked until the transaction ends,
+        which must wrap the call and the write.
+        """
+        for operation in operations:
+            operation.fingerprint = operation._fingerprint()
+        fingerprints = {operation.fingerprint for operation in operations}
+        lock_fingerprints(connections[using], fingerprints)
+        stored = (
+            cls.objects.using(using).exclude(pk__in=[
+                operation.pk for operation in operations
+                if operation.pk is not None
+            ]),
+            ArchivedOperation.objects.using(using),
+        )
+        next_seq = {}
+        for queryset in stored:
+            for fingerprint, last in queryset.filter(
+                fingerprint__in=fingerprints
+            ).values('fingerprint').annotate(
+                last=Max('fingerprint_seq')
+            ).order_by().values_list('fingerprint', 'last'):
+                next_seq[fingerprint] = max(
+                    next_seq.get(fingerprint, 0), last + 1
+                )
+        for operation in operations:
+            operation.fingerprint_seq = next_seq.get(operation.fingerprint, 0)
+            next_seq[operation.fingerprint] = operation.fingerprint_seq + 1
+
+
+class AccountBalance(models.Model):
+    """Running balance of the operations a user made on an account"""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE
+    )
+    account = models.ForeignKey('Account', on_delete=models.CASCADE)
+    balance = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'account'],
+                name='core_accountbalance_user_account'
+            )
+        ]
+
+
+class AccountDailyBalance(models.Model):
+    """Sum of the operations a user made on an account in a single day"""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE
+    )
+    account = models.ForeignKey('Account', on_delete=models.CASCADE)
+    date = models.DateField()
+    balance = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'account', 'date'],
+                name='core_accountdailybalance_user_account_date'
+            )
+        ]
+
+
+class ArchivedOperation(models.Model):
+    """Operation moved out of the operations table by archive_operations"""
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE
+    )
+    account = models.ForeignKey('Account', on_delete=models.CASCADE)
+    name = models.CharField(max_length=255)
+    description = models.TextField(max_length=255, blank=True)
+    value = models.DecimalField(max_digits=6, decimal_places=2)
+    date = models.DateField()
+    tag_ids = models.JSONField(default=list)
+    fingerprint = models.CharField(max_length=64, null=True)
+    fingerprint_seq = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'account', 'date'],
+                name='core_archivedop_user_acc_idx'
+            ),
+            models.Index(
+                fields=['fingerprint'],
+                name='core_archivedop_fprint_idx'
+            ),
+        ]
+
+
+class AccountMonthlySummary(models.Model):
+    """Sum of the archived operations a user made on an account in a month"""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE
+    )
+    account = models.ForeignKey('Account', on_delete=models.CASCADE)
+    month = models.DateField()
+    balance = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'account', 'month'],
+                name='core_accountmonthlysummary_user_account_month'
+            )
+        ]
+
+
+class IdempotencyKey(models.Model):
+    """Response of a create request, replayed when the request is retried"""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE
+    )
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField()
+    response = models.JSONField(encoder=DjangoJSONEncoder)
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'key'],
+                name='core_idempotencykey_user_key'
+            )
+        ]
+
+
+class DataVersion(models.Model):
+    """Counter bumped by every write to the data of a user"""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True
+    )
+    version = models.PositiveBigIntegerField(default=0)
+    token = models.UUIDField(default=uuid.uuid4, editable=False)
+
+
+class UserShard(models.Model):
+    """Database the data of a user lives on, when it is not the default"""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True
+    )
+    database = models.CharField(max_length=100)
+    moving = models.BooleanField(default=False)
+
+
+@receiver(m2m_changed, sender=Operation.tags.through)
+def bump_tagged_version(sender, instance, action, using, **kwargs):
+    """Bump the data version of the user when tags of operations change"""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_version(instance.user_id, using)
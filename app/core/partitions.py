@@ -0,0 +1,259 @@
+import re
+from datetime import date
+
+from django.db import transaction
+
+
+OPERATION_TABLE = 'core_operation'
+DEFAULT_PARTITION = 'core_operation_default'
+# Declarative partitioning with default partitions and partitioned indexes
+MIN_SERVER_VERSION = 110000
+# Row triggers defined on the partitioned table itself
+PARENT_TRIGGERS_SERVER_VERSION = 130000
+
+_PARTITION_NAME = re.compile(r'^core_operation_p(\d{4})_(\d{2})$')
+
+SEARCH_TRIGGER_SQL = (
+    'CREATE TRIGGER core_operation_search_vector_trigger '
+    'BEFORE INSERT OR UPDATE OF name, description ON {table} '
+    'FOR EACH ROW EXECUTE PROCEDURE core_operation_search_vector_update()'
+)
+
+
+def month_start(day):
+    """Return the first day of the month of day"""
+    return day.replace(day=1)
+
+
+def add_months(month, count):
+    """Return the first day of the month count months after month"""
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    """Return the name of the partition of the operations of month"""
+    return f'{OPERATION_TABLE}_p{month:%Y_%m}'
+
+
+def supports_partitioning(connection):
+    """Return whether the operations can be partitioned on connection"""
+    return (
+        connection.vendor == 'postgresql' and
+        connection.pg_version >= MIN_SERVER_VERSION
+    )
+
+
+def is_partitioned(connection):
+    """Return whether the operations table is partitioned"""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)',
+            [OPERATION_TABLE]
+        )
+        row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def partitions(connection):
+    """Return the (month, name) of the monthly partitions, oldest first"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname FROM pg_inherits '
+            'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'WHERE pg_inherits.inhparent = to_regclass(%s)',
+            [OPERATION_TABLE]
+        )
+        names = [name for name, in cursor.fetchall()]
+
+    months = []
+    for name in names:
+        match = _PARTITION_NAME.match(name)
+        if match:
+            months.append((date(int(match[1]), int(match[2]), 1), name))
+    return sorted(months)
+
+
+def _add_search_trigger(cursor, connection, table):
+    """Keep search_vector current on a partition, before PostgreSQL 13"""
+    if connection.pg_version < PARENT_TRIGGERS_SERVER_VERSION:
+        cursor.execute(SEARCH_TRIGGER_SQL.format(table=table))
+
+
+def create_partition(connection, month):
+    """
+    Add the partition of the operations of month, if it is missing
+
+    Operations of that month already in the default partition move to the
+    new one, which gets the indexes of the table when it is attached.
+    Return whether the partition was created.
+    """
+    name = partition_name(month)
+    start, end = month, add_months(month, 1)
+    with transaction.atomic(using=connection.alias), \
+            connection.cursor() as cursor:
+        cursor.execute('SELECT to_regclass(%s)', [name])
+        if cursor.fetchone()[0] is not None:
+            return False
+        cursor.execute(
+            f'CREATE TABLE {name} (LIKE {OPERATION_TABLE} '
+            f'INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+        )
+        cursor.execute(
+            f'INSERT INTO {name} SELECT * FROM {DEFAULT_PARTITION} '
+            f'WHERE date >= %s AND date < %s',
+            [start, end]
+        )
+        cursor.execute(
+            f'DELETE FROM {DEFAULT_PARTITION} WHERE date >= %s AND date < %s',
+            [start, end]
+        )
+        cursor.execute(
+            f'ALTER TABLE {OPERATION_TABLE} ATTACH PARTITION {name} '
+            f"FOR VALUES FROM ('{start.isoformat()}') "
+            f"TO ('{end.isoformat()}')"
+        )
+        _add_search_trigger(cursor, connection, name)
+    return True
+
+
+def ensure_partitions(connection, first, last):
+    """Create the missing partitions from month first to month last"""
+    created = []
+    month = month_start(first)
+    while month <= last:
+        if create_partition(connection, month):
+            created.append(partition_name(month))
+        month = add_months(month, 1)
+    return created
+
+
+def detach_partitions(connection, before):
+    """
+    Detach the monthly partitions ending on or before the date before
+
+    Only partitions whose operations were all archived can be detached, as
+    the stored balances still count the operations of a detached table
+    while rebuild_balances would not. Raise ValueError and detach nothing
+    otherwise. Return the names of the detached tables.
+    """
+    detached = []
+    with transaction.atomic(using=connection.alias), \
+            connection.cursor() as cursor:
+        for month, name in partitions(connection):
+            if add_months(month, 1) > before:
+                break
+            # Detaching locks the table, so no operation can reach it after
+            # the check
+            cursor.execute(
+                f'ALTER TABLE {OPERATION_TABLE} DETACH PARTITION {name}'
+            )
+            cursor.execute(f'SELECT EXISTS (SELECT 1 FROM {name})')
+            if cursor.fetchone()[0]:
+                raise ValueError(
+                    f'{name} still holds operations, archive the operations '
+                    f'dated before {add_months(month, 1)} first'
+                )
+            detached.append(name)
+    return detached
+
+
+def _with_partition_key(indexdef):
+    """Add the date to the columns of a unique index definition"""
+    return re.sub(r'\(([^()]*)\)', r'(\1, date)', indexdef, count=1)
+
+
+def partition_operation_table(connection, months_ahead, today=None):
+    """
+    Turn the operations table into one range partitioned by month of date
+
+    The rows are copied to a new partitioned table with a partition per
+    month, from the first operation to months_ahead months from today, and
+    a default partition for the rest, such as operations without a date.
+    Its indexes, foreign keys and search trigger are created anew.
+
+    Unique indexes of a partitioned table must hold the partition key, so
+    the table has no primary key constraint, its ids being unique through
+    their sequence, the fingerprint index also holds the date, which the
+    fingerprint already hashes, and the foreign key from the tags of
+    operations is dropped. The table is locked for the whole copy.
+    """
+    if not supports_partitioning(connection):
+        raise ValueError(
+            'Partitioning the operations needs PostgreSQL 11 or later'
+        )
+    if is_partitioned(connection):
+        return []
+    today = today or date.today()
+    old_table = f'{OPERATION_TABLE}_unpartitioned'
+
+    with transaction.atomic(using=connection.alias), \
+            connection.cursor() as cursor:
+        cursor.execute(f'SELECT min(date) FROM {OPERATION_TABLE}')
+        first = cursor.fetchone()[0] or today
+        cursor.execute(
+            'SELECT pg_get_indexdef(i.indexrelid), i.indisunique '
+            'FROM pg_index i '
+            'WHERE i.indrelid = %s::regclass AND NOT i.indisprimary',
+            [OPERATION_TABLE]
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(
+            'SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint '
+            "WHERE conrelid = %s::regclass AND contype = 'f'",
+            [OPERATION_TABLE]
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(
+            'SELECT conrelid::regclass::text, conname FROM pg_constraint '
+            "WHERE confrelid = %s::regclass AND contype = 'f'",
+            [OPERATION_TABLE]
+        )
+        referencing = cursor.fetchall()
+        cursor.execute(
+            "SELECT pg_get_serial_sequence(%s, 'id')", [OPERATION_TABLE]
+        )
+        sequence = cursor.fetchone()[0]
+
+        for table, constraint in referencing:
+            cursor.execute(f'ALTER TABLE {table} DROP CONSTRAINT {constraint}')
+        cursor.execute(f'ALTER TABLE {OPERATION_TABLE} RENAME TO {old_table}')
+        cursor.execute(
+            f'CREATE TABLE {OPERATION_TABLE} (LIKE {old_table} '
+            f'INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            f'PARTITION BY RANGE (date)'
+        )
+        cursor.execute(
+            f'CREATE TABLE {DEFAULT_PARTITION} '
+            f'PARTITION OF {OPERATION_TABLE} DEFAULT'
+        )
+        _add_search_trigger(cursor, connection, DEFAULT_PARTITION)
+        created = ensure_partitions(
+            connection, first, add_months(month_start(today), months_ahead)
+        )
+        cursor.execute(
+            f'INSERT INTO {OPERATION_TABLE} SELECT * FROM {old_table}'
+        )
+        cursor.execute(
+            f'ALTER SEQUENCE {sequence} OWNED BY {OPERATION_TABLE}.id'
+        )
+        cursor.execute(f'DROP TABLE {old_table}')
+
+        for indexdef, unique in indexes:
+            cursor.execute(
+                _with_partition_key(indexdef) if unique else indexdef
+            )
+        cursor.execute(
+            f'CREATE INDEX core_operation_id_idx ON {OPERATION_TABLE} (id)'
+        )
+        for constraint, definition in foreign_keys:
+            cursor.execute(
+                f'ALTER TABLE {OPERATION_TABLE} '
+                f'ADD CONSTRAINT {constraint} {definition}'
+            )
+        if connection.pg_version >= PARENT_TRIGGERS_SERVER_VERSION:
+            cursor.execute(SEARCH_TRIGGER_SQL.format(table=OPERATION_TABLE))
+
+    return [DEFAULT_PARTITION, *created]
@@ -0,0 +1,171 @@
+import cProfile
+import marshal
+import pstats
+import time
+import tracemalloc
+import uuid
+from contextlib import ExitStack
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+
+# Header and query parameter a staff client sends to profile a request
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_PARAM = 'profile'
+# Header of the profiled response, with the URL of its report
+REPORT_HEADER = 'X-Profile-Report'
+# Rows of the report listing functions and allocation sites
+TOP = 30
+
+# Profiling is process wide, so profiled requests take turns
+_lock = Lock()
+
+
+def wants_profile(request):
+    """Return whether the client asked for the request to be profiled"""
+    return PROFILE_HEADER in request.META or PROFILE_PARAM in request.GET
+
+
+def is_staff(request):
+    """
+    Return whether the request comes from a staff user
+
+    The request is authenticated the way API views do it, as this runs
+    before them.
+    """
+    drf_request = Request(request, authenticators=[
+        authentication()
+        for authentication in api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    ])
+    try:
+        user = drf_request.user
+    except APIException:
+        return False
+    return bool(user and user.is_staff)
+
+
+def report_key(report_id):
+    return f'profile:{report_id}'
+
+
+def save_report(report, stats):
+    """Keep a report and its pstats dump for PROFILE_REPORT_TTL seconds"""
+    cache.set(
+        report_key(report['id']),
+        {'report': report, 'pstats': stats},
+        settings.PROFILE_REPORT_TTL
+    )
+
+
+def load_report(report_id):
+    """Return the report and pstats dump saved under an id, or None"""
+    return cache.get(report_key(report_id))
+
+
+class QueryRecorder:
+    """Execute wrapper keeping the SQL of every query and its duration"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'database': context['connection'].alias,
+                'sql': sql,
+                'many': many,
+                'duration_ms': round(
+                    (time.perf_counter() - started) * 1000, 3
+                ),
+            })
+
+
+def top_functions(stats):
+    """Return the functions with the most cumulative time in pstats stats"""
+    stats.sort_stats(pstats.SortKey.CUMULATIVE)
+    functions = []
+    for function in stats.fcn_list[:TOP]:
+        primitive, calls, total, cumulative, _ = stats.stats[function]
+        filename, line, name = function
+        functions.append({
+            'function': f'{filename}:{line}({name})',
+            'calls': calls,
+            'primitive_calls': primitive,
+            'total_ms': round(total * 1000, 3),
+            'cumulative_ms': round(cumulative * 1000, 3),
+        })
+    return functions
+
+
+def top_allocations(snapshot):
+    """Return the lines that allocated the most memory still in use"""
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+    ))
+    return [
+        {
+            'site': f'{stat.traceback[0].filename}:{stat.traceback[0].lineno}',
+            'size': stat.size,
+            'count': stat.count,
+        }
+        for stat in snapshot.statistics('lineno')[:TOP]
+    ]
+
+
+def profile_request(request, get_response):
+    """
+    Serve a request under cProfile and tracemalloc and save the report
+
+    Return the response and the saved report. Allocations are traced
+    across the process, so those of concurrent requests show up too.
+    Streamed bodies are produced after the view returns, out of the
+    profile.
+    """
+    recorder = QueryRecorder()
+    profiler = cProfile.Profile()
+    with _lock, ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(recorder))
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        started = time.perf_counter()
+        try:
+            profiler.enable()
+            try:
+                response = get_response(request)
+            finally:
+                profiler.disable()
+            wall = time.perf_counter() - started
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            if not tracing:
+                tracemalloc.stop()
+
+    stats = pstats.Stats(profiler)
+    report = {
+        'id': uuid.uuid4().hex,
+        'method': request.method,
+        'path': request.get_full_path(),
+        'status': response.status_code,
+        'wall_ms': round(wall * 1000, 3),
+        'peak_memory': peak,
+        'queries': recorder.queries,
+        'functions': top_functions(stats),
+        'allocations': top_allocations(snapshot),
+    }
+    save_report(report, marshal.dumps(stats.stats))
+    return response, report
@@ -0,0 +1,163 @@
+import hashlib
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS
+
+from core.sharding import UserMoving, acting_user_id, is_sharded, shard_of
+
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class RequestRouting:
+    """Routing state of the request being served"""
+
+    def __init__(self, request, read_alias):
+        self.request = request
+        self.read_alias = read_alias
+        self.shards = {}
+
+    @property
+    def user_id(self):
+        """Return the id of the user, once the view authenticated it"""
+        user = getattr(self.request, 'user', None)
+        if user is None or not user.is_authenticated:
+            return None
+        return user.pk
+
+
+current_routing = ContextVar('current_routing', default=None)
+
+
+def client_key(request):
+    """
+    Return a key for the client of a request, None if it is anonymous
+
+    The client is known by its token or session cookie, which identifies
+    the user without a query before the view authenticates it.
+    """
+    credentials = request.META.get('HTTP_AUTHORIZATION') or (
+        request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    )
+    if not credentials:
+        return None
+    return f'replica-pin:{hashlib.sha256(credentials.encode()).hexdigest()}'
+
+
+def pin_to_primary(key):
+    """Send the reads of a client to the primary for a while"""
+    cache.set(key, True, settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned(key):
+    """Return whether the reads of a client go to the primary"""
+    return cache.get(key, False)
+
+
+def _other_database(hints):
+    """Return the database of the hinted instance, unless it is the primary"""
+    instance = hints.get('instance')
+    database = instance._state.db if instance is not None else None
+    if database in (None, DEFAULT_DB_ALIAS, *settings.REPLICA_DATABASES):
+        return None
+    return database
+
+
+class ReplicaRouter:
+    """
+    Send writes to the primary and reads where the middleware chose
+
+    Tokens, sessions and users are always read from the primary, since a
+    client uses them right after creating them, before it can be pinned.
+    Queries about an instance of another database, such as a shard, stay
+    on that database.
+    """
+    primary_models = {
+        'authtoken.token',
+        'sessions.session',
+        settings.AUTH_USER_MODEL.lower(),
+    }
+
+    def db_for_read(self, model, **hints):
+        database = _other_database(hints)
+        if database is not None:
+            return database
+        routing = current_routing.get()
+        if routing is None or model._meta.label_lower in self.primary_models:
+            return DEFAULT_DB_ALIAS
+        return routing.read_alias
+
+    def db_for_write(self, model, **hints):
+        return _other_database(hints) or DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *settings.REPLICA_DATABASES}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.REPLICA_DATABASES:
+            return False
+        return None
+
+
+class ShardRouter:
+    """
+    Send the data of each user to the shard the shard map places it on
+
+    The user is the one of the instance the query is about, or else the
+    one of the request being served or of acting_for(). Writes of a user
+    being moved raise UserMoving. Data on the default database is left to
+    the routers after this one.
+    """
+
+    def _user_id(self, hints):
+        instance = hints.get('instance')
+        if isinstance(instance, get_user_model()):
+            return instance.pk
+        if instance is not None and 'user_id' in instance.__dict__:
+            # A deferred user_id would be loaded through this router
+            return instance.user_id
+        routing = current_routing.get()
+        user_id = acting_user_id.get()
+        if user_id is None and routing is not None:
+            user_id = routing.user_id
+        return user_id
+
+    def _placement(self, model, hints):
+        if not is_sharded(model):
+            return None
+        user_id = self._user_id(hints)
+        if user_id is None:
+            return None
+        routing = current_routing.get()
+        return shard_of(user_id, routing.shards if routing else None)
+
+    def db_for_read(self, model, **hints):
+        placement = self._placement(model, hints)
+        if placement is None or placement.database == DEFAULT_DB_ALIAS:
+            return None
+        return placement.database
+
+    def db_for_write(self, model, **hints):
+        placement = self._placement(model, hints)
+        if placement is None:
+            return None
+        if placement.moving:
+            raise UserMoving()
+        if placement.database == DEFAULT_DB_ALIAS:
+            return None
+        return placement.database
+
+    def allow_relation(self, obj1, obj2, **hints):
+        user_model = get_user_model()
+        for user, obj in ((obj1, obj2), (obj2, obj1)):
+            if isinstance(user, user_model) and is_sharded(type(obj)):
+                return True
+        if is_sharded(type(obj1)) and is_sharded(type(obj2)):
+            return obj1._state.db == obj2._state.db
+        return None
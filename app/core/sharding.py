@@ -0,0 +1,274 @@
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from core.versions import current_version
+
+
+# Models holding the data of a user, in an order that copies referenced
+# rows before the rows referencing them
+SHARDED_MODELS = (
+    'core.accounttype',
+    'core.account',
+    'core.tag',
+    'core.operation',
+    'core.operation_tags',
+    'core.accountbalance',
+    'core.accountdailybalance',
+    'core.archivedoperation',
+    'core.accountmonthlysummary',
+    'core.idempotencykey',
+    'core.dataversion',
+)
+SHARD_ID_RANGE = 1 << 40
+
+Placement = namedtuple('Placement', 'database moving')
+DEFAULT_PLACEMENT = Placement(DEFAULT_DB_ALIAS, False)
+
+# User whose data is being worked on outside of a request
+acting_user_id = ContextVar('acting_user_id', default=None)
+
+
+class UserMoving(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'The data of this user is being moved, retry shortly.'
+    default_code = 'user_moving'
+
+
+def is_sharded(model):
+    """Return whether the rows of model live on the shard of their user"""
+    return model._meta.label_lower in SHARDED_MODELS
+
+
+def sharded_models():
+    """Return the sharded models, in copy order"""
+    from django.apps import apps
+
+    models = {
+        model._meta.label_lower: model
+        for model in apps.get_models(include_auto_created=True)
+    }
+    return [models[label] for label in SHARDED_MODELS]
+
+
+@contextmanager
+def acting_for(user_id):
+    """Route the queries about data of no particular user to user_id"""
+    token = acting_user_id.set(user_id)
+    try:
+        yield
+    finally:
+        acting_user_id.reset(token)
+
+
+def _shard_map_key(user_id):
+    return f'shard-map:u{user_id}'
+
+
+def shard_of(user_id, memo=None):
+    """
+    Return the Placement of the data of a user
+
+    With a single database this needs no lookup. The shard map is read from
+    the primary and cached for SHARD_MAP_CACHE_SECONDS, and in memo for the
+    rest of a request.
+    """
+    from core.models import UserShard
+
+    if len(settings.SHARD_DATABASES) == 1:
+        return DEFAULT_PLACEMENT
+    if memo is not None and user_id in memo:
+        return memo[user_id]
+
+    placement = cache.get(_shard_map_key(user_id))
+    if placement is None:
+        placement = UserShard.objects.using(DEFAULT_DB_ALIAS).filter(
+            user_id=user_id
+        ).values_list('database', 'moving').first() or DEFAULT_PLACEMENT
+        cache.set(
+            _shard_map_key(user_id),
+            tuple(placement),
+            settings.SHARD_MAP_CACHE_SECONDS
+        )
+    placement = Placement(*placement)
+    if memo is not None:
+        memo[user_id] = placement
+
+    return placement
+
+
+def _set_placement(user_id, database, moving):
+    """Store the placement of a user in the shard map"""
+    from core.models import UserShard
+
+    UserShard.objects.using(DEFAULT_DB_ALIAS).update_or_create(
+        user_id=user_id,
+        defaults={'database': database, 'moving': moving}
+    )
+    cache.delete(_shard_map_key(user_id))
+
+
+def ensure_user_row(user, database):
+    """
+    Copy the row of a user to a shard, for the foreign keys of its data
+
+    The copy has no usable password and is never read: users are always
+    read from the default database.
+    """
+    if database == DEFAULT_DB_ALIAS:
+        return
+    user_model = get_user_model()
+    copy = user_model(pk=user.pk, email=user.email, name=user.name)
+    copy.set_unusable_password()
+    user_model._base_manager.using(database).bulk_create(
+        [copy], ignore_conflicts=True
+    )
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def place_new_user(sender, instance, created, using, **kwargs):
+    """Place the data of a new user on a shard picked by its id"""
+    shards = settings.SHARD_DATABASES
+    if not created or using != DEFAULT_DB_ALIAS or len(shards) == 1:
+        return
+    database = shards[instance.pk % len(shards)]
+    if database != DEFAULT_DB_ALIAS:
+        ensure_user_row(instance, database)
+        _set_placement(instance.pk, database, moving=False)
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def delete_user_shard_data(sender, instance, using, **kwargs):
+    """Delete the data of a user with the copy of its row on its shard"""
+    if using != DEFAULT_DB_ALIAS:
+        return
+    database = shard_of(instance.pk).database
+    if database != DEFAULT_DB_ALIAS:
+        get_user_model()._base_manager.using(database).filter(
+            pk=instance.pk
+        ).delete()
+        cache.delete(_shard_map_key(instance.pk))
+
+
+def reserve_id_range(database):
+    """
+    Start the ids of the sharded tables of a shard in a range of its own
+
+    The shard at index i of SHARD_DATABASES gives ids from
+    i * SHARD_ID_RANGE on, so the data of a user can move between shards
+    with its ids. Sequences already past the start are left alone.
+    """
+    index = settings.SHARD_DATABASES.index(database)
+    if index == 0:
+        return
+    start = index * SHARD_ID_RANGE
+    connection = connections[database]
+    with connection.cursor() as cursor:
+        for model in sharded_models():
+            if not model._meta.pk.auto_created:
+                continue
+            table = model._meta.db_table
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    'SELECT pg_get_serial_sequence(%s, %s)',
+                    [connection.ops.quote_name(table), model._meta.pk.column]
+                )
+                sequence = cursor.fetchone()[0]
+                cursor.execute(f'SELECT last_value FROM {sequence}')
+                if cursor.fetchone()[0] < start:
+                    cursor.execute(
+                        'SELECT setval(%s, %s, false)', [sequence, start]
+                    )
+            elif connection.vendor == 'sqlite':
+                cursor.execute(
+                    'SELECT seq FROM sqlite_sequence WHERE name = %s', [table]
+                )
+                row = cursor.fetchone()
+                if row is None:
+                    cursor.execute(
+                        'INSERT INTO sqlite_sequence (name, seq) '
+                        'VALUES (%s, %s)',
+                        [table, start - 1]
+                    )
+                elif row[0] < start - 1:
+                    cursor.execute(
+                        'UPDATE sqlite_sequence SET seq = %s WHERE name = %s',
+                        [start - 1, table]
+                    )
+
+
+def _user_rows(model, database, user_id):
+    """Return the rows of model belonging to a user on a database"""
+    rows = model._base_manager.using(database)
+    if model._meta.auto_created:
+        return rows.filter(operation__user_id=user_id)
+    return rows.filter(user_id=user_id)
+
+
+def move_user(user, target, grace=None, batch_size=1000):
+    """
+    Move the data of a user to the target shard, return the copied rows
+
+    The user is flagged as moving, so its writes fail with UserMoving,
+    and after grace seconds, once every process sees the flag, its rows
+    are copied with their ids. If the data version changed meanwhile the
+    copy is rolled back and the move fails. Otherwise the shard map points
+    to the target and, after grace seconds more for the requests still
+    reading the source, the rows are deleted from the source.
+    """
+    if grace is None:
+        grace = settings.SHARD_MAP_CACHE_SECONDS
+    source = shard_of(user.pk).database
+    if target not in settings.SHARD_DATABASES:
+        raise ValueError(f'{target} is not one of SHARD_DATABASES')
+    if source == target:
+        raise ValueError(f'User {user.pk} is already on {target}')
+
+    _set_placement(user.pk, source, moving=True)
+    try:
+        time.sleep(grace)
+        version = current_version(user.pk, using=source)
+        copied = 0
+        with transaction.atomic(using=target):
+            ensure_user_row(user, target)
+            for model in sharded_models():
+                rows = _user_rows(model, source, user.pk).order_by('pk')
+                last = None
+                while True:
+                    batch = rows if last is None else rows.filter(pk__gt=last)
+                    batch = list(batch[:batch_size])
+                    if not batch:
+                        break
+                    model._base_manager.using(target).bulk_create(batch)
+                    copied += len(batch)
+                    last = batch[-1].pk
+            if current_version(user.pk, using=source) != version:
+                raise RuntimeError(
+                    f'User {user.pk} wrote during the move, try again'
+                )
+    except BaseException:
+        _set_placement(user.pk, source, moving=False)
+        raise
+    _set_placement(user.pk, target, moving=False)
+
+    time.sleep(grace)
+    with transaction.atomic(using=source):
+        for model in reversed(sharded_models()):
+            _user_rows(model, source, user.pk)._raw_delete(source)
+        if source != DEFAULT_DB_ALIAS:
+            get_user_model()._base_manager.using(source).filter(
+                pk=user.pk
+            )._raw_delete(source)
+
+    return copied
@@ -0,0 +1,126 @@
+import random
+import time
+from collections import deque
+from threading import Lock
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+
+# Longest parameter kept in the log, as its repr
+MAX_PARAM_LENGTH = 200
+
+
+class SlowQueryLog:
+    """The last slow queries run by this process, newest last"""
+
+    def __init__(self, size):
+        self._lock = Lock()
+        self._entries = deque(maxlen=size)
+        self.total = 0
+
+    def record(self, entry):
+        with self._lock:
+            self._entries.append(entry)
+            self.total += 1
+
+    def entries(self):
+        with self._lock:
+            return list(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+slow_queries = SlowQueryLog(settings.SLOW_QUERY_LOG_SIZE)
+
+
+def format_params(params):
+    """Return the parameters of a query as short strings"""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        params = params.values()
+    return [repr(param)[:MAX_PARAM_LENGTH] for param in params]
+
+
+def explain(connection, sql, params):
+    """
+    Return the plan of a query, as the lines of its EXPLAIN
+
+    PostgreSQL runs the query again, to report its actual timings and
+    buffer usage. A failure is returned as the plan, in a savepoint so
+    it does not break the transaction of the request.
+    """
+    options = {}
+    if connection.vendor == 'postgresql':
+        options = {'analyze': True, 'buffers': True}
+    prefix = connection.ops.explain_query_prefix(**options)
+    try:
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute(f'{prefix} {sql}', params)
+                return [
+                    ' '.join(str(column) for column in row)
+                    for row in cursor.fetchall()
+                ]
+    except DatabaseError as error:
+        return [f'EXPLAIN failed: {error}']
+
+
+class SlowQueryCapture:
+    """
+    Execute wrapper logging the queries of a request that run too long
+
+    Only SELECT statements are explained, as EXPLAIN ANALYZE runs the
+    statement again.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.threshold = settings.SLOW_QUERY_SECONDS
+        self.explaining = False
+
+    def __call__(self, execute, sql, params, many, context):
+        if self.explaining:
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration = time.perf_counter() - started
+        if duration >= self.threshold:
+            self.record(context['connection'], sql, params, many, duration)
+        return result
+
+    def view_name(self):
+        match = getattr(self.request, 'resolver_match', None)
+        return match.view_name if match is not None else None
+
+    def record(self, connection, sql, params, many, duration):
+        plan = None
+        if (not many and sql.lstrip()[:6].upper() == 'SELECT'
+                and connection.features.supports_explaining_query_execution
+                and random.random() < settings.SLOW_QUERY_EXPLAIN_RATE):
+            self.explaining = True
+            try:
+                plan = explain(connection, sql, params)
+            finally:
+                self.explaining = False
+        slow_queries.record({
+            'time': time.time(),
+            'duration': round(duration, 6),
+            'database': connection.alias,
+            'view': self.view_name(),
+            'method': self.request.method,
+            'path': self.request.path,
+            'sql': sql,
+            'params': None if many else format_params(params),
+            'plan': plan,
+        })
+
+
+def metric_samples():
+    """Yield the slow query counter in the Prometheus text format"""
+    name = 'db_slow_queries_total'
+    yield f'# HELP {name} Queries slower than SLOW_QUERY_SECONDS'
+    yield f'# TYPE {name} counter'
+    yield f'{name} {slow_queries.total}'
@@ -0,0 +1,183 @@
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.archive import archive_horizon
+from core.models import (Account, AccountBalance, AccountDailyBalance,
+                         AccountMonthlySummary, ArchivedOperation, Operation,
+                         Tag)
+
+from operation.caching import RESPONSE_CACHE
+
+from statement.importer import import_statement
+from statement.parsers import CSVStatementParser
+
+
+OPERATIONS_URL = reverse('operation:operation-list')
+
+
+def account_balance_url(account_id):
+    """Return the account balance URL"""
+    return reverse('operation:operation-account-balance', args=[account_id])
+
+
+class ArchiveTests(TestCase):
+    """Test old operations move to the archive and back"""
+
+    def setUp(self):
+        caches[RESPONSE_CACHE].clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'sample_user@gmail.com',
+            'testpass123'
+        )
+        self.client.force_authenticate(self.user)
+        self.account = Account.objects.create(user=self.user, name='Bank')
+        self.tag = Tag.objects.create(user=self.user, name='Food')
+        for day, value in (
+            (date(2021, 1, 5), '-5.00'),
+            (date(2021, 1, 20), '-7.50'),
+            (date(2021, 2, 10), '100.00'),
+            (date(2021, 3, 1), '-1.25'),
+        ):
+            operation = Operation.objects.create(
+                user=self.user,
+                account=self.account,
+                name='Supermarket',
+                value=value,
+                date=day
+            )
+            operation.tags.add(self.tag)
+
+    def _balance(self, **params):
+        res = self.client.get(account_balance_url(self.account.id), params)
+        return Decimal(str(res.data))
+
+    def _archive(self, before):
+        out = StringIO()
+        call_command(
+            'archive_operations', before=before, batch_size=2, stdout=out
+        )
+        return out.getvalue()
+
+    def test_archive_operations(self):
+        """Test old operations move to the archive with monthly summaries"""
+        out = self._archive(date(2021, 3, 1))
+
+        self.assertIn('Archived 3 operations', out)
+        self.assertEqual(Operation.objects.count(), 1)
+        self.assertEqual(ArchivedOperation.objects.count(), 3)
+        self.assertEqual(
+            ArchivedOperation.objects.first().tag_ids, [self.tag.id]
+        )
+        summaries = AccountMonthlySummary.objects.order_by('month')
+        self.assertEqual(
+            [(row.month, row.balance) for row in summaries],
+            [
+                (date(2021, 1, 1), Decimal('-12.50')),
+                (date(2021, 2, 1), Decimal('100.00')),
+            ]
+        )
+        self.assertFalse(
+            AccountDailyBalance.objects.filter(date__lt=date(2021, 3, 1))
+        )
+        self.assertEqual(
+            AccountBalance.objects.get().balance, Decimal('86.25')
+        )
+
+    def test_balances_stay_exact(self):
+        """Test balances over any range count the archived operations"""
+        ranges = (
+            {},
+            {'year': 2021},
+            {'year': 2021, 'month': 1},
+            {'date_from': '2021-01-10', 'date_to': '2021-02-28'},
+            {'date_from': '2021-01-10', 'date_to': '2021-01-25'},
+            {'date_to': '2021-01-31'},
+            {'date_from': '2021-02-01'},
+        )
+        expected = [self._balance(**params) for params in ranges]
+
+        self._archive(date(2021, 3, 1))
+
+        self.assertEqual(
+            [self._balance(**params) for params in ranges], expected
+        )
+
+    def test_archived_operations_leave_the_list(self):
+        """Test the operations list only shows live operations"""
+        self.client.get(OPERATIONS_URL)
+        self._archive(date(2021, 3, 1))
+
+        res = self.client.get(OPERATIONS_URL)
+
+        self.assertEqual(
+            [row['date'] for row in res.data['results']], ['2021-03-01']
+        )
+
+    def test_stored_balances_verify_after_archiving(self):
+        """Test the balance verification counts the archived operations"""
+        self._archive(date(2021, 3, 1))
+        out = StringIO()
+
+        call_command('rebuild_balances', stdout=out)
+        call_command('rebuild_balances', verify=True, stdout=out)
+
+        self.assertIn('Stored balances are correct', out.getvalue())
+        self.assertEqual(
+            AccountBalance.objects.get().balance, Decimal('86.25')
+        )
+
+    def test_restore_operations(self):
+        """Test restored operations come back with their ids and tags"""
+        ids = set(Operation.objects.values_list('id', flat=True))
+        daily = set(AccountDailyBalance.objects.values_list('date', 'balance'))
+        self._archive(date(2021, 3, 1))
+        out = StringIO()
+
+        call_command(
+            'restore_operations', '2021-01-01', batch_size=2, stdout=out
+        )
+
+        self.assertIn('Restored 3 operations', out.getvalue())
+        self.assertEqual(set(Operation.objects.values_list('id', flat=True)),
+                         ids)
+        self.assertFalse(ArchivedOperation.objects.exists())
+        self.assertFalse(AccountMonthlySummary.objects.exists())
+        self.assertEqual(
+            set(AccountDailyBalance.objects.values_list('date', 'balance')),
+            daily
+        )
+        self.assertEqual(
+            Operation.objects.filter(tags=self.tag).count(), 4
+        )
+
+    def test_reimported_lines_of_archived_operations_are_skipped(self):
+        """Test importing a statement again skips its archived lines"""
+        account = Account.objects.create(user=self.user, name='Card')
+        lines = 'date,name,value\n2021-01-02,Bakery,-3.00\n'
+        import_statement(
+            self.user, account, CSVStatementParser().parse(StringIO(lines))
+        )
+        self._archive(date(2021, 3, 1))
+
+        report = import_statement(
+            self.user, account, CSVStatementParser().parse(StringIO(lines))
+        )
+
+        self.assertEqual((report.created, report.skipped), (0, 1))
+
+    @override_settings(ARCHIVE_AFTER_MONTHS=12)
+    def test_archive_horizon(self):
+        """Test the horizon is the start of a month a year back"""
+        self.assertEqual(
+            archive_horizon(date(2022, 3, 15)), date(2021, 3, 1)
+        )
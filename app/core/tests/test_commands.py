@@ -1,23 +1,214 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
 from unittest.mock import patch
 
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
 from django.db.utils import OperationalError
 from django.test import TestCase
+from django.utils import timezone
+
+from core.management.commands.fingerprint_operations import duplicate_groups
+from core.models import (Account, AccountBalance, AccountDailyBalance,
+                         IdempotencyKey, Operation)
 
 
 class CommandTests(TestCase):
 
     def test_wait_for_db_ready(self):
         """Test waiting for db when db is available"""
-        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
-            gi.return_value = True
-            call_command('wait_for_db')
-            self.assertEqual(gi.call_count, 1)
+        out = StringIO()
+
+        call_command('wait_for_db', stdout=out)
+
+        self.assertIn('Database available!', out.getvalue())
 
     @patch('time.sleep', return_value=True)
     def test_wait_for_db(self, ts):
-        """Test waiting for db"""
-        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
-            gi.side_effect = [OperationalError] * 5 + [True]
-            call_command('wait_for_db')
-            self.assertEqual(gi.call_count, 6)
+        """Test waiting for db, backing off after each failed query"""
+        with patch('core.management.commands.wait_for_db.ping') as ping:
+            ping.side_effect = [OperationalError] * 5 + [None]
+            call_command('wait_for_db', max_delay=3, stdout=StringIO())
+            self.assertEqual(ping.call_count, 6)
+        self.assertEqual(
+            [call.args[0] for call in ts.call_args_list],
+            [0.5, 1, 2, 3, 3]
+        )
+
+    @patch('time.sleep', return_value=True)
+    def test_wait_for_db_timeout(self, ts):
+        """Test waiting for db fails once the timeout has passed"""
+        with patch('core.management.commands.wait_for_db.ping') as ping:
+            ping.side_effect = OperationalError('connection refused')
+            with self.assertRaises(CommandError):
+                call_command('wait_for_db', timeout=0, stdout=StringIO())
+        ts.assert_not_called()
+
+
+class RebuildBalancesCommandTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@gmail.com',
+            'testpass'
+        )
+        self.account = Account.objects.create(user=self.user, name='Bank')
+        for day in (1, 1, 2):
+            Operation.objects.create(
+                user=self.user,
+                account=self.account,
+                name='Coffee',
+                value=-2.50,
+                date=date(2021, 1, day)
+            )
+
+    def test_verify_stored_balances(self):
+        """Test verifying balances kept in sync with the operations"""
+        out = StringIO()
+        call_command('rebuild_balances', verify=True, stdout=out)
+
+        self.assertIn('correct', out.getvalue())
+
+    def test_verify_reports_wrong_balances(self):
+        """Test verifying fails when a stored balance is wrong"""
+        AccountDailyBalance.objects.filter(date=date(2021, 1, 2)).delete()
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_balances', verify=True, stdout=StringIO())
+
+    def test_rebuild_balances(self):
+        """Test rebuilding the balances from the operations"""
+        AccountBalance.objects.all().update(balance=0)
+        AccountDailyBalance.objects.all().delete()
+
+        call_command('rebuild_balances', stdout=StringIO())
+
+        balance = AccountBalance.objects.get(account=self.account)
+        self.assertEqual(balance.balance, Decimal('-7.50'))
+        daily = AccountDailyBalance.objects.get(date=date(2021, 1, 1))
+        self.assertEqual(daily.balance, Decimal('-5.00'))
+        call_command('rebuild_balances', verify=True, stdout=StringIO())
+
+
+class FingerprintOperationsCommandTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@gmail.com',
+            'testpass'
+        )
+        self.account = Account.objects.create(user=self.user, name='Bank')
+        self.coffees = [
+            Operation.objects.create(
+                user=self.user,
+                account=self.account,
+                name=name,
+                value=-2.50,
+                date=date(2021, 1, 1)
+            )
+            for name in ('Coffee', ' COFFEE ', 'Café')
+        ]
+        self.rent = Operation.objects.create(
+            user=self.user,
+            account=self.account,
+            name='Rent',
+            value=-500,
+            date=date(2021, 1, 1)
+        )
+        # Operations stored before fingerprints existed
+        Operation.objects.update(fingerprint=None, fingerprint_seq=0)
+
+    def test_backfill_fingerprints(self):
+        """Test fingerprinting operations made before fingerprints"""
+        out = StringIO()
+        call_command('fingerprint_operations', stdout=out)
+
+        coffees = Operation.objects.filter(
+            pk__in=[operation.pk for operation in self.coffees]
+        ).order_by('id')
+        self.assertEqual(
+            len({operation.fingerprint for operation in coffees}), 2
+        )
+        self.assertEqual(
+            [operation.fingerprint_seq for operation in coffees], [0, 1, 0]
+        )
+        self.assertFalse(
+            Operation.objects.filter(fingerprint__isnull=True).exists()
+        )
+        self.assertIn('Fingerprinted 4 operations', out.getvalue())
+        self.assertIn(
+            f'operations {self.coffees[0].pk}, {self.coffees[1].pk}',
+            out.getvalue()
+        )
+        self.assertIn('1 groups of duplicated operations', out.getvalue())
+
+    def test_backfill_after_imported_operations(self):
+        """Test backfilled ordinals do not clash with imported ones"""
+        call_command('fingerprint_operations', stdout=StringIO())
+        Operation.objects.filter(pk=self.coffees[0].pk).update(
+            fingerprint=None, fingerprint_seq=0
+        )
+
+        call_command('fingerprint_operations', stdout=StringIO())
+
+        self.assertEqual(
+            Operation.objects.get(pk=self.coffees[0].pk).fingerprint_seq, 2
+        )
+
+    def test_report_only(self):
+        """Test reporting duplicates leaves fingerprints alone"""
+        out = StringIO()
+        call_command('fingerprint_operations', report_only=True, stdout=out)
+
+        self.assertIn('0 groups of duplicated operations', out.getvalue())
+        self.assertFalse(
+            Operation.objects.filter(fingerprint__isnull=False).exists()
+        )
+
+    def test_duplicate_report_uses_index(self):
+        """Test the duplicates are grouped from the fingerprint index"""
+        groups = duplicate_groups(Operation.objects.all())
+        sql, params = groups.query.sql_with_params()
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute(f'EXPLAIN {sql}', params)
+            else:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = '\n'.join(str(row[-1]) for row in cursor.fetchall())
+
+        self.assertIn('core_operation_fingerprint_uniq', plan)
+
+
+class PurgeIdempotencyKeysCommandTests(TestCase):
+
+    def test_purge_expired_keys(self):
+        """Test only the keys past their TTL are deleted"""
+        user = get_user_model().objects.create_user(
+            'test@gmail.com',
+            'testpass'
+        )
+        for key in ('old', 'new'):
+            IdempotencyKey.objects.create(
+                user=user,
+                key=key,
+                request_hash='',
+                status_code=201,
+                response={}
+            )
+        IdempotencyKey.objects.filter(key='old').update(
+            created=timezone.now() - timedelta(days=2)
+        )
+        out = StringIO()
+
+        with self.settings(IDEMPOTENCY_KEY_TTL=24 * 60 * 60):
+            call_command('purge_idempotency_keys', stdout=out)
+
+        self.assertEqual(
+            list(IdempotencyKey.objects.values_list('key', flat=True)),
+            ['new']
+        )
+        self.assertIn('Deleted 1 expired', out.getvalue())
@@ -0,0 +1,47 @@
+from unittest.mock import patch
+
+from django.db import OperationalError
+from django.test import TestCase
+from django.urls import reverse
+
+
+HEALTHZ_URL = reverse('healthz')
+READYZ_URL = reverse('readyz')
+
+
+class HealthTests(TestCase):
+    """Test the probes of the orchestrator"""
+
+    def test_healthz(self):
+        """Test the liveness probe does not query the databases"""
+        with self.assertNumQueries(0):
+            res = self.client.get(HEALTHZ_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json(), {'status': 'ok'})
+
+    def test_readyz(self):
+        """Test the readiness probe passes on a migrated database"""
+        res = self.client.get(READYZ_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json(), {'status': 'ok'})
+
+    @patch('core.health.ping', side_effect=OperationalError)
+    def test_readyz_database_unavailable(self, ping):
+        """Test the readiness probe fails when a database does not answer"""
+        res = self.client.get(READYZ_URL)
+
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res.json()['databases'], {'default': 'unavailable'})
+
+    @patch('core.health._migrated', set())
+    @patch('core.health.unapplied_migrations', return_value=['core.0099'])
+    def test_readyz_unapplied_migrations(self, unapplied):
+        """Test the readiness probe fails until migrations are applied"""
+        res = self.client.get(READYZ_URL)
+
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(
+            res.json()['databases'], {'default': 'unapplied migrations'}
+        )
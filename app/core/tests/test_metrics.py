@@ -0,0 +1,103 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.metrics import Histogram, request_metrics
+from core.models import Account, Operation
+
+from operation.caching import RESPONSE_CACHE, stats
+
+
+METRICS_URL = reverse('metrics')
+OPERATIONS_URL = reverse('operation:operation-list')
+
+
+class InstrumentationTests(TestCase):
+    """Test requests are measured and their metrics exposed"""
+
+    def setUp(self):
+        caches[RESPONSE_CACHE].clear()
+        request_metrics.reset()
+        stats.reset()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'sample_user@gmail.com',
+            'testpass123'
+        )
+        self.client.force_authenticate(self.user)
+        account = Account.objects.create(user=self.user, name='Bank')
+        Operation.objects.create(
+            user=self.user,
+            account=account,
+            name='Supermarket',
+            value='-5.00',
+            date='2021-01-05'
+        )
+
+    def test_server_timing_header(self):
+        """Test responses report their total, database and serializer time"""
+        res = self.client.get(OPERATIONS_URL)
+
+        match = re.fullmatch(
+            r'total;dur=([\d.]+), db;dur=([\d.]+);desc="(\d+) queries", '
+            r'serializer;dur=([\d.]+)',
+            res['Server-Timing']
+        )
+        self.assertIsNotNone(match)
+        total, db, queries, serializer = match.groups()
+        self.assertGreater(int(queries), 0)
+        self.assertGreater(float(serializer), 0)
+        self.assertLessEqual(float(db), float(total))
+
+    def test_metrics_need_staff(self):
+        """Test only staff users can read the metrics"""
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, 403)
+
+    def test_metrics(self):
+        """Test the metrics have histograms per view and action"""
+        self.client.get(OPERATIONS_URL)
+        self.client.get(OPERATIONS_URL)
+        self.user.is_staff = True
+        self.user.save()
+
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res['Content-Type'].startswith('text/plain'))
+        lines = res.content.decode().splitlines()
+        labels = (
+            'view="operation:operation-list",action="list",method="GET",'
+            'status="2xx"'
+        )
+        self.assertIn(f'http_request_duration_seconds_count{{{labels}}} 2',
+                      lines)
+        self.assertIn(f'http_request_queries_count{{{labels}}} 2', lines)
+        self.assertIn('# TYPE http_response_size_bytes histogram', lines)
+        self.assertIn('response_cache_lookups_total{outcome="misses"} 1',
+                      lines)
+        self.assertIn('response_cache_lookups_total{outcome="hits"} 1', lines)
+
+
+class HistogramTests(TestCase):
+    """Test the histograms count values in their buckets"""
+
+    def test_buckets(self):
+        """Test bucket counts are cumulative and bounds are inclusive"""
+        histogram = Histogram((1, 5))
+        for value in (0, 1, 3, 5, 7):
+            histogram.observe(value)
+
+        self.assertEqual(list(histogram.samples('size', {'view': 'a'})), [
+            'size_bucket{view="a",le="1"} 2',
+            'size_bucket{view="a",le="5"} 4',
+            'size_bucket{view="a",le="+Inf"} 5',
+            'size_sum{view="a"} 16',
+            'size_count{view="a"} 5',
+        ])
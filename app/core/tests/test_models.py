@@ -1,7 +1,15 @@
-from django.test import TestCase
+import threading
+from datetime import date
+from decimal import Decimal
+from unittest import skipUnless
+
+from django.db import connection, connections, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 
 from core import models
+from core.fingerprints import FingerprintSequence, operation_fingerprint
 
 
 def sample_user(email='test@gmail.com', password='testpass'):
@@ -62,3 +70,130 @@ class ModelTests(TestCase):
         )
 
         self.assertEqual(str(account), account.name)
+
+    def test_operation_fingerprint(self):
+        """Test the fingerprint ignores case, accents and spacing"""
+        fingerprint = operation_fingerprint(
+            1, date(2021, 1, 1), Decimal('-2.5'), 'Café  da manhã'
+        )
+
+        self.assertEqual(len(fingerprint), 64)
+        self.assertEqual(fingerprint, operation_fingerprint(
+            1, date(2021, 1, 1), Decimal('-2.50'), ' CAFE DA MANHA'
+        ))
+        self.assertNotEqual(fingerprint, operation_fingerprint(
+            2, date(2021, 1, 1), Decimal('-2.50'), 'Cafe da manha'
+        ))
+        self.assertNotEqual(fingerprint, operation_fingerprint(
+            1, date(2021, 1, 1), Decimal('2.50'), 'Cafe da manha'
+        ))
+
+    def test_fingerprint_sequence(self):
+        """Test identical operations get increasing ordinals"""
+        fingerprints = FingerprintSequence()
+
+        first = fingerprints(1, date(2021, 1, 1), Decimal('-1'), 'Coffee')
+        other = fingerprints(1, date(2021, 1, 2), Decimal('-1'), 'Coffee')
+        second = fingerprints(1, date(2021, 1, 1), Decimal('-1'), 'coffee')
+
+        self.assertEqual(first[1], 0)
+        self.assertEqual(other[1], 0)
+        self.assertEqual(second, (first[0], 1))
+
+
+@skipUnless(connection.features.has_select_for_update,
+            'The database cannot lock rows')
+class OperationLockTests(TestCase):
+    """Test writes of an operation lock its stored row"""
+
+    def setUp(self):
+        user = sample_user()
+        account = models.Account.objects.create(user=user, name='Bank')
+        self.operation = models.Operation.objects.create(
+            user=user,
+            account=account,
+            name='Supermarket',
+            value=Decimal('-5.00'),
+            date=date(2021, 1, 1)
+        )
+
+    def _locked(self, write):
+        """Return whether write read the stored operation FOR UPDATE"""
+        with CaptureQueriesContext(connection) as queries:
+            write()
+        return any(
+            'FOR UPDATE' in query['sql'] and 'core_operation' in query['sql']
+            for query in queries
+        )
+
+    def test_update_locks_the_stored_row(self):
+        """Test updating an operation locks it before reading it"""
+        self.operation.value = Decimal('-7.00')
+
+        self.assertTrue(self._locked(self.operation.save))
+
+    def test_delete_locks_the_stored_row(self):
+        """Test deleting an operation locks it before reading it"""
+        self.assertTrue(self._locked(self.operation.delete))
+
+
+@skipUnless(connection.vendor == 'postgresql',
+            'Only PostgreSQL runs writers concurrently')
+class ConcurrentFingerprintTests(TransactionTestCase):
+    """Test identical operations created at once get their own ordinals"""
+
+    def setUp(self):
+        self.user = sample_user()
+        self.account = models.Account.objects.create(
+            user=self.user, name='Bank'
+        )
+
+    def _create(self):
+        return models.Operation.objects.create(
+            user=self.user,
+            account=self.account,
+            name='Coffee',
+            value=Decimal('-2.50'),
+            date=date(2021, 1, 1)
+        )
+
+    def test_identical_operations_created_concurrently(self):
+        """Test the second writer waits for the ordinal of the first"""
+        inserted, errors = threading.Event(), []
+
+        def first():
+            try:
+                with transaction.atomic():
+                    self._create()
+                    inserted.set()
+                    # Give the second writer time to read the ordinals
+                    threading.Event().wait(0.5)
+            except Exception as error:
+                errors.append(error)
+                inserted.set()
+            finally:
+                connections.close_all()
+
+        def second():
+            inserted.wait()
+            try:
+                self._create()
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=first),
+                   threading.Thread(target=second)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(
+            sorted(models.Operation.objects.values_list(
+                'fingerprint_seq', flat=True
+            )),
+            [0, 1]
+        )
@@ -0,0 +1,147 @@
+import re
+from datetime import date
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.models import Account, Operation
+from core.partitions import (create_partition, ensure_partitions,
+                             partition_operation_table, supports_partitioning)
+
+from operation.caching import RESPONSE_CACHE
+
+
+OPERATIONS_URL = reverse('operation:operation-list')
+PARTITION = re.compile(r'\bcore_operation_(?:p\d{4}_\d{2}|default)\b')
+
+
+def account_balance_url(account_id):
+    """Return the account balance URL"""
+    return reverse('operation:operation-account-balance', args=[account_id])
+
+
+class OperationPartitionTests(TestCase):
+    """Test queries on the partitioned operations only scan what they need"""
+
+    def setUp(self):
+        if not supports_partitioning(connection):
+            self.skipTest('Partitioning needs PostgreSQL 11 or later')
+        partition_operation_table(connection, months_ahead=0)
+        ensure_partitions(connection, date(2021, 1, 1), date(2021, 2, 1))
+        with connection.cursor() as cursor:
+            # Check foreign keys now, so the partitions can be altered
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+        caches[RESPONSE_CACHE].clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'sample_user@gmail.com',
+            'testpass123'
+        )
+        self.client.force_authenticate(self.user)
+        self.account = Account.objects.create(user=self.user, name='Bank')
+        for day in (date(2021, 1, 10), date(2021, 2, 10), None):
+            Operation.objects.create(
+                user=self.user,
+                account=self.account,
+                name='Supermarket',
+                value=-5,
+                date=day
+            )
+
+    def _scanned_partitions(self, url, params):
+        """Return the partitions the plans of the queries of a GET scan"""
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(url, params)
+        self.assertEqual(res.status_code, 200)
+
+        scanned = set()
+        with connection.cursor() as cursor:
+            for query in queries.captured_queries:
+                if not query['sql'].startswith('SELECT'):
+                    continue
+                cursor.execute(f'EXPLAIN {query["sql"]}')
+                for line, in cursor.fetchall():
+                    scanned.update(PARTITION.findall(line))
+        return scanned
+
+    def test_list_prunes_partitions(self):
+        """Test listing a month only scans the partition of that month"""
+        scanned = self._scanned_partitions(
+            OPERATIONS_URL, {'year': 2021, 'month': 1}
+        )
+
+        self.assertEqual(scanned, {'core_operation_p2021_01'})
+
+    def test_list_without_dates_scans_every_partition(self):
+        """Test operations of every partition are listed without dates"""
+        scanned = self._scanned_partitions(OPERATIONS_URL, {})
+
+        self.assertEqual(scanned, {
+            'core_operation_p2021_01',
+            'core_operation_p2021_02',
+            'core_operation_default',
+        })
+
+    def test_account_balance_scans_no_operations(self):
+        """Test the balance over dates is read from the daily balances"""
+        scanned = self._scanned_partitions(
+            account_balance_url(self.account.id),
+            {'date_from': '2021-01-01', 'date_to': '2021-01-31'}
+        )
+
+        self.assertEqual(scanned, set())
+
+    def test_new_partition_takes_rows_from_the_default(self):
+        """Test creating a partition moves its month out of the default"""
+        operation = Operation.objects.create(
+            user=self.user,
+            account=self.account,
+            name='Bakery',
+            value=-2,
+            date=date(2021, 5, 3)
+        )
+
+        self.assertTrue(create_partition(connection, date(2021, 5, 1)))
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT id FROM core_operation_p2021_05')
+            self.assertEqual(cursor.fetchall(), [(operation.id,)])
+        self.assertFalse(create_partition(connection, date(2021, 5, 1)))
+
+    def test_detach_old_partitions(self):
+        """Test the command detaches the archived partitions before a date"""
+        out = StringIO()
+        call_command(
+            'archive_operations', before=date(2021, 2, 1), stdout=StringIO()
+        )
+
+        call_command(
+            'operation_partitions', detach_before=date(2021, 2, 1),
+            months_ahead=1, stdout=out
+        )
+
+        self.assertIn('Detached core_operation_p2021_01', out.getvalue())
+        self.assertNotIn('core_operation_p2021_02', out.getvalue())
+        dates = Operation.objects.values_list('date', flat=True)
+        self.assertIn(date(2021, 2, 10), dates)
+        call_command('rebuild_balances', verify=True, stdout=StringIO())
+
+    def test_detach_refuses_partitions_with_operations(self):
+        """Test partitions still holding operations are not detached"""
+        with self.assertRaisesMessage(CommandError, 'core_operation_p2021_01'):
+            call_command(
+                'operation_partitions', detach_before=date(2021, 2, 1),
+                months_ahead=1, stdout=StringIO()
+            )
+
+        dates = Operation.objects.values_list('date', flat=True)
+        self.assertIn(date(2021, 1, 10), dates)
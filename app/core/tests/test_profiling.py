@@ -0,0 +1,86 @@
+import marshal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import Account, Operation
+
+from operation.caching import RESPONSE_CACHE
+
+
+OPERATIONS_URL = reverse('operation:operation-list')
+
+
+class ProfilingTests(TestCase):
+    """Test staff can profile their requests"""
+
+    def setUp(self):
+        caches[RESPONSE_CACHE].clear()
+        self.user = get_user_model().objects.create_user(
+            'sample_user@gmail.com',
+            'testpass123',
+            is_staff=True
+        )
+        token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        account = Account.objects.create(user=self.user, name='Bank')
+        Operation.objects.create(
+            user=self.user,
+            account=account,
+            name='Supermarket',
+            value='-5.00',
+            date='2021-01-05'
+        )
+
+    def test_profile_report(self):
+        """Test a profiled request links to its report"""
+        res = self.client.get(OPERATIONS_URL, HTTP_X_PROFILE='1')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(res.data['results']), 1)
+        report = self.client.get(res['X-Profile-Report']).data
+        self.assertEqual(report['path'], OPERATIONS_URL)
+        self.assertEqual(report['status'], 200)
+        self.assertTrue(report['functions'])
+        self.assertTrue(report['allocations'])
+        self.assertTrue(any(
+            'core_operation' in query['sql'] for query in report['queries']
+        ))
+
+    def test_profile_query_parameter(self):
+        """Test the profile query parameter also asks for a profile"""
+        res = self.client.get(OPERATIONS_URL, {'profile': ''})
+
+        self.assertIn('X-Profile-Report', res)
+
+    def test_download_pstats(self):
+        """Test the pstats dump of a profiled request can be downloaded"""
+        res = self.client.get(OPERATIONS_URL, HTTP_X_PROFILE='1')
+
+        res = self.client.get(res['X-Profile-Report'], {'download': ''})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn('attachment', res['Content-Disposition'])
+        self.assertTrue(marshal.loads(res.content))
+
+    def test_other_users_are_not_profiled(self):
+        """Test requests of users who are not staff are served as usual"""
+        self.user.is_staff = False
+        self.user.save()
+
+        res = self.client.get(OPERATIONS_URL, HTTP_X_PROFILE='1')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertNotIn('X-Profile-Report', res)
+
+    def test_unknown_report(self):
+        """Test reports that expired or never existed are not found"""
+        res = self.client.get(reverse('profile-report', args=['missing']))
+
+        self.assertEqual(res.status_code, 404)
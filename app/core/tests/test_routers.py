@@ -0,0 +1,80 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import router
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from rest_framework.authtoken.models import Token
+
+from core.middleware import ReplicaRoutingMiddleware
+from core.models import Operation
+
+
+@override_settings(REPLICA_DATABASES=['replica1'])
+class ReplicaRouterTests(TestCase):
+    """Test reads are sent to replicas unless the client just wrote"""
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.reads = {}
+
+    def _request(self, method, token='abc', status=200):
+        """Run a request through the middleware and return its read alias"""
+        def view(request):
+            self.reads = {
+                'operation': router.db_for_read(Operation),
+                'token': router.db_for_read(Token),
+                'user': router.db_for_read(get_user_model()),
+                'write': router.db_for_write(Operation),
+            }
+            return HttpResponse(status=status)
+
+        headers = {'HTTP_AUTHORIZATION': f'Token {token}'} if token else {}
+        request = getattr(self.factory, method)('/api/', **headers)
+        ReplicaRoutingMiddleware(view)(request)
+        return self.reads['operation']
+
+    def test_safe_requests_read_from_replicas(self):
+        """Test reads of a safe request go to a replica, writes do not"""
+        self.assertEqual(self._request('get'), 'replica1')
+        self.assertEqual(self.reads['write'], 'default')
+
+    def test_auth_models_read_from_the_primary(self):
+        """Test tokens and users are read from the primary"""
+        self._request('get')
+
+        self.assertEqual(self.reads['token'], 'default')
+        self.assertEqual(self.reads['user'], 'default')
+
+    def test_unsafe_requests_read_from_the_primary(self):
+        """Test a write request reads from the primary"""
+        self.assertEqual(self._request('post'), 'default')
+
+    def test_reads_after_a_write_are_pinned(self):
+        """Test a client reads from the primary after writing"""
+        self._request('post')
+
+        self.assertEqual(self._request('get'), 'default')
+        self.assertEqual(self._request('get', token='other'), 'replica1')
+
+    def test_failed_writes_do_not_pin(self):
+        """Test a rejected write leaves the client on the replicas"""
+        self._request('post', status=400)
+
+        self.assertEqual(self._request('get'), 'replica1')
+
+    def test_anonymous_clients_are_not_pinned(self):
+        """Test clients without credentials are never pinned"""
+        self._request('post', token=None)
+
+        self.assertEqual(self._request('get', token=None), 'replica1')
+
+    @override_settings(REPLICA_DATABASES=[])
+    def test_without_replicas(self):
+        """Test everything goes to the primary without replicas"""
+        self.assertEqual(self._request('get'), 'default')
+
+    def test_outside_of_requests(self):
+        """Test reads outside of a request go to the primary"""
+        self.assertEqual(router.db_for_read(Operation), 'default')
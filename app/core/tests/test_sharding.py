@@ -0,0 +1,228 @@
+from io import StringIO
+from unittest import skipUnless
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import router
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (Account, AccountBalance, DataVersion, Operation,
+                         Tag, UserShard)
+from core.sharding import SHARD_ID_RANGE, UserMoving, acting_for, shard_of
+
+
+OPERATIONS_URL = reverse('operation:operation-list')
+
+
+class ShardRouterTests(TestCase):
+    """Test the data of users is routed by the shard map"""
+    databases = '__all__'
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'sample_user@gmail.com',
+            'testpass123'
+        )
+        self.other = get_user_model().objects.create_user(
+            'other@gmail.com',
+            'testpass123'
+        )
+        UserShard.objects.update_or_create(
+            user=self.user, defaults={'database': 'shard1'}
+        )
+        UserShard.objects.filter(user=self.other).delete()
+
+    def test_single_database_needs_no_lookup(self):
+        """Test the shard map is not read without shards"""
+        with self.settings(SHARD_DATABASES=['default']):
+            with self.assertNumQueries(0):
+                self.assertEqual(shard_of(self.user.pk).database, 'default')
+
+    def test_data_is_routed_by_user(self):
+        """Test reads and writes go to the shard of the user"""
+        with self.settings(SHARD_DATABASES=['default', 'shard1']):
+            tag = Tag(user=self.user, name='Food')
+            other_tag = Tag(user=self.other, name='Food')
+
+            self.assertEqual(router.db_for_write(Tag, instance=tag), 'shard1')
+            self.assertEqual(
+                router.db_for_read(Account, instance=self.user), 'shard1'
+            )
+            self.assertEqual(
+                router.db_for_write(Tag, instance=other_tag), 'default'
+            )
+            self.assertEqual(router.db_for_read(Tag), 'default')
+            with acting_for(self.user.pk):
+                self.assertEqual(router.db_for_read(Operation), 'shard1')
+                self.assertEqual(
+                    router.db_for_read(get_user_model()), 'default'
+                )
+
+    def test_shard_map_is_cached(self):
+        """Test the shard map is read once per user"""
+        with self.settings(SHARD_DATABASES=['default', 'shard1']):
+            shard_of(self.user.pk)
+
+            with self.assertNumQueries(0):
+                placement = shard_of(self.user.pk)
+
+        self.assertEqual(placement.database, 'shard1')
+
+    def test_writes_of_moving_users_fail(self):
+        """Test writes are refused while the data of the user moves"""
+        UserShard.objects.filter(user=self.user).update(moving=True)
+
+        with self.settings(SHARD_DATABASES=['default', 'shard1']):
+            with acting_for(self.user.pk):
+                self.assertEqual(router.db_for_read(Tag), 'shard1')
+                with self.assertRaises(UserMoving):
+                    router.db_for_write(Tag)
+
+    def test_users_relate_to_data_on_any_shard(self):
+        """Test data on a shard may point to the user row of the default"""
+        tag = Tag(user=self.user, name='Food')
+        tag._state.db = 'shard1'
+
+        self.assertTrue(router.allow_relation(self.user, tag))
+
+
+@skipUnless(len(settings.SHARD_DATABASES) > 1, 'DB_SHARDS is not set')
+class ShardedDataTests(TestCase):
+    """Test the data of users living on several databases"""
+    databases = '__all__'
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = self._user_on('shard1')
+        self.client.force_authenticate(self.user)
+
+    def _user_on(self, database):
+        """Create a user placed on database"""
+        index = len(get_user_model().objects.all())
+        while True:
+            index += 1
+            user = get_user_model().objects.create_user(
+                f'user{index}@gmail.com',
+                'testpass123'
+            )
+            if shard_of(user.pk).database == database:
+                return user
+
+    def _create_data(self):
+        """Create an account, a tag and an operation through the API"""
+        acctype = self.client.post(
+            reverse('operation:accounttype-list'),
+            {'name': 'Checking'},
+            format='json'
+        )
+        account = self.client.post(
+            reverse('operation:account-list'),
+            {'name': 'Bank', 'acctype': acctype.data['id']},
+            format='json'
+        )
+        tag = self.client.post(
+            reverse('operation:tag-list'), {'name': 'Food'}, format='json'
+        )
+        self.client.post(
+            OPERATIONS_URL,
+            {
+                'name': 'Supermarket',
+                'value': '-5.00',
+                'date': '2021-01-01',
+                'account': account.data['id'],
+                'tags': [tag.data['id']],
+            },
+            format='json'
+        )
+
+    def test_api_writes_to_the_shard_of_the_user(self):
+        """Test the data created through the API lives on the shard"""
+        with acting_for(self.user.pk):
+            Account.objects.create(user=self.user, name='Bank')
+        tag = self.client.post(
+            reverse('operation:tag-list'), {'name': 'Food'}, format='json'
+        )
+
+        res = self.client.get(reverse('operation:tag-list'))
+
+        self.assertEqual([row['name'] for row in res.data], ['Food'])
+        self.assertGreaterEqual(tag.data['id'], SHARD_ID_RANGE)
+        self.assertTrue(Tag.objects.using('shard1').exists())
+        self.assertFalse(Tag.objects.using('default').exists())
+
+    def test_export_reads_the_shard_of_the_user(self):
+        """Test the streamed export reads the operations of the shard"""
+        self._create_data()
+
+        res = self.client.get(
+            reverse('operation:operation-export'), {'output': 'csv'}
+        )
+
+        lines = b''.join(res.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn('Supermarket', lines[1])
+        self.assertIn('Food', lines[1])
+
+    def test_move_user(self):
+        """Test moving a user keeps its data, ids and API working"""
+        self._create_data()
+        ids = list(Operation.objects.using('shard1').values_list(
+            'id', flat=True
+        ))
+        out = StringIO()
+
+        call_command(
+            'move_user_shard', self.user.pk, 'default', grace=0, stdout=out
+        )
+
+        self.assertIn('Moved 8 rows', out.getvalue())
+        self.assertEqual(shard_of(self.user.pk).database, 'default')
+        self.assertFalse(Operation.objects.using('shard1').exists())
+        self.assertFalse(
+            get_user_model().objects.using('shard1').exists()
+        )
+        operation = Operation.objects.using('default').get()
+        self.assertEqual([operation.id], ids)
+        self.assertEqual(operation.tags.count(), 1)
+        self.assertTrue(AccountBalance.objects.using('default').exists())
+        self.assertTrue(DataVersion.objects.using('default').exists())
+        res = self.client.get(OPERATIONS_URL)
+        self.assertEqual(
+            [row['id'] for row in res.data['results']], ids
+        )
+
+    def test_move_to_the_same_shard(self):
+        """Test a user cannot be moved where it already is"""
+        with self.assertRaises(CommandError):
+            call_command(
+                'move_user_shard', self.user.pk, 'shard1', grace=0,
+                stdout=StringIO()
+            )
+
+    def test_writes_during_a_move_are_refused(self):
+        """Test the API answers 503 to writes of a moving user"""
+        UserShard.objects.filter(user=self.user).update(moving=True)
+        cache.clear()
+
+        res = self.client.post(
+            reverse('operation:tag-list'), {'name': 'Food'}, format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    def test_deleting_a_user_deletes_its_shard_data(self):
+        """Test the data of a deleted user is deleted from its shard"""
+        self._create_data()
+
+        self.user.delete()
+
+        self.assertFalse(Operation.objects.using('shard1').exists())
+        self.assertFalse(Account.objects.using('shard1').exists())
@@ -0,0 +1,95 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.models import Account
+from core.slowqueries import slow_queries
+
+from operation.caching import RESPONSE_CACHE
+
+
+SLOW_QUERIES_URL = reverse('slow-queries')
+OPERATIONS_URL = reverse('operation:operation-list')
+
+
+@override_settings(SLOW_QUERY_SECONDS=0, SLOW_QUERY_EXPLAIN_RATE=1)
+class SlowQueryTests(TestCase):
+    """Test slow queries are logged with their plans"""
+
+    def setUp(self):
+        caches[RESPONSE_CACHE].clear()
+        slow_queries.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'sample_user@gmail.com',
+            'testpass123',
+            is_staff=True
+        )
+        self.client.force_authenticate(self.user)
+        self.account = Account.objects.create(user=self.user, name='Bank')
+
+    def test_slow_queries_are_explained(self):
+        """Test the selects of a request are logged with their view and plan"""
+        self.client.get(OPERATIONS_URL)
+
+        logged = [
+            entry for entry in slow_queries.entries()
+            if entry['view'] == 'operation:operation-list'
+        ]
+        self.assertTrue(logged)
+        for entry in logged:
+            self.assertEqual(entry['path'], OPERATIONS_URL)
+            self.assertTrue(entry['sql'].startswith('SELECT'))
+            self.assertTrue(entry['plan'])
+            self.assertFalse(entry['plan'][0].startswith('EXPLAIN failed'))
+
+    def test_writes_are_not_explained(self):
+        """Test inserts are logged without running them again"""
+        self.client.post(OPERATIONS_URL, {
+            'name': 'Supermarket',
+            'value': '-5.00',
+            'date': '2021-01-05',
+            'account': self.account.id,
+            'tags': [],
+        }, format='json')
+
+        inserts = [
+            entry for entry in slow_queries.entries()
+            if entry['sql'].startswith('INSERT')
+        ]
+        self.assertTrue(inserts)
+        self.assertTrue(all(entry['plan'] is None for entry in inserts))
+
+    @override_settings(SLOW_QUERY_SECONDS=60)
+    def test_fast_queries_are_not_logged(self):
+        """Test queries under the threshold are not logged"""
+        self.client.get(OPERATIONS_URL)
+
+        self.assertEqual(slow_queries.entries(), [])
+
+    def test_slow_query_view(self):
+        """Test staff can list and clear the slow queries"""
+        self.client.get(OPERATIONS_URL)
+
+        res = self.client.get(SLOW_QUERIES_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.data['queries'])
+        self.assertGreaterEqual(res.data['total'], len(res.data['queries']))
+
+        res = self.client.delete(SLOW_QUERIES_URL)
+
+        self.assertEqual(res.status_code, 204)
+        self.assertEqual(slow_queries.entries(), [])
+
+    def test_slow_query_view_needs_staff(self):
+        """Test other users cannot read the slow queries"""
+        self.user.is_staff = False
+        self.user.save()
+
+        res = self.client.get(SLOW_QUERIES_URL)
+
+        self.assertEqual(res.status_code, 403)
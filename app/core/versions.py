@@ -0,0 +1,55 @@
+from django.db import IntegrityError, router, transaction
+from django.db.models import F
+
+
+def current_version(user_id, using=None):
+    """Return the data version of a user, 0 if nothing was ever written"""
+    from core.models import DataVersion
+
+    using = using or router.db_for_read(DataVersion)
+    version = DataVersion.objects.using(using).filter(
+        user_id=user_id
+    ).values_list('version', flat=True).first()
+
+    return version or 0
+
+
+def current_generation(user_id, using=None):
+    """
+    Return a name for the current state of the data of a user
+
+    It joins the version with the random token of its row, so states stay
+    distinct if the row is ever recreated and the version starts over.
+    """
+    from core.models import DataVersion
+
+    using = using or router.db_for_read(DataVersion)
+    row = DataVersion.objects.using(using).filter(
+        user_id=user_id
+    ).values_list('token', 'version').first()
+    if row is None:
+        return 'v0'
+
+    token, version = row
+    return f'{token.hex[:12]}-v{version}'
+
+
+def bump_version(user_id, using=None):
+    """
+    Increase the data version of a user
+
+    Call it after the write, in its transaction or once it is committed: a
+    reader can then get new data under the old version, which only costs
+    an extra fetch, but never old data under the new version.
+    """
+    from core.models import DataVersion
+
+    using = using or router.db_for_write(DataVersion)
+    versions = DataVersion.objects.using(using).filter(user_id=user_id)
+    if versions.update(version=F('version') + 1):
+        return
+    try:
+        with transaction.atomic(using=using):
+            DataVersion.objects.using(using).create(user_id=user_id, version=1)
+    except IntegrityError:
+        versions.update(version=F('version') + 1)
@@ -0,0 +1,72 @@
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import NotFound
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from core.health import readiness
+from core.metrics import render_metrics
+from core.profiling import load_report
+from core.slowqueries import slow_queries as slow_query_log
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def metrics(request):
+    """Return the metrics of this process for Prometheus to scrape"""
+    return HttpResponse(
+        render_metrics(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
+
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAdminUser])
+def slow_queries(request):
+    """List the slow queries of this process, newest first, or clear them"""
+    if request.method == 'DELETE':
+        slow_query_log.clear()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    return Response({
+        'threshold': settings.SLOW_QUERY_SECONDS,
+        'explain_rate': settings.SLOW_QUERY_EXPLAIN_RATE,
+        'total': slow_query_log.total,
+        'queries': slow_query_log.entries()[::-1],
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def profile_report(request, report_id):
+    """Return the report of a profiled request, or its pstats dump"""
+    saved = load_report(report_id)
+    if saved is None:
+        raise NotFound()
+    if 'download' in request.query_params:
+        response = HttpResponse(
+            saved['pstats'], content_type='application/octet-stream'
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="profile-{report_id}.prof"'
+        )
+        return response
+    return Response(saved['report'])
+
+
+def healthz(request):
+    """Report the process is alive, without touching the databases"""
+    return JsonResponse({'status': 'ok'})
+
+
+def readyz(request):
+    """Report whether the databases can serve requests, 503 if they cannot"""
+    problems = readiness()
+    if problems:
+        return JsonResponse(
+            {'status': 'unavailable', 'databases': problems},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+    return JsonResponse({'status': 'ok'})
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class OperationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'operation'
+
+    def ready(self):
+        from core.metrics import register_collector
+        from operation.caching import metric_samples
+
+        register_collector(metric_samples)
@@ -0,0 +1,456 @@
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import Count, DecimalField, IntegerField, Sum, Value
+
+from core.fingerprints import FingerprintSequence
+from core.ledger import BalanceDeltas
+from core.models import Account, ArchivedOperation, Operation, Tag
+from core.versions import bump_version
+
+from operation.export import chunked
+from operation.serializers import OperationBulkItemSerializer
+
+
+MAX_BULK_ITEMS = 10000
+BATCH_SIZE = 1000
+
+_ACCOUNT, _TAG = 0, 1
+
+# Fields the fingerprint of an operation is computed from
+FINGERPRINTED_FIELDS = {'account_id', 'date', 'value', 'name'}
+
+
+def _owned_ids(user, account_ids, tag_ids, using):
+    """Return the given account and tag ids that belong to user"""
+    accounts = Account.objects.using(using).filter(
+        user=user, id__in=account_ids
+    ).values_list('id', Value(_ACCOUNT, output_field=IntegerField()))
+    tags = Tag.objects.using(using).filter(
+        user=user, id__in=tag_ids
+    ).values_list('id', Value(_TAG, output_field=IntegerField()))
+
+    owned = {_ACCOUNT: set(), _TAG: set()}
+    for pk, kind in accounts.union(tags, all=True):
+        owned[kind].add(pk)
+    return owned[_ACCOUNT], owned[_TAG]
+
+
+def _user_ids(queryset):
+    """Return the ids of the users owning the objects in queryset"""
+    return set(
+        queryset.order_by().values_list('user_id', flat=True).distinct()
+    )
+
+
+def _bump_versions(user_ids, using):
+    """Bump the data version of every user in user_ids"""
+    for user_id in sorted(user_ids):
+        bump_version(user_id, using)
+
+
+def validate_operations(user, items, using):
+    """
+    Validate the items of a bulk request
+
+    Return a list of (index, validated data) for the valid items and a list
+    of errors for the others. Accounts and tags are checked against the ones
+    the user owns with a single query for the whole request.
+    """
+    valid, errors = [], []
+    for index, item in enumerate(items):
+        serializer = OperationBulkItemSerializer(data=item)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            errors.append({'index': index, 'errors': serializer.errors})
+    if not valid:
+        return [], errors
+
+    accounts, tags = _owned_ids(
+        user,
+        {data['account'] for _, data in valid},
+        {tag for _, data in valid for tag in data.get('tags', ())},
+        using
+    )
+    checked = []
+    for index, data in valid:
+        item_errors = {}
+        if data['account'] not in accounts:
+            item_errors['account'] = [
+                f'Invalid pk "{data["account"]}" - object does not exist.'
+            ]
+        unknown_tags = [tag for tag in data.get('tags', ()) if tag not in tags]
+        if unknown_tags:
+            item_errors['tags'] = [
+                f'Invalid pk "{tag}" - object does not exist.'
+                for tag in unknown_tags
+            ]
+        if item_errors:
+            errors.append({'index': index, 'errors': item_errors})
+        else:
+            checked.append((index, data))
+
+    errors.sort(key=lambda error: error['index'])
+    return checked, errors
+
+
+def _insert_skipping_duplicates(operations, using):
+    """
+    Insert fingerprinted operations, skipping those already stored
+
+    On PostgreSQL this is a single INSERT ... ON CONFLICT DO NOTHING
+    RETURNING per batch, which gives back only the inserted rows. Other
+    backends insert one row at a time and skip those rejected by the
+    unique fingerprint index.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        for operation in operations:
+            try:
+                with transaction.atomic(using=using):
+                    operation.save_base(using=using, force_insert=True)
+            except IntegrityError:
+                operation.pk = None
+        return
+
+    opts = Operation._meta
+    qn = connection.ops.quote_name
+    fields = [
+        field for field in opts.concrete_fields if field is not opts.pk
+    ]
+    columns = ', '.join(qn(field.column) for field in fields)
+    placeholders = f'({", ".join(["%s"] * len(fields))})'
+    returning = ', '.join(qn(column) for column in (
+        opts.pk.column,
+        opts.get_field('fingerprint').column,
+        opts.get_field('fingerprint_seq').column,
+    ))
+    for batch in chunked(operations, BATCH_SIZE):
+        params = [
+            field.get_db_prep_save(
+                field.pre_save(operation, add=True), connection
+            )
+            for operation in batch
+            for field in fields
+        ]
+        # PostgreSQL syntax: RETURNING leaves out the rows skipped by
+        # ON CONFLICT, which bulk_create(ignore_conflicts=True) cannot tell
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {qn(opts.db_table)} ({columns}) '
+                f'VALUES {", ".join([placeholders] * len(batch))} '
+                f'ON CONFLICT DO NOTHING RETURNING {returning}',
+                params
+            )
+            inserted = {
+                (fingerprint, sequence): pk
+                for pk, fingerprint, sequence in cursor.fetchall()
+            }
+        for operation in batch:
+            operation.pk = inserted.get(
+                (operation.fingerprint, operation.fingerprint_seq)
+            )
+            operation._state.adding = operation.pk is None
+            operation._state.db = using
+
+
+def _archived_fingerprints(operations, using):
+    """Return the (fingerprint, ordinal) pairs of operations in the archive"""
+    archived = set()
+    for batch in chunked(operations, BATCH_SIZE):
+        archived.update(ArchivedOperation.objects.using(using).filter(
+            fingerprint__in={operation.fingerprint for operation in batch}
+        ).values_list('fingerprint', 'fingerprint_seq'))
+    return archived
+
+
+def insert_operations(user, rows, using, fingerprints=None):
+    """
+    Insert validated operations with their tags and return them
+
+    Operations go in with bulk_create and their tags with a single bulk
+    insert into the through table, and the stored balances are updated
+    once for the whole batch, as is the data version of the user. Must run
+    inside a transaction.
+
+    With a FingerprintSequence, operations are fingerprinted and those
+    already stored are skipped: they are returned without a primary key.
+    Otherwise they are all inserted, fingerprinted after the stored ones.
+    """
+    operations, tag_lists = [], []
+    for data in rows:
+        data = dict(data)
+        tag_lists.append(data.pop('tags', ()))
+        operation = Operation(
+            user=user, account_id=data.pop('account'), **data
+        )
+        if fingerprints is not None:
+            operation.fingerprint, operation.fingerprint_seq = fingerprints(
+                operation.account_id,
+                operation.date,
+                operation.value,
+                operation.name
+            )
+        operations.append(operation)
+
+    if fingerprints is not None:
+        # The unique fingerprint index does not cover the archive
+        archived = _archived_fingerprints(operations, using)
+        _insert_skipping_duplicates(
+            [
+                operation for operation in operations
+                if (operation.fingerprint, operation.fingerprint_seq)
+                not in archived
+            ],
+            using
+        )
+    else:
+        for batch in chunked(operations, BATCH_SIZE):
+            Operation.fingerprint_operations(batch, using)
+        if connections[using].features.can_return_rows_from_bulk_insert:
+            Operation.objects.using(using).bulk_create(
+                operations, batch_size=BATCH_SIZE
+            )
+        else:
+            # Without primary keys back from a bulk insert the tags cannot
+            # be linked, so these backends insert one operation at a time
+            for operation in operations:
+                operation.save_base(using=using, force_insert=True)
+
+    through = Operation.tags.through
+    through.objects.using(using).bulk_create(
+        (
+            through(operation_id=operation.pk, tag_id=tag)
+            for operation, tags in zip(operations, tag_lists)
+            if operation.pk is not None
+            for tag in dict.fromkeys(tags)
+        ),
+        batch_size=BATCH_SIZE
+    )
+
+    deltas = BalanceDeltas()
+    for operation in operations:
+        if operation.pk is not None:
+            deltas.add_operation(operation)
+    deltas.apply(using)
+    if any(operation.pk is not None for operation in operations):
+        bump_version(user.pk, using)
+
+    return operations
+
+
+def create_operations(user, items, all_or_nothing=False):
+    """
+    Validate and create the operations of a bulk request
+
+    Return the created (index, operation) pairs, the indexes of the items
+    skipped as duplicates of stored operations and the errors of the items
+    that were rejected. Valid items are created even if others fail, unless
+    all_or_nothing is set, in which case nothing is created on any error.
+    """
+    using = router.db_for_write(Operation, instance=user)
+    valid, errors = validate_operations(user, items, using)
+    if not valid or (errors and all_or_nothing):
+        return [], [], errors
+
+    with transaction.atomic(using=using):
+        operations = insert_operations(
+            user,
+            [data for _, data in valid],
+            using,
+            fingerprints=FingerprintSequence()
+        )
+
+    created, skipped = [], []
+    for (index, _), operation in zip(valid, operations):
+        if operation.pk is None:
+            skipped.append(index)
+        else:
+            created.append((index, operation))
+    return created, skipped, errors
+
+
+def _balance_groups(queryset):
+    """Return the value sum and row count per user, account and day"""
+    return queryset.order_by().values(
+        'user_id', 'account_id', 'date'
+    ).annotate(
+        total=Sum(
+            'value',
+            output_field=DecimalField(max_digits=14, decimal_places=2)
+        ),
+        count=Count('id')
+    )
+
+
+def _lock_ids(queryset):
+    """
+    Lock the operations in queryset and return their ids
+
+    The rows stay locked until the end of the transaction, so the balance
+    changes computed from them hold when they are updated or deleted.
+    """
+    return list(
+        queryset.select_for_update().order_by('pk').values_list(
+            'pk', flat=True
+        )
+    )
+
+
+def update_operations(queryset, changes):
+    """
+    Apply changes to every operation in queryset
+
+    The operations are locked and their ids read first, then each batch of
+    ids is updated with a single UPDATE. When value, account or date change,
+    the balance changes are derived from one GROUP BY over the batch taken
+    before its update. When the fingerprinted fields change, the UPDATE
+    clears the fingerprints, which are then computed again. Return the
+    number of updated operations.
+    """
+    using = queryset.db
+    changes = dict(changes)
+    if 'account' in changes:
+        changes['account_id'] = changes.pop('account')
+    refingerprint = bool(changes.keys() & FINGERPRINTED_FIELDS)
+    if refingerprint:
+        changes['fingerprint'] = None
+    rebalance = bool(changes.keys() & {'value', 'account_id', 'date'})
+
+    with transaction.atomic(using=using):
+        ids = _lock_ids(queryset)
+        deltas = BalanceDeltas()
+        user_ids = set()
+        updated = 0
+        for batch in chunked(ids, BATCH_SIZE):
+            operations = Operation.objects.using(using).filter(pk__in=batch)
+            if rebalance:
+                for group in _balance_groups(operations):
+                    user_ids.add(group['user_id'])
+                    deltas.add(
+                        group['user_id'],
+                        group['account_id'],
+                        group['date'],
+                        group['total'],
+                        sign=-1
+                    )
+                    if 'value' in changes:
+                        total = changes['value'] * group['count']
+                    else:
+                        total = group['total']
+                    deltas.add(
+                        group['user_id'],
+                        changes.get('account_id', group['account_id']),
+                        changes.get('date', group['date']),
+                        total
+                    )
+            else:
+                user_ids |= _user_ids(operations)
+            updated += operations.update(**changes)
+        if refingerprint:
+            for batch in chunked(ids, BATCH_SIZE):
+                operations = list(Operation.objects.using(using).filter(
+                    pk__in=batch
+                ).only('id', 'account_id', 'date', 'value', 'name'))
+                Operation.fingerprint_operations(operations, using)
+                Operation.objects.using(using).bulk_update(
+                    operations, ['fingerprint', 'fingerprint_seq']
+                )
+        deltas.apply(using)
+        _bump_versions(user_ids, using)
+
+    return updated
+
+
+def delete_operations(queryset):
+    """
+    Delete every operation in queryset with set based DELETE statements
+
+    The operations are locked and their ids read into a list first, since
+    the selection may depend on their tags. Each batch of ids then has its
+    balance changes derived from one GROUP BY, and its tags and operations
+    deleted. The operations are deleted with _raw_delete, which skips the
+    collector: the tags through table is the only relation cascading from
+    them, and it is cleared here beforehand. Return the number of deleted
+    operations.
+    """
+    using = queryset.db
+    through = Operation.tags.through.objects.using(using)
+    with transaction.atomic(using=using):
+        ids = _lock_ids(queryset)
+        deltas = BalanceDeltas()
+        user_ids = set()
+        deleted = 0
+        for batch in chunked(ids, BATCH_SIZE):
+            operations = Operation.objects.using(using).filter(pk__in=batch)
+            for group in _balance_groups(operations):
+                user_ids.add(group['user_id'])
+                deltas.add(
+                    group['user_id'],
+                    group['account_id'],
+                    group['date'],
+                    group['total'],
+                    sign=-1
+                )
+            through.filter(operation_id__in=batch).delete()
+            deleted += operations._raw_delete(using)
+        deltas.apply(using)
+        _bump_versions(user_ids, using)
+
+    return deleted
+
+
+def add_tags(queryset, tag_ids):
+    """
+    Tag every operation in queryset with tag_ids
+
+    Each tag is added with one INSERT ... SELECT over the operations that do
+    not have it yet. Return the number of added links.
+    """
+    using = queryset.db
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    through = Operation.tags.through
+    table = qn(through._meta.db_table)
+    operation_column = qn(through._meta.get_field('operation').column)
+    tag_column = qn(through._meta.get_field('tag').column)
+    pk_column = qn(Operation._meta.pk.column)
+    target_sql, target_params = queryset.values('pk').query.get_compiler(
+        using
+    ).as_sql()
+    sql = (
+        f'INSERT INTO {table} ({operation_column}, {tag_column}) '
+        f'SELECT target.{pk_column}, %s FROM ({target_sql}) target '
+        f'WHERE NOT EXISTS (SELECT 1 FROM {table} existing '
+        f'WHERE existing.{operation_column} = target.{pk_column} '
+        f'AND existing.{tag_column} = %s)'
+    )
+
+    added = 0
+    with transaction.atomic(using=using):
+        with connection.cursor() as cursor:
+            for tag_id in dict.fromkeys(tag_ids):
+                cursor.execute(sql, (tag_id, *target_params, tag_id))
+                added += cursor.rowcount
+        if added:
+            _bump_versions(_user_ids(queryset), using)
+
+    return added
+
+
+def remove_tags(queryset, tag_ids):
+    """Untag every operation in queryset with a single DELETE"""
+    if not tag_ids:
+        return 0
+
+    using = queryset.db
+    with transaction.atomic(using=using):
+        user_ids = _user_ids(queryset)
+        _, deleted = Operation.tags.through.objects.using(using).filter(
+            operation_id__in=queryset.values('pk'),
+            tag_id__in=tag_ids
+        ).delete()
+        removed = sum(deleted.values())
+        if removed:
+            _bump_versions(user_ids, using)
+
+    return removed
@@ -0,0 +1,122 @@
+import hashlib
+import json
+import pickle
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import caches
+
+from rest_framework import status
+from rest_framework.response import Response
+
+
+RESPONSE_CACHE = 'responses'
+CACHE_HEADER = 'X-Cache'
+
+
+class CacheStats:
+    """Counters of the response cache lookups made by this process"""
+    outcomes = ('hits', 'misses', 'oversized')
+
+    def __init__(self):
+        self._lock = Lock()
+        self.reset()
+
+    def record(self, outcome):
+        with self._lock:
+            self._counts[outcome] += 1
+
+    def as_dict(self):
+        with self._lock:
+            return dict(self._counts)
+
+    def reset(self):
+        with self._lock:
+            self._counts = dict.fromkeys(self.outcomes, 0)
+
+
+stats = CacheStats()
+
+
+def metric_samples():
+    """Yield the response cache counters in the Prometheus text format"""
+    name = 'response_cache_lookups_total'
+    yield f'# HELP {name} Lookups of the response cache by outcome'
+    yield f'# TYPE {name} counter'
+    for outcome, count in stats.as_dict().items():
+        yield f'{name}{{outcome="{outcome}"}} {count}'
+
+
+class CachedResponse(Exception):
+    """The response of the request is in the cache"""
+
+    def __init__(self, data):
+        super().__init__()
+        self.data = data
+
+
+def response_cache_key(request, generation):
+    """
+    Return the cache key of a read of the data of a user
+
+    The absolute URL is part of the key since paginated responses link to
+    other pages with it, and the query parameters are sorted so the same
+    query hits the same entry.
+    """
+    content = json.dumps([
+        request.build_absolute_uri(request.path),
+        sorted(request.query_params.lists()),
+    ])
+    digest = hashlib.sha256(content.encode()).hexdigest()
+
+    return f'u{request.user.pk}:{generation}:{digest}'
+
+
+class ResponseCacheMixin:
+    """
+    Serve the reads of cached_actions from the response cache
+
+    Entries are keyed on the user, the generation of their data and the
+    query. A write bumps the generation, so every entry of the user is
+    invalidated at once without looking for them; the stale ones expire or
+    are evicted. Entries bigger than RESPONSE_CACHE_MAX_ITEM_SIZE are not
+    stored, which bounds the memory a local cache holds by its MAX_ENTRIES.
+    Must come before DataVersionMixin, which reads the generation.
+    """
+    cached_actions = ('list',)
+    cache_key = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method == 'GET' and self.action in self.cached_actions:
+            self.cache_key = response_cache_key(request, self.generation)
+            data = caches[RESPONSE_CACHE].get(self.cache_key)
+            if data is not None:
+                stats.record('hits')
+                raise CachedResponse(pickle.loads(data))
+            stats.record('misses')
+
+    def handle_exception(self, exc):
+        if isinstance(exc, CachedResponse):
+            return Response(
+                data=exc.data,
+                status=status.HTTP_200_OK,
+                headers={CACHE_HEADER: 'hit'}
+            )
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        if (self.cache_key is not None
+                and response.status_code == status.HTTP_200_OK
+                and not response.has_header(CACHE_HEADER)):
+            data = pickle.dumps(response.data, pickle.HIGHEST_PROTOCOL)
+            if len(data) <= settings.RESPONSE_CACHE_MAX_ITEM_SIZE:
+                caches[RESPONSE_CACHE].set(self.cache_key, data)
+            else:
+                stats.record('oversized')
+            response[CACHE_HEADER] = 'miss'
+
+        return response
@@ -0,0 +1,63 @@
+from django.utils.http import parse_etags
+
+from rest_framework import status
+from rest_framework.response import Response
+
+from core.versions import current_generation
+
+
+class NotModified(Exception):
+    """The client already holds the current data of the user"""
+
+
+def version_etag(user_id, generation):
+    """Return the weak ETag of a generation of the data of a user"""
+    return f'W/"u{user_id}-{generation}"'
+
+
+def _weak(etag):
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+def etag_matches(etag, if_none_match):
+    """Return whether an If-None-Match header holds etag"""
+    etags = parse_etags(if_none_match or '')
+
+    return '*' in etags or _weak(etag) in map(_weak, etags)
+
+
+class DataVersionMixin:
+    """
+    Tag reads with the data version of the user
+
+    Reads carry the current generation of the data as a weak ETag and when
+    If-None-Match holds it they are answered 304 before any queryset or
+    serializer runs. The models and the bulk functions bump the version on
+    every write, so writes made outside of the API change it too.
+    """
+    generation = None
+    etag = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in ('GET', 'HEAD'):
+            self.generation = current_generation(request.user.pk)
+            self.etag = version_etag(request.user.pk, self.generation)
+            if etag_matches(self.etag, request.headers.get('If-None-Match')):
+                raise NotModified()
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return Response(status=status.HTTP_304_NOT_MODIFIED)
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        if self.etag is not None and response.status_code in (
+            status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED
+        ):
+            response['ETag'] = self.etag
+
+        return response
@@ -0,0 +1,75 @@
+import csv
+import json
+from collections import defaultdict
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from core.models import Operation
+
+
+EXPORT_FIELDS = ('id', 'date', 'name', 'description', 'value', 'account')
+CHUNK_SIZE = 2000
+
+
+def chunked(iterable, size):
+    """Yield lists of at most size items from iterable"""
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+
+def export_rows(queryset, chunk_size=CHUNK_SIZE):
+    """
+    Yield (row, tag names) for every operation in queryset, oldest first
+
+    Rows are tuples in EXPORT_FIELDS order read from a server-side cursor,
+    so no model instance is built and memory does not grow with the number
+    of operations. The tag names of each chunk are read with one query.
+    """
+    rows = queryset.order_by('date', 'id').values_list(
+        'id', 'date', 'name', 'description', 'value', 'account_id'
+    ).iterator(chunk_size=chunk_size)
+    through = Operation.tags.through.objects.using(queryset.db)
+
+    for chunk in chunked(rows, chunk_size):
+        tag_names = defaultdict(list)
+        for operation_id, name in through.filter(
+            operation_id__in=[row[0] for row in chunk]
+        ).order_by('id').values_list('operation_id', 'tag__name'):
+            tag_names[operation_id].append(name)
+
+        for row in chunk:
+            yield row, tag_names[row[0]]
+
+
+class _Echo:
+    """File-like object that returns what is written to it"""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    """Render exported rows as CSV lines, tag names separated by ';'"""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS + ('tags',))
+    for row, tags in rows:
+        yield writer.writerow(row + (';'.join(tags),))
+
+
+def ndjson_lines(rows):
+    """Render exported rows as newline delimited JSON objects"""
+    for row, tags in rows:
+        data = dict(zip(EXPORT_FIELDS, row))
+        data['value'] = str(data['value'])
+        data['tags'] = tags
+        yield json.dumps(data, cls=DjangoJSONEncoder) + '\n'
+
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', csv_lines),
+    'ndjson': ('application/x-ndjson', ndjson_lines),
+}
@@ -0,0 +1,90 @@
+from datetime import MAXYEAR, date, timedelta
+
+from rest_framework.exceptions import ValidationError
+
+
+def _parse_int(query_params, name):
+    """Return an integer query parameter, or None when it is missing"""
+    value = query_params.get(name)
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValidationError({name: 'A valid integer is required.'})
+
+
+def _parse_date(query_params, name):
+    """Return an ISO 8601 date query parameter, or None when it is missing"""
+    value = query_params.get(name)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValidationError({name: 'Date has wrong format, use YYYY-MM-DD.'})
+
+
+def _day_after(day):
+    """Return the day after day, or None after the last supported day"""
+    if day == date.max:
+        return None
+    return day + timedelta(days=1)
+
+
+def _first_day(year, month=1):
+    """Return the first day of a month, or None past the supported years"""
+    if year > MAXYEAR:
+        return None
+    return date(year, month, 1)
+
+
+def date_range(query_params):
+    """
+    Return the half-open (start, end) date range selected by query params
+
+    year, month and day narrow down a single period, the same way as before
+    (month is only used with year and day only with month), and date_from
+    and date_to (both inclusive) bound it further. Either side of the range
+    is None when it is unbounded, as is the end of a range reaching the
+    last supported day. Comparing against a range instead of extracting
+    parts of the date lets the database use its date indexes.
+    """
+    year = _parse_int(query_params, 'year')
+    month = _parse_int(query_params, 'month')
+    day = _parse_int(query_params, 'day')
+    start = _parse_date(query_params, 'date_from')
+    end = _parse_date(query_params, 'date_to')
+    if end is not None:
+        end = _day_after(end)
+
+    if year:
+        try:
+            if month and day:
+                period_start = date(year, month, day)
+                period_end = _day_after(period_start)
+            elif month:
+                period_start = date(year, month, 1)
+                period_end = _first_day(year + month // 12, month % 12 + 1)
+            else:
+                period_start = date(year, 1, 1)
+                period_end = _first_day(year + 1)
+        except ValueError as error:
+            raise ValidationError({'date': str(error)})
+        start = max(start, period_start) if start else period_start
+        if period_end is not None:
+            end = min(end, period_end) if end else period_end
+
+    return start, end
+
+
+def date_range_lookups(query_params, field='date'):
+    """Return filter() keyword arguments for the selected date range"""
+    start, end = date_range(query_params)
+    lookups = {}
+    if start is not None:
+        lookups[f'{field}__gte'] = start
+    if end is not None:
+        lookups[f'{field}__lt'] = end
+
+    return lookups
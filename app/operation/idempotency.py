@@ -0,0 +1,113 @@
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, router, transaction
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.response import Response
+
+from core.models import IdempotencyKey
+
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = IdempotencyKey._meta.get_field('key').max_length
+
+
+def expiry_cutoff():
+    """Return the creation time before which stored keys are expired"""
+    return timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+
+
+def request_hash(request):
+    """Return a hash of the method, path and body of a request"""
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = dict(data.lists())
+    content = json.dumps(
+        [request.method, request.path, data],
+        sort_keys=True,
+        cls=DjangoJSONEncoder
+    )
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+class IdempotentCreateMixin:
+    """
+    Replay the response of a create retried with the same Idempotency-Key
+
+    The key is stored with the response in the transaction that creates the
+    object, so a retry racing the original request fails on the unique
+    (user, key) index, rolls back its own write and replays the response.
+    """
+
+    def create(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key is None:
+            return super().create(request, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return Response(
+                data={'detail': (
+                    f'{IDEMPOTENCY_HEADER} must have 1 to {MAX_KEY_LENGTH} '
+                    f'characters.'
+                )},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        digest = request_hash(request)
+        stored = self._stored_key(key)
+        if stored is not None:
+            return self._replay(stored, digest)
+
+        using = router.db_for_write(
+            IdempotencyKey, instance=request.user
+        )
+        try:
+            with transaction.atomic(using=using):
+                response = super().create(request, *args, **kwargs)
+                keys = IdempotencyKey.objects.using(using)
+                keys.filter(
+                    user=request.user, key=key, created__lt=expiry_cutoff()
+                ).delete()
+                keys.create(
+                    user=request.user,
+                    key=key,
+                    request_hash=digest,
+                    status_code=response.status_code,
+                    response=response.data
+                )
+        except IntegrityError:
+            stored = self._stored_key(key)
+            if stored is None:
+                raise
+            return self._replay(stored, digest)
+
+        return response
+
+    def _stored_key(self, key):
+        """Return the unexpired stored key of the user, if any"""
+        return IdempotencyKey.objects.filter(
+            user=self.request.user,
+            key=key,
+            created__gte=expiry_cutoff()
+        ).first()
+
+    def _replay(self, stored, digest):
+        """Return the stored response, if the request is the same"""
+        if stored.request_hash != digest:
+            return Response(
+                data={'detail': (
+                    f'{IDEMPOTENCY_HEADER} was already used for a different '
+                    f'request.'
+                )},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY
+            )
+
+        return Response(
+            data=stored.response,
+            status=stored.status_code,
+            headers={'Idempotent-Replayed': 'true'}
+        )
@@ -0,0 +1,118 @@
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F, Prefetch
+
+from core.models import Account, Operation, Tag
+
+from operation import rows
+from operation.serializers import OperationSerializer
+
+
+class Command(BaseCommand):
+    """Django command to benchmark the serialization of operation lists"""
+    help = (
+        'Compare the rows per second of the serializer and of the values() '
+        'path when listing operations'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--operations', type=int, default=100000)
+        parser.add_argument('--tags', type=int, default=2,
+                            help='Tags per operation')
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        using = options['database']
+        with transaction.atomic(using=using):
+            user = self._populate(using, options['operations'],
+                                  options['tags'])
+            operations = Operation.objects.using(using).filter(
+                user=user
+            ).order_by(F('date').desc(nulls_first=True), '-id')
+
+            serializer = self._best(options['repeat'], lambda: (
+                OperationSerializer(operations.prefetch_related(Prefetch(
+                    'tags', queryset=Tag.objects.only('id').order_by('id')
+                )), many=True).data
+            ))
+            values = self._best(options['repeat'], lambda: (
+                rows.render_operations(
+                    list(rows.operation_values(
+                        operations, OperationSerializer()
+                    )),
+                    OperationSerializer(),
+                    using
+                )
+            ))
+            # Nothing created for the benchmark is kept
+            transaction.set_rollback(True, using=using)
+
+        count = options['operations']
+        for label, seconds in (('serializer', serializer),
+                               ('values rows', values)):
+            self.stdout.write(
+                f'{label}: {count} operations in {seconds:.3f}s, '
+                f'{count / seconds:.0f} rows/s'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'values rows are {serializer / values:.1f}x faster'
+        ))
+
+    def _populate(self, using, count, tags_per_operation):
+        """Create a user with count operations, each with some tags"""
+        user = get_user_model().objects.db_manager(using).create_user(
+            'benchmark@operation.list', None
+        )
+        account = Account.objects.using(using).create(
+            user=user, name='Benchmark'
+        )
+        Tag.objects.using(using).bulk_create(
+            Tag(user=user, name=f'Tag {i}') for i in range(10)
+        )
+        tags = list(Tag.objects.using(using).filter(user=user))
+        start = date(2000, 1, 1)
+        Operation.objects.using(using).bulk_create(
+            (
+                Operation(
+                    user=user,
+                    account=account,
+                    name=f'Operation {i}',
+                    value=i % 1000 - 500,
+                    date=start + timedelta(days=i % 7000)
+                )
+                for i in range(count)
+            ),
+            batch_size=1000
+        )
+        operations = Operation.objects.using(using).filter(
+            user=user
+        ).values_list('id', flat=True).iterator()
+        through = Operation.tags.through
+        through.objects.using(using).bulk_create(
+            (
+                through(
+                    operation_id=operation_id,
+                    tag_id=tags[(index + offset) % len(tags)].id
+                )
+                for index, operation_id in enumerate(operations)
+                for offset in range(tags_per_operation)
+            ),
+            batch_size=1000
+        )
+
+        return user
+
+    def _best(self, repeat, run):
+        """Return the best time of run over repeat runs"""
+        times = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - started)
+
+        return min(times)
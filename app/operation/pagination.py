@@ -0,0 +1,187 @@
+import json
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginate newest first by (position_field, unique_field)
+
+    The cursor holds the values of the last row of a page, so every page is
+    fetched with an indexed range condition instead of an OFFSET and page N
+    costs the same as the first one. Rows with a null position come first.
+    """
+    cursor_query_param = 'cursor'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    position_field = 'date'
+    unique_field = 'id'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.position_field, self.unique_field = self.get_ordering(view)
+        position, unique, reverse = self.decode_cursor(request, queryset)
+
+        if unique is not None:
+            if reverse:
+                queryset = queryset.filter(self._before(position, unique))
+            else:
+                queryset = queryset.filter(self._after(position, unique))
+        queryset = queryset.order_by(*self._order_by(reverse))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, unique is not None
+        self.page = rows
+
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'previous': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+    def get_ordering(self, view):
+        """Return the (position_field, unique_field) to paginate by"""
+        ordering = getattr(view, 'keyset_ordering', None)
+
+        return ordering or (self.position_field, self.unique_field)
+
+    def get_page_size(self, request):
+        """Return the page size requested by the client, within bounds"""
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+
+        return max(1, min(page_size, self.max_page_size))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def encode_cursor(self, row, reverse):
+        """Return the URL of the page before or after row"""
+        payload = [
+            _row_value(row, self.position_field),
+            _row_value(row, self.unique_field),
+        ]
+        if reverse:
+            payload.append(1)
+        cursor = b64encode(
+            json.dumps(payload, cls=DjangoJSONEncoder).encode()
+        ).decode()
+
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            cursor
+        )
+
+    def decode_cursor(self, request, queryset):
+        """
+        Return the (position, unique, reverse) held by the cursor
+
+        The values are parsed as the fields of queryset they stand for, so
+        a cursor that was not produced by encode_cursor is not found rather
+        than failing in the query.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, None, False
+        try:
+            payload = json.loads(b64decode(encoded.encode()).decode())
+            if not isinstance(payload, list) or len(payload) not in (2, 3):
+                raise ValueError('Not a cursor')
+            position = _field(queryset, self.position_field).to_python(
+                payload[0]
+            )
+            unique = _field(queryset, self.unique_field).to_python(
+                payload[1]
+            )
+            if unique is None:
+                raise ValueError('Missing unique value')
+            reverse = len(payload) > 2 and bool(payload[2])
+        except (TypeError, ValueError, UnicodeDecodeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+        return position, unique, reverse
+
+    def _order_by(self, reverse):
+        position = F(self.position_field)
+        if reverse:
+            return position.asc(nulls_last=True), self.unique_field
+        return position.desc(nulls_first=True), f'-{self.unique_field}'
+
+    def _after(self, position, unique):
+        """Return the condition for rows that come after the cursor"""
+        field, key = self.position_field, self.unique_field
+        if position is None:
+            return (
+                Q(**{f'{field}__isnull': True, f'{key}__lt': unique}) |
+                Q(**{f'{field}__isnull': False})
+            )
+        return Q(**{f'{field}__lte': position}) & (
+            Q(**{f'{field}__lt': position}) | Q(**{f'{key}__lt': unique})
+        )
+
+    def _before(self, position, unique):
+        """Return the condition for rows that come before the cursor"""
+        field, key = self.position_field, self.unique_field
+        if position is None:
+            return Q(**{f'{field}__isnull': True, f'{key}__gt': unique})
+        return Q(**{f'{field}__isnull': True}) | (
+            Q(**{f'{field}__gte': position}) & (
+                Q(**{f'{field}__gt': position}) | Q(**{f'{key}__gt': unique})
+            )
+        )
+
+
+def _field(queryset, name):
+    """Return the model field or annotation of queryset called name"""
+    annotation = queryset.query.annotations.get(name)
+    if annotation is not None:
+        return annotation.output_field
+    return queryset.model._meta.get_field(name)
+
+
+def _row_value(row, field):
+    """Return a field of a model instance or of a values() row"""
+    if isinstance(row, dict):
+        return row[field]
+    return getattr(row, field)
@@ -0,0 +1,77 @@
+from collections import defaultdict
+
+from rest_framework import serializers
+
+from core.models import Operation
+
+
+def renders_rows(serializer):
+    """Return whether serializer can be rendered from values() rows"""
+    return not any(
+        isinstance(field, serializers.BaseSerializer)
+        for field in serializer.fields.values()
+    )
+
+
+def operation_values(queryset, serializer, extra=()):
+    """
+    Return queryset as values() rows holding what serializer renders
+
+    extra names more columns or annotations to read, like the position the
+    rows are paginated by.
+    """
+    columns = [name for name in serializer.fields if name != 'tags']
+
+    return queryset.prefetch_related(None).values(
+        *dict.fromkeys(('id', *columns, *extra))
+    )
+
+
+def tag_ids(operation_ids, using):
+    """Return the tag ids of each operation, read with one query"""
+    tags = defaultdict(list)
+    for operation_id, tag_id in Operation.tags.through.objects.using(
+        using
+    ).filter(
+        operation_id__in=operation_ids
+    ).order_by('operation_id', 'tag_id').values_list(
+        'operation_id', 'tag_id'
+    ):
+        tags[operation_id].append(tag_id)
+
+    return tags
+
+
+def render_operations(rows, serializer, using):
+    """
+    Render values() rows exactly like serializer renders operations
+
+    Columns are copied as they come from the database except for those
+    whose representation differs, which go through the serializer's own
+    field, so no model instance or per-row serializer is ever built.
+    """
+    columns = []
+    for name, field in serializer.fields.items():
+        if name in ('value', 'date'):
+            columns.append((name, field.to_representation))
+        else:
+            columns.append((name, None))
+    tags = (
+        tag_ids([row['id'] for row in rows], using)
+        if 'tags' in serializer.fields else {}
+    )
+
+    data = []
+    for row in rows:
+        item = {}
+        for name, convert in columns:
+            if name == 'tags':
+                item[name] = tags.get(row['id'], [])
+                continue
+            value = row[name]
+            if convert is not None and value is not None:
+                value = convert(value)
+            item[name] = value
+        data.append(item)
+
+    return data
@@ -0,0 +1,46 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import F, Q
+
+
+SEARCH_CONFIG = 'simple'
+
+_WORD = re.compile(r'\w+')
+
+
+def ranks_search(using):
+    """Return whether searches on the database are full-text and ranked"""
+    return connections[using].vendor == 'postgresql'
+
+
+def search_operations(queryset, text):
+    """
+    Filter operations whose name or description match every word of text
+
+    On PostgreSQL each word is a prefix match against the search_vector
+    column, read from the (user_id, search_vector) GIN index, and matches
+    are annotated with their search_rank. Other databases fall back to a
+    case insensitive substring match without rank.
+    """
+    words = _WORD.findall(text)
+    if not words:
+        return queryset.none()
+
+    if not ranks_search(queryset.db):
+        condition = Q()
+        for word in words:
+            condition &= (
+                Q(name__icontains=word) | Q(description__icontains=word)
+            )
+        return queryset.filter(condition)
+
+    query = SearchQuery(
+        ' & '.join(f'{word}:*' for word in words),
+        config=SEARCH_CONFIG,
+        search_type='raw'
+    )
+    return queryset.filter(search_vector=query).annotate(
+        search_rank=SearchRank(F('search_vector'), query)
+    )
@@ -1,9 +1,85 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+
 from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
 
+from core.metrics import TimedSerializerMixin
 from core.models import Account, AccountType, Tag, Operation
 
 
-class AccountTypeSerializer(serializers.ModelSerializer):
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    """Resolve a list of primary keys with a single query"""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+
+        child = self.child_relation
+        pk_field = child.get_queryset().model._meta.pk
+        pks = []
+        for pk in data:
+            try:
+                pks.append(pk_field.to_python(pk))
+            except DjangoValidationError:
+                child.fail('incorrect_type', data_type=type(pk).__name__)
+        objects = child.get_queryset().in_bulk(pks)
+        for pk in pks:
+            if pk not in objects:
+                child.fail('does_not_exist', pk_value=pk)
+
+        return [objects[pk] for pk in pks]
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Primary key field that validates many=True input in one query"""
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
+
+
+class DynamicFieldsMixin:
+    """
+    Let clients pick the fields of a serializer and the relations it nests
+
+    fields lists the names to keep, all of them when None. expand lists the
+    expandable_fields to nest as objects instead of primary keys, and
+    defaults to default_expand when None.
+    """
+    expandable_fields = {}
+    default_expand = ()
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        expand = self.default_expand if expand is None else expand
+        self._check_names('expand', expand, self.expandable_fields)
+        for name in expand:
+            serializer_class, options = self.expandable_fields[name]
+            self.fields[name] = serializer_class(read_only=True, **options)
+
+        if fields is not None:
+            self._check_names('fields', fields, self.fields)
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    def _check_names(self, param, names, allowed):
+        unknown = [name for name in names if name not in allowed]
+        if unknown:
+            raise serializers.ValidationError({param: [
+                f'Unknown field "{name}", expected one of '
+                f'{", ".join(allowed)}.'
+                for name in unknown
+            ]})
+
+
+class AccountTypeSerializer(TimedSerializerMixin, DynamicFieldsMixin,
+                            serializers.ModelSerializer):
     """Serializer for account type object"""
 
     class Meta:
@@ -12,11 +88,13 @@ class AccountTypeSerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
 
 
-class AccountSerializer(serializers.ModelSerializer):
+class AccountSerializer(TimedSerializerMixin, DynamicFieldsMixin,
+                        serializers.ModelSerializer):
     """Serializer for account object"""
     acctype = serializers.PrimaryKeyRelatedField(
         queryset=AccountType.objects.all()
     )
+    expandable_fields = {'acctype': (AccountTypeSerializer, {})}
 
     class Meta:
         model = Account
@@ -26,10 +104,11 @@ class AccountSerializer(serializers.ModelSerializer):
 
 class AccountDetailSerializer(AccountSerializer):
     """Serialize a account detail"""
-    acctype = AccountTypeSerializer()
+    default_expand = ('acctype',)
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin, DynamicFieldsMixin,
+                    serializers.ModelSerializer):
     """Serializer for tag object"""
 
     class Meta:
@@ -38,15 +117,20 @@ class TagSerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
 
 
-class OperationSerializer(serializers.ModelSerializer):
+class OperationSerializer(TimedSerializerMixin, DynamicFieldsMixin,
+                          serializers.ModelSerializer):
     """Serializer for operation object"""
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = BulkPrimaryKeyRelatedField(
         many=True,
         queryset=Tag.objects.all()
     )
     account = serializers.PrimaryKeyRelatedField(
         queryset=Account.objects.all()
     )
+    expandable_fields = {
+        'account': (AccountSerializer, {}),
+        'tags': (TagSerializer, {'many': True}),
+    }
 
     class Meta:
         model = Operation
@@ -58,5 +142,52 @@ class OperationSerializer(serializers.ModelSerializer):
 
 class OperationDetailSerializer(OperationSerializer):
     """Serialize an operation detail"""
-    account = AccountSerializer(read_only=True)
-    tags = TagSerializer(many=True, read_only=True)
+    default_expand = ('account', 'tags')
+
+
+class OperationBulkItemSerializer(TimedSerializerMixin,
+                                  serializers.ModelSerializer):
+    """Validate one operation of a bulk request without database queries"""
+    account = serializers.IntegerField()
+    tags = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False
+    )
+
+    class Meta:
+        model = Operation
+        fields = ('name', 'description', 'value', 'date', 'tags', 'account')
+
+
+class OperationBulkUpdateSerializer(TimedSerializerMixin,
+                                    serializers.ModelSerializer):
+    """Validate the changes applied to many operations at once"""
+    account = serializers.IntegerField()
+
+    class Meta:
+        model = Operation
+        fields = ('name', 'description', 'value', 'date', 'account')
+
+
+class OperationBulkSelectionSerializer(TimedSerializerMixin,
+                                       serializers.Serializer):
+    """Validate the ids of the operations a bulk request applies to"""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        max_length=10000
+    )
+
+
+class OperationBulkTagSerializer(OperationBulkSelectionSerializer):
+    """Validate the tags added to and removed from many operations"""
+    add = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        default=list
+    )
+    remove = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        default=list
+    )
@@ -0,0 +1,88 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+
+from rest_framework import serializers
+
+
+SPARSE_PARAMS = ('fields', 'expand')
+
+
+def _names(value):
+    """Split a comma separated query parameter"""
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+def load_plan(serializer, model, prefix=''):
+    """
+    Return what to load from the database to render serializer
+
+    The result is the columns to pass to only(), the relations to join with
+    select_related() and the Prefetch objects for many-to-many fields, each
+    narrowed to the fields the nested serializers render and ordered by
+    primary key.
+    """
+    opts = model._meta
+    columns, joins, prefetches = [prefix + opts.pk.name], [], []
+    for field in serializer.fields.values():
+        try:
+            model_field = opts.get_field(field.source)
+        except FieldDoesNotExist:
+            continue
+        name = prefix + model_field.name
+        related = model_field.related_model
+
+        if model_field.many_to_many:
+            if isinstance(field, serializers.ListSerializer):
+                related_columns = load_plan(field.child, related)[0]
+            else:
+                related_columns = [related._meta.pk.name]
+            prefetches.append(Prefetch(
+                name,
+                queryset=related.objects.only(*related_columns).order_by(
+                    related._meta.pk.name
+                )
+            ))
+        elif model_field.is_relation and isinstance(
+            field, serializers.BaseSerializer
+        ):
+            related_columns, related_joins, related_prefetches = load_plan(
+                field, related, prefix=f'{name}__'
+            )
+            columns += [name, *related_columns]
+            joins += [name, *related_joins]
+            prefetches += related_prefetches
+        else:
+            columns.append(name)
+
+    return columns, joins, prefetches
+
+
+class SparseFieldsMixin:
+    """
+    Apply the fields and expand query parameters to reads
+
+    ?fields=id,date,value keeps only those fields of the response and
+    ?expand=account nests the listed relations instead of their ids. The
+    queryset then only loads, joins and prefetches what is rendered.
+    """
+
+    def get_serializer(self, *args, **kwargs):
+        if self.request.method == 'GET':
+            params = self.request.query_params
+            if params.get('fields'):
+                kwargs.setdefault('fields', _names(params['fields']))
+            if 'expand' in params:
+                kwargs.setdefault('expand', _names(params['expand']))
+        return super().get_serializer(*args, **kwargs)
+
+    def narrow_queryset(self, queryset, *columns):
+        """Load only the columns and relations the serializer renders"""
+        plan_columns, joins, prefetches = load_plan(
+            self.get_serializer(), queryset.model
+        )
+
+        queryset = queryset.only(*plan_columns, *columns)
+        if joins:
+            queryset = queryset.select_related(*joins)
+
+        return queryset.prefetch_related(*prefetches)
@@ -193,3 +193,39 @@ class PrivateAccountApiTests(TestCase):
         self.assertEqual(account.active, payload['active'])
         account_type = account.acctype
         self.assertEqual(new_account_type, account_type)
+
+    def test_account_queries_constant(self):
+        """Test listing and viewing accounts use constant queries"""
+        for i in range(5):
+            account = sample_account(
+                user=self.user,
+                name=f'Account {i}',
+                acctype=sample_account_type(user=self.user)
+            )
+
+        with self.assertNumQueries(2):
+            self.client.get(ACCOUNT_URL)
+        with self.assertNumQueries(2):
+            self.client.get(detail_url(account.id))
+
+    def test_account_sparse_fields(self):
+        """Test choosing the fields and expansions of accounts"""
+        acctype = sample_account_type(user=self.user)
+        account = sample_account(user=self.user, acctype=acctype)
+
+        with self.assertNumQueries(2):
+            res = self.client.get(
+                ACCOUNT_URL, {'fields': 'id,acctype', 'expand': 'acctype'}
+            )
+        detail = self.client.get(detail_url(account.id), {'expand': ''})
+
+        self.assertEqual(res.data, [{
+            'id': account.id,
+            'acctype': {
+                'id': acctype.id,
+                'name': acctype.name,
+                'description': '',
+                'calculate': True,
+            },
+        }])
+        self.assertEqual(detail.data['acctype'], acctype.id)
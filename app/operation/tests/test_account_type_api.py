@@ -97,3 +97,18 @@ class PrivateAccountTypeApiTests(TestCase):
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data[0]['calculate'], account_type.calculate)
+
+    def test_account_type_queries_constant(self):
+        """Test listing and viewing account types use constant queries"""
+        for i in range(5):
+            account_type = AccountType.objects.create(
+                user=self.user,
+                name=f'Account type {i}'
+            )
+
+        with self.assertNumQueries(2):
+            self.client.get(ACCOUNT_TYPE_URL)
+        with self.assertNumQueries(2):
+            self.client.get(
+                reverse('operation:accounttype-detail', args=[account_type.id])
+            )
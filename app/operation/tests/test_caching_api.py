@@ -0,0 +1,130 @@
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.urls import reverse
+from django.test import TestCase, override_settings
+
+from rest_framework.test import APIClient
+
+from core.models import Account, Operation, Tag
+
+from operation.caching import RESPONSE_CACHE, stats
+
+
+OPERATIONS_URL = reverse('operation:operation-list')
+TAG_URL = reverse('operation:tag-list')
+
+
+def account_balance_url(account_id):
+    """Return the account balance URL"""
+    return reverse('operation:operation-account-balance', args=[account_id])
+
+
+class ResponseCacheApiTests(TestCase):
+    """Test list responses are served from the cache"""
+
+    def setUp(self):
+        caches[RESPONSE_CACHE].clear()
+        stats.reset()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'sample_user@gmail.com',
+            'testpass123'
+        )
+        self.client.force_authenticate(self.user)
+        self.account = Account.objects.create(user=self.user, name='Bank')
+        self.tag = Tag.objects.create(user=self.user, name='Food')
+        Operation.objects.create(
+            user=self.user,
+            account=self.account,
+            name='Supermarket',
+            value=-5,
+            date=date(2021, 1, 1)
+        )
+
+    def test_repeated_list_is_cached(self):
+        """Test the same list is served from the cache the second time"""
+        first = self.client.get(OPERATIONS_URL, {'year': 2021, 'month': 1})
+
+        with self.assertNumQueries(1):
+            res = self.client.get(
+                f'{OPERATIONS_URL}?month=1&year=2021'
+            )
+
+        self.assertEqual(first['X-Cache'], 'miss')
+        self.assertEqual(res['X-Cache'], 'hit')
+        self.assertEqual(res.content, first.content)
+        self.assertEqual(res['ETag'], first['ETag'])
+        self.assertEqual(stats.as_dict(),
+                         {'hits': 1, 'misses': 1, 'oversized': 0})
+
+    def test_queries_are_cached_apart(self):
+        """Test different query parameters are different entries"""
+        self.client.get(OPERATIONS_URL)
+
+        res = self.client.get(OPERATIONS_URL, {'year': 2020})
+
+        self.assertEqual(res['X-Cache'], 'miss')
+        self.assertEqual(res.data['results'], [])
+
+    def test_writes_invalidate_the_cache(self):
+        """Test a list after a write is not served from the cache"""
+        self.client.get(TAG_URL)
+        self.client.post(TAG_URL, {'name': 'Home'}, format='json')
+
+        res = self.client.get(TAG_URL)
+
+        self.assertEqual(res['X-Cache'], 'miss')
+        self.assertEqual(
+            [tag['name'] for tag in res.data], ['Food', 'Home']
+        )
+
+    def test_account_balance_is_cached(self):
+        """Test the account balance is cached until an operation changes"""
+        url = account_balance_url(self.account.id)
+        self.client.get(url)
+        cached = self.client.get(url)
+        Operation.objects.create(
+            user=self.user, account=self.account, name='Salary', value=100
+        )
+
+        res = self.client.get(url)
+
+        self.assertEqual(cached['X-Cache'], 'hit')
+        self.assertEqual(res['X-Cache'], 'miss')
+        self.assertEqual(str(res.data), '95.00')
+
+    def test_cache_is_per_user(self):
+        """Test users never get the cached responses of others"""
+        user2 = get_user_model().objects.create_user(
+            'other@gmail.com',
+            'testpass123'
+        )
+        self.client.get(TAG_URL)
+        self.client.force_authenticate(user2)
+
+        res = self.client.get(TAG_URL)
+
+        self.assertEqual(res['X-Cache'], 'miss')
+        self.assertEqual(res.data, [])
+
+    def test_details_are_not_cached(self):
+        """Test only the cached actions go through the cache"""
+        url = reverse('operation:tag-detail', args=[self.tag.id])
+        self.client.get(url)
+
+        res = self.client.get(url)
+
+        self.assertFalse(res.has_header('X-Cache'))
+
+    @override_settings(RESPONSE_CACHE_MAX_ITEM_SIZE=10)
+    def test_oversized_responses_are_not_cached(self):
+        """Test responses over the size limit are not stored"""
+        self.client.get(OPERATIONS_URL)
+
+        res = self.client.get(OPERATIONS_URL)
+
+        self.assertEqual(res['X-Cache'], 'miss')
+        self.assertEqual(stats.as_dict(),
+                         {'hits': 0, 'misses': 2, 'oversized': 2})
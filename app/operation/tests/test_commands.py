@@ -0,0 +1,23 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from core.models import Operation
+
+
+class BenchmarkOperationListCommandTests(TestCase):
+
+    def test_benchmark_operation_list(self):
+        """Test the benchmark reports both paths and keeps nothing"""
+        out = StringIO()
+
+        call_command(
+            'benchmark_operation_list',
+            operations=20, repeat=1, stdout=out
+        )
+
+        self.assertIn('serializer: 20 operations', out.getvalue())
+        self.assertIn('values rows: 20 operations', out.getvalue())
+        self.assertIn('rows/s', out.getvalue())
+        self.assertFalse(Operation.objects.exists())
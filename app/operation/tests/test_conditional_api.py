@@ -0,0 +1,133 @@
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.test import TestCase
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Account, Operation, Tag
+from core.versions import current_generation, current_version
+
+
+OPERATIONS_URL = reverse('operation:operation-list')
+ACCOUNT_URL = reverse('operation:account-list')
+ACCOUNT_TYPE_URL = reverse('operation:accounttype-list')
+TAG_URL = reverse('operation:tag-list')
+BULK_UPDATE_URL = reverse('operation:operation-bulk-update')
+
+
+def account_detail_url(account_id):
+    """Return account detail URL"""
+    return reverse('operation:account-detail', args=[account_id])
+
+
+class DataVersionApiTests(TestCase):
+    """Test conditional reads with the data version of the user"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'sample_user@gmail.com',
+            'testpass123'
+        )
+        self.client.force_authenticate(self.user)
+        self.account = Account.objects.create(user=self.user, name='Bank')
+        self.payload = {
+            'name': 'Supermarket',
+            'value': '-5.00',
+            'date': '2021-01-01',
+            'account': self.account.id,
+            'tags': [],
+        }
+
+    def test_not_modified(self):
+        """Test a read with the current ETag skips the query"""
+        res = self.client.get(OPERATIONS_URL)
+        etag = res['ETag']
+
+        with self.assertNumQueries(1):
+            cached = self.client.get(OPERATIONS_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(
+            etag, f'W/"u{self.user.id}-{current_generation(self.user.id)}"'
+        )
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(cached.content, b'')
+        self.assertEqual(cached['ETag'], etag)
+
+    def test_every_endpoint_is_conditional(self):
+        """Test accounts, account types and tags are conditional too"""
+        for url in (ACCOUNT_URL, ACCOUNT_TYPE_URL, TAG_URL,
+                    account_detail_url(self.account.id)):
+            etag = self.client.get(url)['ETag']
+
+            res = self.client.get(url, HTTP_IF_NONE_MATCH=f'"x", {etag}')
+
+            self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_writes_change_the_etag(self):
+        """Test creates, bulk changes and cascades bump the version"""
+        etags = [self.client.get(OPERATIONS_URL)['ETag']]
+        writes = (
+            lambda: self.client.post(
+                OPERATIONS_URL, self.payload, format='json'
+            ),
+            lambda: self.client.post(
+                BULK_UPDATE_URL,
+                {'ids': list(Operation.objects.values_list('id', flat=True)),
+                 'set': {'name': 'Bakery'}},
+                format='json'
+            ),
+            lambda: self.client.delete(account_detail_url(self.account.id)),
+        )
+        for write in writes:
+            self.assertLess(write().status_code, 400)
+
+            res = self.client.get(
+                OPERATIONS_URL, HTTP_IF_NONE_MATCH=', '.join(etags)
+            )
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            etags.append(res['ETag'])
+        self.assertEqual(len(set(etags)), 4)
+        self.assertFalse(Operation.objects.exists())
+
+    def test_failed_write_keeps_the_version(self):
+        """Test rejected writes do not bump the version"""
+        version = current_version(self.user.id)
+
+        self.client.post(TAG_URL, {}, format='json')
+
+        self.assertEqual(current_version(self.user.id), version)
+
+    def test_writes_outside_the_api_change_the_etag(self):
+        """Test model saves, deletes and tag changes bump the version"""
+        operation = Operation.objects.create(
+            user=self.user, account=self.account, name='Bakery', value=-2
+        )
+        tag = Tag.objects.create(user=self.user, name='Food')
+        etags = [self.client.get(TAG_URL)['ETag']]
+        for write in (lambda: operation.tags.add(tag),
+                      lambda: operation.tags.remove(tag),
+                      tag.delete):
+            write()
+
+            etags.append(self.client.get(TAG_URL)['ETag'])
+
+        self.assertEqual(len(set(etags)), 4)
+
+    def test_versions_are_per_user(self):
+        """Test writes of a user do not change the ETag of others"""
+        user2 = get_user_model().objects.create_user(
+            'other@gmail.com',
+            'testpass123'
+        )
+        Tag.objects.create(user=user2, name='Food')
+        etag = self.client.get(TAG_URL)['ETag']
+        self.client.force_authenticate(user2)
+        self.client.post(TAG_URL, {'name': 'Home'}, format='json')
+        self.client.force_authenticate(self.user)
+
+        res = self.client.get(TAG_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
@@ -0,0 +1,157 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.test import TestCase
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (Account, AccountBalance, AccountType, IdempotencyKey,
+                         Operation, Tag)
+
+from operation.views import OperationViewSet
+
+
+OPERATIONS_URL = reverse('operation:operation-list')
+ACCOUNT_URL = reverse('operation:account-list')
+TAG_URL = reverse('operation:tag-list')
+
+
+class IdempotentCreateApiTests(TestCase):
+    """Test retrying creates with an Idempotency-Key header"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'sample_user@gmail.com',
+            'testpass123'
+        )
+        self.client.force_authenticate(self.user)
+        self.account = Account.objects.create(user=self.user, name='Bank')
+        self.payload = {
+            'name': 'Supermarket',
+            'value': '-5.00',
+            'date': '2021-01-01',
+            'account': self.account.id,
+            'tags': [],
+        }
+
+    def post(self, url, payload, key='retry-1'):
+        return self.client.post(
+            url, payload, format='json', HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    def test_retry_replays_operation_create(self):
+        """Test a retried create returns the first response only once"""
+        first = self.post(OPERATIONS_URL, self.payload)
+
+        with self.assertNumQueries(1):
+            retry = self.post(OPERATIONS_URL, self.payload)
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Operation.objects.count(), 1)
+        balance = AccountBalance.objects.get(account=self.account)
+        self.assertEqual(balance.balance, Decimal('-5.00'))
+
+    def test_create_without_key(self):
+        """Test creates without a key are never replayed"""
+        self.client.post(OPERATIONS_URL, self.payload, format='json')
+        self.client.post(OPERATIONS_URL, self.payload, format='json')
+
+        self.assertEqual(Operation.objects.count(), 2)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_key_reused_for_other_request(self):
+        """Test a key sent with a different body is rejected"""
+        self.post(OPERATIONS_URL, self.payload)
+        self.payload['value'] = '-6.00'
+
+        res = self.post(OPERATIONS_URL, self.payload)
+
+        self.assertEqual(
+            res.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+        self.assertEqual(Operation.objects.count(), 1)
+
+    def test_failed_create_is_not_stored(self):
+        """Test a rejected request can be retried with the same key"""
+        account = self.payload.pop('account')
+        res = self.post(OPERATIONS_URL, self.payload)
+        self.payload['account'] = account
+
+        retry = self.post(OPERATIONS_URL, self.payload)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Operation.objects.count(), 1)
+
+    def test_keys_are_per_user(self):
+        """Test users do not share idempotency keys"""
+        self.post(TAG_URL, {'name': 'Food'})
+        user2 = get_user_model().objects.create_user(
+            'other@gmail.com',
+            'testpass123'
+        )
+        self.client.force_authenticate(user2)
+
+        res = self.post(TAG_URL, {'name': 'Food'})
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Tag.objects.filter(user=user2).count(), 1)
+
+    def test_retry_replays_account_create(self):
+        """Test a retried account create is not created twice"""
+        acctype = AccountType.objects.create(user=self.user, name='Bank')
+        payload = {'name': 'Savings', 'acctype': acctype.id}
+
+        first = self.post(ACCOUNT_URL, payload)
+        retry = self.post(ACCOUNT_URL, payload)
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(Account.objects.filter(name='Savings').count(), 1)
+
+    def test_expired_key(self):
+        """Test a key past its TTL creates again"""
+        self.post(TAG_URL, {'name': 'Food'})
+        IdempotencyKey.objects.update(
+            created=timezone.now() - timedelta(days=2)
+        )
+
+        with self.settings(IDEMPOTENCY_KEY_TTL=24 * 60 * 60):
+            res = self.post(TAG_URL, {'name': 'Food'})
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Tag.objects.count(), 2)
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+
+    def test_retry_racing_first_request(self):
+        """Test a retry that loses the race rolls back and replays"""
+        first = self.post(OPERATIONS_URL, self.payload)
+        stored = IdempotencyKey.objects.get()
+
+        with patch.object(
+            OperationViewSet, '_stored_key', side_effect=[None, stored]
+        ):
+            retry = self.post(OPERATIONS_URL, self.payload)
+
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(Operation.objects.count(), 1)
+        balance = AccountBalance.objects.get(account=self.account)
+        self.assertEqual(balance.balance, Decimal('-5.00'))
+
+    def test_invalid_key(self):
+        """Test an empty or too long key is rejected"""
+        for key in ('', 'k' * 256):
+            res = self.post(TAG_URL, {'name': 'Food'}, key=key)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Tag.objects.exists())
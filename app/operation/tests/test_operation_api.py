@@ -1,17 +1,29 @@
+from base64 import b64encode
+from collections import OrderedDict
 from decimal import Decimal
 from core.models import Account, Tag, Operation
+from core.versions import bump_version
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import F, Prefetch
 from django.urls import reverse
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from datetime import datetime, date
+from operation.export import export_rows
 from operation.serializers import (OperationSerializer,
                                    OperationDetailSerializer
                                    )
 
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
 
+import csv
+import json
 import random
+import re
+from unittest import skipUnless
 
 
 OPERATIONS_URL = reverse('operation:operation-list')
@@ -22,11 +34,25 @@ def detail_url(operation_id):
     return reverse('operation:operation-detail', args=[operation_id])
 
 
+EXPORT_URL = reverse('operation:operation-export')
+
+
 def account_balance_url(account_id):
     """Return account_balance URL"""
     return reverse('operation:operation-account-balance', args=[account_id])
 
 
+def query_plan(sql):
+    """Return the plan the database uses to run a captured query"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute(f'EXPLAIN {sql}')
+        else:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        return '\n'.join(str(row[-1]) for row in cursor.fetchall())
+
+
 def sample_tag(user, name='Sample tag'):
     """Create an return a sample tag"""
     return Tag.objects.create(user=user, name=name)
@@ -89,7 +115,7 @@ class PrivateOperationApiTests(TestCase):
         operations = Operation.objects.all().order_by('-id')
         serializer = OperationSerializer(operations, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_operation_limited_to_user(self):
         """Test retrieving operations for user"""
@@ -105,8 +131,8 @@ class PrivateOperationApiTests(TestCase):
         operations = Operation.objects.filter(user=self.user)
         serializer = OperationSerializer(operations, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_view_operation_detail(self):
         """Test viewing a operation detail"""
@@ -230,9 +256,9 @@ class PrivateOperationApiTests(TestCase):
         serializer1 = OperationSerializer(operation1)
         serializer2 = OperationSerializer(operation2)
         serializer3 = OperationSerializer(operation3)
-        self.assertIn(serializer1.data, res.data)
-        self.assertIn(serializer2.data, res.data)
-        self.assertNotIn(serializer3.data, res.data)
+        self.assertIn(serializer1.data, res.data['results'])
+        self.assertIn(serializer2.data, res.data['results'])
+        self.assertNotIn(serializer3.data, res.data['results'])
 
     def test_filter_operations_by_account(self):
         """Test returning operations with specific account"""
@@ -266,9 +292,91 @@ class PrivateOperationApiTests(TestCase):
         serializer1 = OperationSerializer(operation1)
         serializer2 = OperationSerializer(operation2)
         serializer3 = OperationSerializer(operation3)
-        self.assertIn(serializer1.data, res.data)
-        self.assertIn(serializer2.data, res.data)
-        self.assertNotIn(serializer3.data, res.data)
+        self.assertIn(serializer1.data, res.data['results'])
+        self.assertIn(serializer2.data, res.data['results'])
+        self.assertNotIn(serializer3.data, res.data['results'])
+
+    def test_operation_queries_constant(self):
+        """Test operation endpoints use the same queries for any size"""
+        account = sample_account(user=self.user)
+        tags = [sample_tag(user=self.user, name=f'Tag {i}') for i in range(3)]
+        url = detail_url(sample_operation(user=self.user, account=account).id)
+        for count in (1, 10):
+            for _ in range(count):
+                sample_operation(user=self.user, account=account).tags.set(
+                    tags
+                )
+
+            with self.assertNumQueries(3):
+                res = self.client.get(OPERATIONS_URL)
+            self.assertEqual(
+                len(res.data['results']), Operation.objects.count()
+            )
+            with self.assertNumQueries(3):
+                self.client.get(url)
+            with self.assertNumQueries(3):
+                self.client.get(account_balance_url(account.id))
+            # The balance over dates also reads the archived summaries
+            with self.assertNumQueries(4):
+                self.client.get(
+                    account_balance_url(account.id), {'year': 2021}
+                )
+
+    def test_create_with_tags_queries_constant(self):
+        """Test creating an operation uses the same queries for any tags"""
+        account = sample_account(user=self.user)
+        tags = [sample_tag(user=self.user, name=f'Tag {i}') for i in range(5)]
+        sample_operation(
+            user=self.user, account=account, date=date(2021, 1, 1)
+        )
+        bump_version(self.user.pk)
+        counts = []
+        for tag_count in (1, 5):
+            payload = {
+                'name': 'Supermarket',
+                'value': -5.00,
+                'date': date(2021, 1, 1),
+                'account': account.id,
+                'tags': [tag.id for tag in tags[:tag_count]]
+            }
+            with CaptureQueriesContext(connection) as queries:
+                res = self.client.post(OPERATIONS_URL, payload)
+
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            counts.append(len(queries))
+
+        self.assertEqual(counts[0], counts[1])
+
+    def test_create_with_unknown_tag(self):
+        """Test creating an operation with an unknown tag fails"""
+        tag = sample_tag(user=self.user)
+        payload = {
+            'name': 'Supermarket',
+            'value': -5.00,
+            'account': sample_account(self.user).id,
+            'tags': [tag.id, tag.id + 1]
+        }
+        res = self.client.post(OPERATIONS_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('tags', res.data)
+
+    def test_create_with_tag_of_wrong_type(self):
+        """Test the error names the type of the invalid tag"""
+        tag = sample_tag(user=self.user)
+        payload = {
+            'name': 'Supermarket',
+            'value': -5.00,
+            'account': sample_account(self.user).id,
+            'tags': [tag.id, {'id': tag.id}]
+        }
+        res = self.client.post(OPERATIONS_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            res.data['tags'],
+            ['Incorrect type. Expected pk value, received dict.']
+        )
 
 
 class OperationDateTests(TestCase):
@@ -302,10 +410,10 @@ class OperationDateTests(TestCase):
         serializer2 = OperationSerializer(operation2)
         serializer3 = OperationSerializer(operation3)
 
-        self.assertEqual(len(res.data), 1)
-        self.assertIn(serializer2.data, res.data)
-        self.assertNotIn(serializer1.data, res.data)
-        self.assertNotIn(serializer3.data, res.data)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertIn(serializer2.data, res.data['results'])
+        self.assertNotIn(serializer1.data, res.data['results'])
+        self.assertNotIn(serializer3.data, res.data['results'])
 
     def test_filter_operation_by_year_and_month(self):
         """Test filtering operation by year and month"""
@@ -333,10 +441,10 @@ class OperationDateTests(TestCase):
         serializer2 = OperationSerializer(operation2)
         serializer3 = OperationSerializer(operation3)
 
-        self.assertEqual(len(res.data), 1)
-        self.assertIn(serializer2.data, res.data)
-        self.assertNotIn(serializer1.data, res.data)
-        self.assertNotIn(serializer3.data, res.data)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertIn(serializer2.data, res.data['results'])
+        self.assertNotIn(serializer1.data, res.data['results'])
+        self.assertNotIn(serializer3.data, res.data['results'])
 
     def test_filter_operation_by_year_month_day(self):
         """Test filtering operation by year and month"""
@@ -365,10 +473,214 @@ class OperationDateTests(TestCase):
         serializer2 = OperationSerializer(operation2)
         serializer3 = OperationSerializer(operation3)
 
-        self.assertEqual(len(res.data), 1)
-        self.assertIn(serializer2.data, res.data)
-        self.assertNotIn(serializer1.data, res.data)
-        self.assertNotIn(serializer3.data, res.data)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertIn(serializer2.data, res.data['results'])
+        self.assertNotIn(serializer1.data, res.data['results'])
+        self.assertNotIn(serializer3.data, res.data['results'])
+
+    def test_filter_operation_by_date_from_and_date_to(self):
+        """Test filtering operations by an inclusive date range"""
+        operations = [
+            sample_operation(user=self.user, date=date(2021, 3, day))
+            for day in (1, 2, 3, 4)
+        ]
+        res = self.client.get(
+            OPERATIONS_URL,
+            {'date_from': '2021-03-02', 'date_to': '2021-03-03'}
+        )
+
+        ids = {row['id'] for row in res.data['results']}
+        self.assertEqual(ids, {operations[1].id, operations[2].id})
+
+    def test_filter_operation_by_month_and_date_from(self):
+        """Test date_from narrows down a month"""
+        sample_operation(user=self.user, date=date(2021, 12, 1))
+        operation = sample_operation(user=self.user, date=date(2021, 12, 31))
+        sample_operation(user=self.user, date=date(2022, 1, 1))
+        res = self.client.get(
+            OPERATIONS_URL,
+            {'year': 2021, 'month': 12, 'date_from': '2021-12-15'}
+        )
+
+        ids = [row['id'] for row in res.data['results']]
+        self.assertEqual(ids, [operation.id])
+
+    def test_filter_operation_by_invalid_date(self):
+        """Test invalid dates are rejected"""
+        for params in ({'year': 2021, 'month': 13}, {'date_to': '2021-1'}):
+            res = self.client.get(OPERATIONS_URL, params)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_filter_operation_up_to_the_last_day(self):
+        """Test ranges reaching the last supported day are unbounded"""
+        operation = sample_operation(user=self.user, date=date(2021, 3, 1))
+
+        for params in (
+            {'date_to': '9999-12-31'},
+            {'year': 9999},
+            {'year': 9999, 'month': 12},
+            {'year': 9999, 'month': 12, 'day': 31},
+        ):
+            res = self.client.get(OPERATIONS_URL, params)
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK, params)
+        res = self.client.get(
+            OPERATIONS_URL,
+            {'date_from': '2021-03-01', 'date_to': '9999-12-31'}
+        )
+        self.assertIn(operation.id, [row['id'] for row in res.data['results']])
+
+
+class OperationQueryPlanTests(TestCase):
+    """Test the operation queries are served by indexes"""
+
+    full_scan = re.compile(r'(Seq Scan on|SCAN( TABLE)?) core_\w+')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'sample_user@gmail.com',
+            'testpass123'
+        )
+        self.client.force_authenticate(self.user)
+        self.account = sample_account(user=self.user)
+        self.tag = sample_tag(user=self.user)
+        sample_operation(
+            user=self.user, account=self.account
+        ).tags.add(self.tag)
+
+    def _assert_index_scans(self, url, params, table):
+        """Run a request and check its queries on table use an index"""
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(url, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        statements = [
+            query['sql'] for query in queries
+            if query['sql'].startswith('SELECT') and table in query['sql']
+        ]
+        self.assertTrue(statements)
+        for sql in statements:
+            plan = query_plan(sql)
+            self.assertIsNone(self.full_scan.search(plan), plan)
+
+    def test_list_uses_index(self):
+        """Test listing operations uses index scans"""
+        for params in (
+            {},
+            {'year': 2021, 'month': 2},
+            {'account': self.account.id, 'date_from': '2021-01-01'},
+            {'tags': self.tag.id},
+        ):
+            self._assert_index_scans(OPERATIONS_URL, params, 'core_operation')
+
+    def test_account_balance_uses_index(self):
+        """Test the account balance uses index scans"""
+        url = account_balance_url(self.account.id)
+        self._assert_index_scans(url, {}, 'core_accountbalance')
+        self._assert_index_scans(
+            url, {'year': 2021}, 'core_accountdailybalance'
+        )
+
+
+class OperationPaginationTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'sample_user@gmail.com',
+            'testpass123'
+        )
+        self.client.force_authenticate(self.user)
+        self.account = sample_account(user=self.user)
+        dates = [
+            date(2021, 1, 3), None, date(2021, 1, 1), date(2021, 1, 3),
+            date(2021, 1, 2), None, date(2021, 1, 1)
+        ]
+        self.operations = [
+            sample_operation(user=self.user, account=self.account, date=day)
+            for day in dates
+        ]
+
+    def _walk(self, url, params=None, direction='next'):
+        """Follow the pagination links and return the ids of every page"""
+        pages = []
+        res = self.client.get(url, params)
+        while True:
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            pages.append([row['id'] for row in res.data['results']])
+            if not res.data[direction]:
+                return pages, res
+            res = self.client.get(res.data[direction])
+
+    def test_pages_ordered_by_date_and_id(self):
+        """Test pages are newest first, undated operations at the top"""
+        pages, _ = self._walk(OPERATIONS_URL, {'page_size': 2})
+
+        expected = [
+            op.id for op in sorted(
+                self.operations,
+                key=lambda op: (op.date is None, op.date or date.min, op.id),
+                reverse=True
+            )
+        ]
+        self.assertEqual([len(page) for page in pages], [2, 2, 2, 1])
+        self.assertEqual(sum(pages, []), expected)
+
+    def test_previous_links(self):
+        """Test walking back from the last page returns the same pages"""
+        pages, last = self._walk(OPERATIONS_URL, {'page_size': 3})
+
+        back, _ = self._walk(
+            last.data['previous'], direction='previous'
+        )
+
+        self.assertEqual(back, list(reversed(pages[:-1])))
+
+    def test_pagination_with_filters(self):
+        """Test paginating keeps the query filters"""
+        other_account = sample_account(user=self.user, name='Other')
+        sample_operation(user=self.user, account=other_account)
+
+        pages, _ = self._walk(
+            OPERATIONS_URL,
+            {'page_size': 2, 'account': self.account.id, 'year': 2021}
+        )
+
+        ids = sum(pages, [])
+        self.assertEqual(len(ids), 5)
+        self.assertEqual(
+            set(ids),
+            {op.id for op in self.operations if op.date is not None}
+        )
+
+    def test_invalid_cursor(self):
+        """Test an invalid cursor returns not found"""
+        res = self.client.get(OPERATIONS_URL, {'cursor': 'invalid'})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_malformed_cursors(self):
+        """Test cursors holding unexpected values return not found"""
+        for payload in (
+            {},
+            [],
+            ['2021-01-01'],
+            ['2021-01-01', 1, 1, 1],
+            ['notadate', 1],
+            [5, 1],
+            ['2021-01-01', 'one'],
+            ['2021-01-01', None],
+            ['2021-01-01', [1]],
+        ):
+            cursor = b64encode(json.dumps(payload).encode()).decode()
+
+            res = self.client.get(OPERATIONS_URL, {'cursor': cursor})
+
+            self.assertEqual(
+                res.status_code, status.HTTP_404_NOT_FOUND, payload
+            )
 
 
 class AccountBalanceTests(TestCase):
@@ -400,6 +712,17 @@ class AccountBalanceTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data, expected_balance)
 
+    def test_account_balance_up_to_the_last_day(self):
+        """Test the balance up to the last supported day"""
+        sample_operation(user=self.user, account=self.account, value=10)
+
+        res = self.client.get(
+            account_balance_url(self.account.id), {'date_to': '9999-12-31'}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, Decimal('10.00'))
+
     def test_account_actual_balance_fail(self):
         """Test expecting http 400 bad request"""
         sample_operation(
@@ -553,3 +876,395 @@ class AccountBalanceTests(TestCase):
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data, operation1.value)
+
+    def test_balance_follows_updates_and_deletes(self):
+        """Test stored balances follow operation updates and deletes"""
+        account2 = sample_account(user=self.user, name='Another account')
+        operation = sample_operation(
+            user=self.user,
+            account=self.account,
+            value=10.00,
+            date=date(2021, 1, 1)
+        )
+        sample_operation(
+            user=self.user,
+            account=self.account,
+            value=5.00,
+            date=date(2021, 1, 1)
+        )
+
+        self.client.patch(
+            detail_url(operation.id),
+            {'value': '7.50', 'account': account2.id, 'date': '2021-01-02'}
+        )
+        res = self.client.get(account_balance_url(self.account.id))
+        self.assertEqual(res.data, Decimal('5.00'))
+        res = self.client.get(
+            account_balance_url(account2.id),
+            {'year': 2021, 'month': 1, 'day': 2}
+        )
+        self.assertEqual(res.data, Decimal('7.50'))
+
+        self.client.delete(detail_url(operation.id))
+        res = self.client.get(account_balance_url(account2.id))
+        self.assertEqual(res.data, Decimal('0.00'))
+        res = self.client.get(
+            account_balance_url(account2.id),
+            {'year': 2021}
+        )
+        self.assertEqual(res.data, Decimal('0.00'))
+
+
+class OperationExportTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'sample_user@gmail.com',
+            'testpass123'
+        )
+        self.client.force_authenticate(self.user)
+        self.account = sample_account(user=self.user)
+        self.tag1 = sample_tag(user=self.user, name='Food')
+        self.tag2 = sample_tag(user=self.user, name='Travel')
+        self.operation1 = sample_operation(
+            user=self.user,
+            account=self.account,
+            value=-12.50,
+            date=date(2021, 1, 2)
+        )
+        self.operation1.tags.add(self.tag1, self.tag2)
+        self.operation2 = sample_operation(
+            user=self.user,
+            account=self.account,
+            name='Salary, January',
+            value=1000,
+            date=date(2021, 1, 1)
+        )
+
+    def test_export_csv(self):
+        """Test exporting operations as CSV, oldest first"""
+        res = self.client.get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'text/csv')
+        content = b''.join(res.streaming_content).decode()
+        rows = list(csv.DictReader(content.splitlines()))
+        self.assertEqual(
+            [row['id'] for row in rows],
+            [str(self.operation2.id), str(self.operation1.id)]
+        )
+        self.assertEqual(rows[0]['name'], 'Salary, January')
+        self.assertEqual(rows[0]['value'], '1000.00')
+        self.assertEqual(rows[0]['tags'], '')
+        self.assertEqual(rows[1]['tags'], 'Food;Travel')
+        self.assertEqual(rows[1]['date'], '2021-01-02')
+
+    def test_export_ndjson_with_filters(self):
+        """Test exporting filtered operations as newline delimited JSON"""
+        sample_operation(user=self.user, account=self.account)
+
+        res = self.client.get(
+            EXPORT_URL,
+            {'output': 'ndjson', 'tags': self.tag1.id, 'year': 2021}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        lines = b''.join(res.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(json.loads(lines[0]), {
+            'id': self.operation1.id,
+            'date': '2021-01-02',
+            'name': self.operation1.name,
+            'description': '',
+            'value': '-12.50',
+            'account': self.account.id,
+            'tags': ['Food', 'Travel'],
+        })
+
+    def test_export_queries_per_chunk(self):
+        """Test tag names are read with one query per chunk"""
+        queryset = Operation.objects.filter(user=self.user)
+
+        with self.assertNumQueries(3):
+            rows = list(export_rows(queryset, chunk_size=1))
+
+        self.assertEqual(len(rows), 2)
+
+    def test_export_limited_to_user(self):
+        """Test exporting only returns operations of the user"""
+        user2 = get_user_model().objects.create_user(
+            'user2@gmail.com',
+            'testpass123'
+        )
+        sample_operation(user=user2)
+
+        res = self.client.get(EXPORT_URL, {'output': 'ndjson'})
+
+        lines = b''.join(res.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+
+    def test_export_invalid_output(self):
+        """Test exporting to an unknown format fails"""
+        res = self.client.get(EXPORT_URL, {'output': 'xml'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class OperationSearchTests(TestCase):
+    """Test searching operations by name and description"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'sample_user@gmail.com',
+            'testpass123'
+        )
+        self.client.force_authenticate(self.user)
+        self.account = sample_account(user=self.user)
+        self.coffee = sample_operation(
+            user=self.user,
+            account=self.account,
+            name='Starbucks Coffee',
+            date=date(2021, 1, 1)
+        )
+        self.breakfast = sample_operation(
+            user=self.user,
+            account=self.account,
+            name='Bakery',
+            description='Bread and coffee',
+            date=date(2021, 1, 2)
+        )
+        sample_operation(
+            user=self.user,
+            account=self.account,
+            name='Supermarket',
+            date=date(2021, 1, 3)
+        )
+
+    def search(self, text, **params):
+        res = self.client.get(OPERATIONS_URL, {'q': text, **params})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res
+
+    def test_search_name_and_description(self):
+        """Test the search matches names and descriptions"""
+        res = self.search('COFFEE')
+
+        self.assertEqual(
+            {row['id'] for row in res.data['results']},
+            {self.coffee.id, self.breakfast.id}
+        )
+
+    def test_search_every_word_by_prefix(self):
+        """Test every word must match the start of a word"""
+        res = self.search('starb coff')
+
+        self.assertEqual(
+            [row['id'] for row in res.data['results']], [self.coffee.id]
+        )
+
+    def test_search_limited_to_user(self):
+        """Test the search only returns operations of the user"""
+        user2 = get_user_model().objects.create_user(
+            'user2@gmail.com',
+            'testpass123'
+        )
+        sample_operation(user=user2, name='Coffee')
+
+        res = self.search('coffee')
+
+        self.assertEqual(len(res.data['results']), 2)
+
+    def test_search_without_words(self):
+        """Test a search without words matches nothing"""
+        res = self.search('&|!')
+
+        self.assertEqual(res.data['results'], [])
+
+    def test_search_pages(self):
+        """Test search results are paginated"""
+        first = self.search('coffee', page_size=1)
+        second = self.client.get(first.data['next'])
+
+        self.assertEqual(len(first.data['results']), 1)
+        self.assertEqual(
+            {row['id'] for row in first.data['results'] +
+             second.data['results']},
+            {self.coffee.id, self.breakfast.id}
+        )
+        self.assertIsNone(second.data['next'])
+
+    @skipUnless(connection.vendor == 'postgresql', 'needs PostgreSQL')
+    def test_search_ranked(self):
+        """Test name matches rank before description matches"""
+        res = self.search('coffee')
+
+        self.assertEqual(
+            [row['id'] for row in res.data['results']],
+            [self.coffee.id, self.breakfast.id]
+        )
+
+    @skipUnless(connection.vendor == 'postgresql', 'needs PostgreSQL')
+    def test_search_vector_follows_updates(self):
+        """Test the search vector is kept current on writes"""
+        self.coffee.name = 'Tea house'
+        self.coffee.save()
+
+        res = self.search('tea')
+
+        self.assertEqual(
+            [row['id'] for row in res.data['results']], [self.coffee.id]
+        )
+
+    @skipUnless(connection.vendor == 'postgresql', 'needs PostgreSQL')
+    def test_search_uses_index(self):
+        """Test the search is read from the GIN index"""
+        with CaptureQueriesContext(connection) as queries:
+            self.search('coffee')
+
+        sql = next(
+            query['sql'] for query in queries
+            if 'search_vector' in query['sql']
+        )
+        self.assertIn('core_operation_search_idx', query_plan(sql))
+
+
+class OperationSparseFieldsTests(TestCase):
+    """Test choosing the fields and expansions of operations"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'sample_user@gmail.com',
+            'testpass123'
+        )
+        self.client.force_authenticate(self.user)
+        self.account = sample_account(user=self.user)
+        self.tag = sample_tag(user=self.user, name='Food')
+        self.operation = sample_operation(
+            user=self.user, account=self.account, date=date(2021, 1, 1)
+        )
+        self.operation.tags.add(self.tag)
+
+    def test_list_selected_fields(self):
+        """Test only the selected fields are serialized and loaded"""
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(
+                OPERATIONS_URL, {'fields': 'id, date,value'}
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'], [{
+            'id': self.operation.id,
+            'date': '2021-01-01',
+            'value': '-5.00',
+        }])
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn('"name"', queries[-1]['sql'])
+        self.assertNotIn('"description"', queries[-1]['sql'])
+
+    def test_list_expanded_relations(self):
+        """Test listing operations with nested account and tags"""
+        with self.assertNumQueries(3):
+            res = self.client.get(
+                OPERATIONS_URL,
+                {'fields': 'id,account,tags', 'expand': 'account,tags'}
+            )
+
+        self.assertEqual(res.data['results'], [{
+            'id': self.operation.id,
+            'account': {
+                'id': self.account.id,
+                'name': self.account.name,
+                'active': True,
+                'acctype': None,
+            },
+            'tags': [
+                {'id': self.tag.id, 'name': 'Food', 'description': ''}
+            ],
+        }])
+
+    def test_detail_collapsed_relations(self):
+        """Test the detail can return ids instead of nested objects"""
+        with self.assertNumQueries(3):
+            res = self.client.get(
+                detail_url(self.operation.id), {'expand': 'tags'}
+            )
+
+        self.assertEqual(res.data['account'], self.account.id)
+        self.assertEqual(res.data['tags'][0]['name'], 'Food')
+
+    def test_unknown_fields(self):
+        """Test unknown fields and expansions are rejected"""
+        for params in ({'fields': 'id,user'}, {'expand': 'name'}):
+            res = self.client.get(OPERATIONS_URL, params)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_sparse_fields_ignored_on_write(self):
+        """Test writes always use the full serializer"""
+        payload = {
+            'name': 'Rent',
+            'value': '-10.00',
+            'date': '2021-01-02',
+            'account': self.account.id,
+            'tags': [self.tag.id],
+        }
+
+        res = self.client.post(
+            f'{OPERATIONS_URL}?fields=id&expand=account', payload
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['account'], self.account.id)
+        self.assertEqual(res.data['name'], 'Rent')
+
+
+class OperationFastListTests(TestCase):
+    """Test operation lists rendered from values() rows"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'sample_user@gmail.com',
+            'testpass123'
+        )
+        self.client.force_authenticate(self.user)
+        account = sample_account(user=self.user)
+        tags = [sample_tag(user=self.user, name=f'Tag {i}') for i in range(3)]
+        for value, day, description in (
+            (1, date(2021, 1, 1), ''),
+            (Decimal('-1234.5'), date(2021, 1, 2), 'Rent'),
+            (Decimal('0.10'), None, 'No date'),
+        ):
+            sample_operation(
+                user=self.user,
+                account=account,
+                value=value,
+                date=day,
+                description=description
+            ).tags.set(reversed(tags[:day.day if day else 0]))
+
+    def test_list_matches_serializer(self):
+        """Test the list is byte for byte what the serializer renders"""
+        res = self.client.get(OPERATIONS_URL, {'format': 'json'})
+
+        operations = Operation.objects.filter(user=self.user).order_by(
+            F('date').desc(nulls_first=True), '-id'
+        ).prefetch_related(
+            Prefetch('tags', queryset=Tag.objects.order_by('id'))
+        )
+        expected = JSONRenderer().render(OrderedDict([
+            ('next', None),
+            ('previous', None),
+            ('results', OperationSerializer(operations, many=True).data),
+        ]))
+        self.assertEqual(res.content, expected)
+
+    def test_list_queries(self):
+        """Test the list reads the page and its tags with two queries"""
+        with self.assertNumQueries(3):
+            self.client.get(OPERATIONS_URL)
+        with self.assertNumQueries(2):
+            self.client.get(OPERATIONS_URL, {'fields': 'id,value'})
@@ -0,0 +1,514 @@
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.urls import reverse
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Account, AccountBalance, Operation, Tag
+from core.versions import bump_version
+
+
+BULK_CREATE_URL = reverse('operation:operation-bulk-create')
+BULK_UPDATE_URL = reverse('operation:operation-bulk-update')
+BULK_DELETE_URL = reverse('operation:operation-bulk-delete')
+BULK_TAG_URL = reverse('operation:operation-bulk-tag')
+OPERATIONS_URL = reverse('operation:operation-list')
+
+
+def detail_url(operation_id):
+    """Return the operation detail URL"""
+    return reverse('operation:operation-detail', args=[operation_id])
+
+
+def sample_account(user, name='Sample Account'):
+    """Create and return a sample account"""
+    return Account.objects.create(user=user, name=name)
+
+
+def sample_tag(user, name='Sample tag'):
+    """Create and return a sample tag"""
+    return Tag.objects.create(user=user, name=name)
+
+
+def operation_payload(account, **params):
+    """Return the payload of an operation"""
+    defaults = {
+        'name': 'Supermarket',
+        'value': '-5.00',
+        'date': '2021-01-01',
+        'account': account.id,
+    }
+    defaults.update(params)
+
+    return defaults
+
+
+class BulkCreateOperationApiTests(TestCase):
+    """Test creating operations in bulk"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'sample_user@gmail.com',
+            'testpass123'
+        )
+        self.client.force_authenticate(self.user)
+        self.account = sample_account(user=self.user)
+        self.tag1 = sample_tag(user=self.user, name='Food')
+        self.tag2 = sample_tag(user=self.user, name='Home')
+
+    def test_bulk_create_operations(self):
+        """Test creating a list of operations with tags"""
+        payload = [
+            operation_payload(self.account, tags=[self.tag1.id]),
+            operation_payload(
+                self.account,
+                name='Rent',
+                value='-700.00',
+                date='2021-01-05',
+                tags=[self.tag1.id, self.tag2.id]
+            ),
+            operation_payload(self.account, name='Salary', value='2500.00'),
+        ]
+
+        res = self.client.post(BULK_CREATE_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['errors'], [])
+        self.assertEqual([row['index'] for row in res.data['created']],
+                         [0, 1, 2])
+        rent = Operation.objects.get(id=res.data['created'][1]['id'])
+        self.assertEqual(rent.name, 'Rent')
+        self.assertEqual(rent.date, date(2021, 1, 5))
+        self.assertEqual(set(rent.tags.all()), {self.tag1, self.tag2})
+        balance = AccountBalance.objects.get(account=self.account)
+        self.assertEqual(balance.balance, Decimal('1795.00'))
+
+    def test_bulk_create_skips_duplicates(self):
+        """Test sending the same operations again creates nothing"""
+        payload = [
+            operation_payload(self.account, tags=[self.tag1.id]),
+            operation_payload(self.account, tags=[self.tag1.id]),
+            operation_payload(self.account, name='Salary', value='2500.00'),
+        ]
+        first = self.client.post(BULK_CREATE_URL, payload, format='json')
+        payload.append(operation_payload(self.account, name=' supermarket'))
+
+        res = self.client.post(BULK_CREATE_URL, payload, format='json')
+
+        self.assertEqual(len(first.data['created']), 3)
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['skipped'], [0, 1, 2])
+        self.assertEqual([row['index'] for row in res.data['created']], [3])
+        self.assertEqual(Operation.objects.count(), 4)
+        self.assertEqual(Operation.tags.through.objects.count(), 2)
+        balance = AccountBalance.objects.get(account=self.account)
+        self.assertEqual(balance.balance, Decimal('2485.00'))
+
+        res = self.client.post(BULK_CREATE_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['created'], [])
+
+    def test_bulk_create_reports_errors_per_item(self):
+        """Test invalid items are reported and valid ones created"""
+        user2 = get_user_model().objects.create_user(
+            'user2@gmail.com',
+            'testpass123'
+        )
+        payload = [
+            operation_payload(self.account),
+            operation_payload(self.account, value='not a number'),
+            operation_payload(sample_account(user=user2)),
+            operation_payload(self.account, tags=[sample_tag(user2).id]),
+        ]
+
+        res = self.client.post(BULK_CREATE_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(len(res.data['created']), 1)
+        self.assertEqual(
+            [(error['index'], list(error['errors'])) for error in
+             res.data['errors']],
+            [(1, ['value']), (2, ['account']), (3, ['tags'])]
+        )
+        self.assertEqual(Operation.objects.count(), 1)
+
+    def test_bulk_create_all_or_nothing(self):
+        """Test nothing is created when all_or_nothing is set"""
+        payload = {
+            'all_or_nothing': True,
+            'operations': [
+                operation_payload(self.account),
+                operation_payload(self.account, value=None),
+            ],
+        }
+
+        res = self.client.post(BULK_CREATE_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data['created'], [])
+        self.assertEqual(res.data['errors'][0]['index'], 1)
+        self.assertFalse(Operation.objects.exists())
+
+    def test_bulk_create_validates_references_once(self):
+        """Test accounts and tags of all items are checked in one query"""
+        payload = [
+            operation_payload(self.account, tags=[self.tag1.id, self.tag2.id])
+            for _ in range(20)
+        ]
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.post(BULK_CREATE_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        lookups = [
+            query['sql'] for query in queries
+            if query['sql'].startswith('SELECT')
+            and ('"core_account"' in query['sql']
+                 or '"core_tag"' in query['sql'])
+        ]
+        self.assertEqual(len(lookups), 1)
+        self.assertEqual(
+            Operation.tags.through.objects.count(), 40
+        )
+
+    def test_bulk_create_invalid_payload(self):
+        """Test a payload that is not a list is rejected"""
+        res = self.client.post(
+            BULK_CREATE_URL,
+            operation_payload(self.account),
+            format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BulkChangeOperationApiTests(TestCase):
+    """Test updating, deleting and tagging operations in bulk"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'sample_user@gmail.com',
+            'testpass123'
+        )
+        self.client.force_authenticate(self.user)
+        self.account = sample_account(user=self.user)
+        self.tag = sample_tag(user=self.user)
+        self.january = [
+            Operation.objects.create(
+                user=self.user,
+                account=self.account,
+                name=f'January {day}',
+                value=-10,
+                date=date(2021, 1, day)
+            )
+            for day in (1, 2, 3)
+        ]
+        self.february = Operation.objects.create(
+            user=self.user,
+            account=self.account,
+            name='February',
+            value=-20,
+            date=date(2021, 2, 1)
+        )
+        self.january[0].tags.add(self.tag)
+
+    def _balance(self, account):
+        """Return the stored balance of an account"""
+        return AccountBalance.objects.get(account=account).balance
+
+    def test_bulk_update_by_filter(self):
+        """Test updating the operations matching the query filters"""
+        other_account = sample_account(user=self.user, name='Card')
+        url = f'{BULK_UPDATE_URL}?year=2021&month=1'
+
+        res = self.client.post(
+            url,
+            {'set': {'account': other_account.id, 'value': '-12.00'}},
+            format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {'updated': 3})
+        self.assertEqual(
+            Operation.objects.filter(account=other_account).count(), 3
+        )
+        self.assertEqual(self._balance(self.account), Decimal('-20.00'))
+        self.assertEqual(self._balance(other_account), Decimal('-36.00'))
+
+    def test_bulk_update_by_ids(self):
+        """Test updating a list of operations"""
+        ids = [self.january[0].id, self.february.id]
+
+        res = self.client.post(
+            BULK_UPDATE_URL,
+            {'ids': ids, 'set': {'name': 'Renamed', 'date': '2021-03-01'}},
+            format='json'
+        )
+
+        self.assertEqual(res.data, {'updated': 2})
+        self.assertEqual(
+            set(Operation.objects.filter(name='Renamed').values_list(
+                'id', flat=True
+            )),
+            set(ids)
+        )
+        self.assertEqual(self._balance(self.account), Decimal('-50.00'))
+        call_command('rebuild_balances', verify=True, stdout=StringIO())
+
+    def test_bulk_update_rejects_other_users_account(self):
+        """Test operations cannot be moved to an account of another user"""
+        user2 = get_user_model().objects.create_user(
+            'user2@gmail.com',
+            'testpass123'
+        )
+
+        res = self.client.post(
+            BULK_UPDATE_URL,
+            {
+                'ids': [self.february.id],
+                'set': {'account': sample_account(user=user2).id}
+            },
+            format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_requires_a_selection(self):
+        """Test bulk changes need ids or filters"""
+        res = self.client.post(BULK_DELETE_URL, {}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Operation.objects.count(), 4)
+
+    def test_bulk_delete(self):
+        """Test deleting the operations matching the query filters"""
+        bump_version(self.user.pk)
+
+        with self.assertNumQueries(9):
+            res = self.client.post(
+                f'{BULK_DELETE_URL}?tags={self.tag.id}', {}, format='json'
+            )
+
+        self.assertEqual(res.data, {'deleted': 1})
+        self.assertFalse(
+            Operation.objects.filter(id=self.january[0].id).exists()
+        )
+        self.assertFalse(Operation.tags.through.objects.exists())
+        self.assertEqual(self._balance(self.account), Decimal('-40.00'))
+
+    def test_bulk_delete_limited_to_user(self):
+        """Test bulk deletes only reach operations of the user"""
+        user2 = get_user_model().objects.create_user(
+            'user2@gmail.com',
+            'testpass123'
+        )
+        operation = Operation.objects.create(
+            user=user2,
+            account=sample_account(user=user2),
+            name='Other',
+            value=1
+        )
+
+        res = self.client.post(
+            BULK_DELETE_URL, {'ids': [operation.id]}, format='json'
+        )
+
+        self.assertEqual(res.data, {'deleted': 0})
+        self.assertTrue(Operation.objects.filter(id=operation.id).exists())
+
+    def _locked(self, url, payload):
+        """Return whether the request read the operations FOR UPDATE"""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(url, payload, format='json')
+        return any(
+            'FOR UPDATE' in query['sql'] and 'core_operation' in query['sql']
+            for query in queries
+        )
+
+    @skipUnless(connection.features.has_select_for_update,
+                'The database cannot lock rows')
+    def test_bulk_update_locks_the_operations(self):
+        """Test bulk updates lock the operations before reading them"""
+        self.assertTrue(self._locked(
+            BULK_UPDATE_URL,
+            {'ids': [self.february.id], 'set': {'value': '-25.00'}}
+        ))
+
+    @skipUnless(connection.features.has_select_for_update,
+                'The database cannot lock rows')
+    def test_bulk_delete_locks_the_operations(self):
+        """Test bulk deletes lock the operations before reading them"""
+        self.assertTrue(self._locked(
+            BULK_DELETE_URL, {'ids': [self.february.id]}
+        ))
+
+    def test_bulk_tag(self):
+        """Test adding and removing tags of many operations"""
+        new_tag = sample_tag(user=self.user, name='New tag')
+
+        res = self.client.post(
+            f'{BULK_TAG_URL}?year=2021&month=1',
+            {'add': [new_tag.id, self.tag.id], 'remove': []},
+            format='json'
+        )
+
+        self.assertEqual(res.data, {'added': 5, 'removed': 0})
+        self.assertEqual(new_tag.operation_set.count(), 3)
+
+        res = self.client.post(
+            BULK_TAG_URL,
+            {'ids': [op.id for op in self.january], 'remove': [self.tag.id]},
+            format='json'
+        )
+
+        self.assertEqual(res.data, {'added': 0, 'removed': 3})
+        self.assertFalse(self.tag.operation_set.exists())
+
+    def test_bulk_tag_rejects_other_users_tags(self):
+        """Test tags of another user cannot be added"""
+        user2 = get_user_model().objects.create_user(
+            'user2@gmail.com',
+            'testpass123'
+        )
+
+        res = self.client.post(
+            BULK_TAG_URL,
+            {'ids': [self.february.id], 'add': [sample_tag(user=user2).id]},
+            format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(self.february.tags.exists())
+
+
+class FingerprintWritePathTests(TestCase):
+    """Test every write keeps the fingerprints of operations current"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'sample_user@gmail.com',
+            'testpass123'
+        )
+        self.client.force_authenticate(self.user)
+        self.account = sample_account(user=self.user)
+
+    def _create(self, **params):
+        """Create an operation through the API and return its id"""
+        res = self.client.post(
+            OPERATIONS_URL,
+            operation_payload(self.account, tags=[], **params),
+            format='json'
+        )
+        return res.data['id']
+
+    def _bulk_create(self, *payloads):
+        """Bulk create operations, returning the created and skipped"""
+        res = self.client.post(BULK_CREATE_URL, list(payloads), format='json')
+        return len(res.data['created']), res.data['skipped']
+
+    def test_created_operations_block_bulk_duplicates(self):
+        """Test a bulk create skips operations created one at a time"""
+        self._create()
+        self._create()
+
+        created, skipped = self._bulk_create(
+            operation_payload(self.account),
+            operation_payload(self.account),
+            operation_payload(self.account),
+        )
+
+        self.assertEqual((created, skipped), (1, [0, 1]))
+        self.assertEqual(
+            sorted(Operation.objects.values_list(
+                'fingerprint_seq', flat=True
+            )),
+            [0, 1, 2]
+        )
+
+    def test_bulk_created_operations_then_single(self):
+        """Test a single create goes after the bulk created ordinals"""
+        self._bulk_create(operation_payload(self.account))
+
+        self._create()
+
+        self.assertEqual(
+            sorted(Operation.objects.values_list(
+                'fingerprint_seq', flat=True
+            )),
+            [0, 1]
+        )
+
+    def test_updated_operations_are_fingerprinted_again(self):
+        """Test an update moves the operation to its new fingerprint"""
+        operation_id = self._create()
+
+        self.client.patch(
+            detail_url(operation_id), {'value': '-7.00'}, format='json'
+        )
+
+        self.assertEqual(
+            self._bulk_create(operation_payload(self.account, value='-7.00')),
+            (0, [0])
+        )
+        self.assertEqual(
+            self._bulk_create(operation_payload(self.account)), (1, [])
+        )
+
+    def test_description_changes_keep_the_fingerprint(self):
+        """Test changing unfingerprinted fields keeps the ordinal"""
+        self._create()
+        operation_id = self._create()
+        operation = Operation.objects.get(pk=operation_id)
+
+        self.client.patch(
+            detail_url(operation_id), {'description': 'Weekly'},
+            format='json'
+        )
+
+        operation.refresh_from_db()
+        self.assertEqual(operation.fingerprint_seq, 1)
+
+    def test_bulk_updated_operations_are_fingerprinted_again(self):
+        """Test a bulk update moves the operations to new fingerprints"""
+        self._create(date='2021-02-01')
+        ids = [self._create(), self._create()]
+
+        res = self.client.post(
+            BULK_UPDATE_URL,
+            {'ids': ids, 'set': {'date': '2021-02-01'}},
+            format='json'
+        )
+
+        self.assertEqual(res.data, {'updated': 2})
+        self.assertEqual(
+            sorted(Operation.objects.values_list(
+                'fingerprint_seq', flat=True
+            )),
+            [0, 1, 2]
+        )
+        self.assertEqual(
+            len(set(Operation.objects.values_list('fingerprint', flat=True))),
+            1
+        )
+        self.assertEqual(
+            self._bulk_create(
+                *[operation_payload(self.account, date='2021-02-01')] * 3
+            ),
+            (0, [0, 1, 2])
+        )
+        self.assertEqual(
+            self._bulk_create(operation_payload(self.account)), (1, [])
+        )
@@ -88,3 +88,13 @@ class PrivateTagApiTests(TestCase):
         res = self.client.post(TAG_URL, payload)
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_tag_queries_constant(self):
+        """Test listing and viewing tags use constant queries"""
+        for i in range(5):
+            tag = sample_tag(user=self.user, name=f'Tag {i}')
+
+        with self.assertNumQueries(2):
+            self.client.get(TAG_URL)
+        with self.assertNumQueries(2):
+            self.client.get(reverse('operation:tag-detail', args=[tag.id]))
@@ -1,24 +1,43 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum
+from django.http import StreamingHttpResponse
+
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework import status, viewsets
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 
-from core.models import Account, AccountType, Tag, Operation
+from core.archive import archived_balance
+from core.metrics import timed_serialization
+from core.models import (Account, AccountBalance, AccountDailyBalance,
+                         AccountType, Tag, Operation)
 
-from operation import serializers
+from operation import bulk, rows, serializers
+from operation.caching import ResponseCacheMixin
+from operation.conditional import DataVersionMixin
+from operation.export import EXPORT_FORMATS, export_rows
+from operation.filters import date_range_lookups
+from operation.idempotency import IdempotentCreateMixin
+from operation.pagination import KeysetPagination
+from operation.search import ranks_search, search_operations
+from operation.sparse import SparseFieldsMixin
 
 
-class AccountTypeViewSet(viewsets.ModelViewSet):
+class AccountTypeViewSet(ResponseCacheMixin, DataVersionMixin,
+                         SparseFieldsMixin, viewsets.ModelViewSet):
     """Manage account types in the database"""
     queryset = AccountType.objects.all()
     serializer_class = serializers.AccountTypeSerializer
-    authentication_classes = (TokenAuthentication,)
     permission_classes = (IsAuthenticated,)
 
     def get_queryset(self):
         """Return objects for the current authenticated user only"""
         queryset = self.queryset
+        if self.action in ('list', 'retrieve'):
+            queryset = self.narrow_queryset(queryset)
 
         return queryset.filter(
             user=self.request.user
@@ -29,11 +48,12 @@ class AccountTypeViewSet(viewsets.ModelViewSet):
         serializer.save(user=self.request.user)
 
 
-class AccountViewSet(viewsets.ModelViewSet):
+class AccountViewSet(ResponseCacheMixin, DataVersionMixin,
+                     IdempotentCreateMixin, SparseFieldsMixin,
+                     viewsets.ModelViewSet):
     """Manage account in the database"""
     queryset = Account.objects.all()
     serializer_class = serializers.AccountSerializer
-    authentication_classes = (TokenAuthentication,)
     permission_classes = (IsAuthenticated,)
 
     def _params_to_ints(self, qs):
@@ -43,6 +63,8 @@ class AccountViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         """Retrieve the accounts for the authenticated user"""
         queryset = self.queryset
+        if self.action in ('list', 'retrieve'):
+            queryset = self.narrow_queryset(queryset)
 
         return queryset.filter(
             user=self.request.user
@@ -60,16 +82,19 @@ class AccountViewSet(viewsets.ModelViewSet):
         serializer.save(user=self.request.user)
 
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(ResponseCacheMixin, DataVersionMixin,
+                 IdempotentCreateMixin, SparseFieldsMixin,
+                 viewsets.ModelViewSet):
     """Manage tag in the database"""
     queryset = Tag.objects.all()
     serializer_class = serializers.TagSerializer
-    authentication_classes = (TokenAuthentication,)
     permission_classes = (IsAuthenticated,)
 
     def get_queryset(self):
         """Return objects for the current authenticated user only"""
         queryset = self.queryset
+        if self.action in ('list', 'retrieve'):
+            queryset = self.narrow_queryset(queryset)
 
         return queryset.filter(
             user=self.request.user
@@ -80,12 +105,28 @@ class TagViewSet(viewsets.ModelViewSet):
         serializer.save(user=self.request.user)
 
 
-class OperationViewSet(viewsets.ModelViewSet):
+class OperationViewSet(ResponseCacheMixin, DataVersionMixin,
+                       IdempotentCreateMixin, SparseFieldsMixin,
+                       viewsets.ModelViewSet):
     """Manage operation in the database"""
     queryset = Operation.objects.all()
     serializer_class = serializers.OperationSerializer
-    authentication_classes = (TokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    pagination_class = KeysetPagination
+    cached_actions = ('list', 'account_balance')
+    filter_params = (
+        'tags', 'account', 'year', 'month', 'day', 'date_from', 'date_to',
+        'q'
+    )
+
+    @property
+    def keyset_ordering(self):
+        """Page ranked search results by relevance, best first"""
+        if self.request.query_params.get('q') and ranks_search(
+            self.queryset.db
+        ):
+            return ('search_rank', 'id')
+        return None
 
     def _params_to_ints(self, qs):
         """Convert a list of string IDs to a list of integers"""
@@ -95,25 +136,73 @@ class OperationViewSet(viewsets.ModelViewSet):
         """Retrieve the operations for the authenticated user"""
         tags = self.request.query_params.get('tags')
         account = self.request.query_params.get('account')
-        year = self.request.query_params.get('year')
-        month = self.request.query_params.get('month')
-        day = self.request.query_params.get('day')
 
-        queryset = self.queryset
+        queryset = self.queryset.defer('search_vector')
         if tags:
             tag_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
+            queryset = queryset.filter(
+                id__in=Operation.tags.through.objects.filter(
+                    tag_id__in=tag_ids
+                ).values('operation_id')
+            )
         if account:
             account_id = self._params_to_ints(account)
             queryset = queryset.filter(account__id__in=account_id)
-        if year:
-            queryset = queryset.filter(date__year=year)
-            if month:
-                queryset = queryset.filter(date__month=month)
-                if day:
-                    queryset = queryset.filter(date__day=day)
+        queryset = queryset.filter(
+            **date_range_lookups(self.request.query_params)
+        )
+        text = self.request.query_params.get('q')
+        if text:
+            queryset = search_operations(queryset, text)
+        if self.action in ('list', 'retrieve'):
+            # The date is the keyset pagination position
+            queryset = self.narrow_queryset(queryset, 'date')
         return queryset.filter(user=self.request.user)
 
+    def list(self, request, *args, **kwargs):
+        """
+        List operations, rendered from values() rows when possible
+
+        Unless relations are expanded, the page is read as dicts and rendered
+        without model instances, with the same output as the serializer.
+        """
+        serializer = self.get_serializer()
+        if not rows.renders_rows(serializer):
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(rows.operation_values(
+            queryset,
+            serializer,
+            extra=self.keyset_ordering or ('date',)
+        ))
+
+        return self.get_paginated_response(timed_serialization(
+            rows.render_operations, page, serializer, queryset.db
+        ))
+
+    def get_bulk_queryset(self, ids):
+        """Return the operations selected by ids or the query filters"""
+        queryset = self.get_queryset()
+        if ids is not None:
+            queryset = queryset.filter(id__in=ids)
+        elif not any(
+            self.request.query_params.get(param)
+            for param in self.filter_params
+        ):
+            raise ValidationError(
+                {'ids': 'Provide a list of ids or filter the operations.'}
+            )
+
+        return Operation.objects.filter(pk__in=queryset.values('pk'))
+
+    def get_bulk_data(self, serializer_class):
+        """Validate the body of a bulk request"""
+        serializer = serializer_class(data=self.request.data)
+        serializer.is_valid(raise_exception=True)
+
+        return serializer.validated_data
+
     def get_serializer_class(self):
         """Return appropriate serializer class"""
         if self.action == 'retrieve':
@@ -128,24 +217,159 @@ class OperationViewSet(viewsets.ModelViewSet):
     @action(methods=['GET'], detail=True, url_path='account-balance')
     def account_balance(self, request, pk=None):
         """Return the account balance"""
-        queryset = self.queryset
         try:
             account = Account.objects.get(pk=pk)
         except Account.DoesNotExist:
             return Response(
                 status=status.HTTP_400_BAD_REQUEST
             )
-        year = self.request.query_params.get('year')
-        month = self.request.query_params.get('month')
-        day = self.request.query_params.get('day')
-        if year:
-            queryset = queryset.filter(date__year=year)
-            if month:
-                queryset = queryset.filter(date__month=month)
-                if day:
-                    queryset = queryset.filter(date__day=day)
-
-        queryset = queryset.filter(account=account, user=self.request.user)
-        value_list = []
-        [value_list.append(op.value) for op in queryset]
-        return Response(data=sum(value_list), status=status.HTTP_200_OK)
+        date_lookups = date_range_lookups(self.request.query_params)
+        if date_lookups:
+            # Archived operations left the daily balances for the summaries
+            balance = AccountDailyBalance.objects.filter(
+                account=account, user=self.request.user, **date_lookups
+            ).aggregate(balance=Sum('balance'))['balance'] or Decimal('0.00')
+            balance += archived_balance(
+                self.request.user.pk,
+                account.pk,
+                date_lookups.get('date__gte'),
+                date_lookups.get('date__lt')
+            )
+        else:
+            balance = AccountBalance.objects.filter(
+                account=account, user=self.request.user
+            ).values_list('balance', flat=True).first()
+
+        if balance is None:
+            balance = Decimal('0.00')
+        return Response(data=balance, status=status.HTTP_200_OK)
+
+    @action(methods=['GET'], detail=False)
+    def export(self, request):
+        """Stream the filtered operations as CSV or newline delimited JSON"""
+        output = request.query_params.get('output', 'csv')
+        if output not in EXPORT_FORMATS:
+            return Response(
+                data={'output': f'Choose one of {", ".join(EXPORT_FORMATS)}.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        content_type, render = EXPORT_FORMATS[output]
+        # The body is streamed once the routing of the request is reset,
+        # so the queryset is bound to the shard of the user now
+        queryset = self.get_queryset()
+        queryset = queryset.using(queryset.db)
+        response = StreamingHttpResponse(
+            render(export_rows(queryset)),
+            content_type=content_type
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="operations.{output}"'
+        )
+        return response
+
+    @action(methods=['POST'], detail=False, url_path='bulk')
+    def bulk_create(self, request):
+        """
+        Create many operations in a single request
+
+        Accepts a list of operations, or an object with the list under
+        "operations" and "all_or_nothing": true to reject the whole batch
+        when any operation is invalid.
+        """
+        items, all_or_nothing = request.data, False
+        if isinstance(items, dict):
+            all_or_nothing = bool(items.get('all_or_nothing', False))
+            items = items.get('operations')
+        if not isinstance(items, list):
+            return Response(
+                data={'operations': 'Expected a list of operations.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(items) > bulk.MAX_BULK_ITEMS:
+            return Response(
+                data={'operations': (
+                    f'At most {bulk.MAX_BULK_ITEMS} operations per request.'
+                )},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        created, skipped, errors = bulk.create_operations(
+            request.user, items, all_or_nothing
+        )
+        if not errors:
+            response_status = (
+                status.HTTP_201_CREATED if created else status.HTTP_200_OK
+            )
+        elif created:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response(
+            data={
+                'created': [
+                    {'index': index, 'id': operation.pk}
+                    for index, operation in created
+                ],
+                'skipped': skipped,
+                'errors': errors,
+            },
+            status=response_status
+        )
+
+    @action(methods=['POST'], detail=False, url_path='bulk-update')
+    def bulk_update(self, request):
+        """Apply the same changes to many operations at once"""
+        data = self.get_bulk_data(serializers.OperationBulkSelectionSerializer)
+        changes = serializers.OperationBulkUpdateSerializer(
+            data=request.data.get('set'),
+            partial=True
+        )
+        changes.is_valid(raise_exception=True)
+        changes = changes.validated_data
+        if not changes:
+            raise ValidationError({'set': 'No changes were given.'})
+        if 'account' in changes and not Account.objects.filter(
+            user=request.user, id=changes['account']
+        ).exists():
+            raise ValidationError({'account': (
+                f'Invalid pk "{changes["account"]}" - object does not exist.'
+            )})
+
+        updated = bulk.update_operations(
+            self.get_bulk_queryset(data.get('ids')), changes
+        )
+        return Response(data={'updated': updated}, status=status.HTTP_200_OK)
+
+    @action(methods=['POST'], detail=False, url_path='bulk-delete')
+    def bulk_delete(self, request):
+        """Delete many operations at once"""
+        data = self.get_bulk_data(serializers.OperationBulkSelectionSerializer)
+
+        deleted = bulk.delete_operations(
+            self.get_bulk_queryset(data.get('ids'))
+        )
+        return Response(data={'deleted': deleted}, status=status.HTTP_200_OK)
+
+    @action(methods=['POST'], detail=False, url_path='bulk-tag')
+    def bulk_tag(self, request):
+        """Add tags to and remove tags from many operations at once"""
+        data = self.get_bulk_data(serializers.OperationBulkTagSerializer)
+        tag_ids = set(data['add']) | set(data['remove'])
+        owned = set(Tag.objects.filter(
+            user=request.user, id__in=tag_ids
+        ).values_list('id', flat=True))
+        if tag_ids - owned:
+            raise ValidationError({'tags': [
+                f'Invalid pk "{tag_id}" - object does not exist.'
+                for tag_id in sorted(tag_ids - owned)
+            ]})
+
+        queryset = self.get_bulk_queryset(data.get('ids'))
+        with transaction.atomic(using=queryset.db):
+            added = bulk.add_tags(queryset, data['add'])
+            removed = bulk.remove_tags(queryset, data['remove'])
+        return Response(
+            data={'added': added, 'removed': removed},
+            status=status.HTTP_200_OK
+        )
@@ -0,0 +1,93 @@
+import io
+import time
+
+from django.db import router, transaction
+
+from core.fingerprints import FingerprintSequence
+from core.models import Operation
+
+from operation.bulk import insert_operations
+from operation.export import chunked
+
+
+DEFAULT_BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 100
+
+
+class ImportReport:
+    """Outcome of a statement import"""
+
+    def __init__(self):
+        self.created = 0
+        self.skipped = 0
+        self.failed = 0
+        self.errors = []
+        self.started = time.monotonic()
+        self.elapsed = 0.0
+
+    @property
+    def rows(self):
+        return self.created + self.skipped + self.failed
+
+    @property
+    def rows_per_second(self):
+        if not self.elapsed:
+            return 0.0
+        return self.rows / self.elapsed
+
+    def add_error(self, line, message):
+        """Count a rejected line, keeping the first errors for the report"""
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'error': message})
+
+    def as_dict(self):
+        return {
+            'created': self.created,
+            'skipped': self.skipped,
+            'failed': self.failed,
+            'errors': self.errors,
+            'seconds': round(self.elapsed, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+        }
+
+
+def text_stream(binary, encoding='utf-8-sig'):
+    """Wrap a binary file so it is read as text, line by line"""
+    return io.TextIOWrapper(
+        binary, encoding=encoding, errors='replace', newline=''
+    )
+
+
+def import_statement(user, account, lines, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Create the operations of a parsed statement in an account
+
+    lines is the generator of a statement parser, consumed batch by batch so
+    only one batch is held in memory. Each batch is inserted in its own
+    transaction with a bulk insert and a single balance update. Lines that
+    were already imported, going by their fingerprint, are skipped.
+    """
+    report = ImportReport()
+    using = router.db_for_write(Operation, instance=user)
+    fingerprints = FingerprintSequence()
+
+    for batch in chunked(lines, batch_size):
+        rows = []
+        for line, fields, error in batch:
+            if error is None:
+                fields['account'] = account.pk
+                rows.append(fields)
+            else:
+                report.add_error(line, error)
+        if rows:
+            with transaction.atomic(using=using):
+                operations = insert_operations(
+                    user, rows, using, fingerprints=fingerprints
+                )
+            created = sum(operation.pk is not None for operation in operations)
+            report.created += created
+            report.skipped += len(operations) - created
+
+    report.elapsed = time.monotonic() - report.started
+    return report
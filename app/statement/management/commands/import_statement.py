@@ -0,0 +1,92 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Account
+
+from statement.importer import (DEFAULT_BATCH_SIZE, import_statement,
+                                text_stream)
+from statement.parsers import (CSVStatementParser, OFXStatementParser,
+                               StatementLineError)
+
+
+class Command(BaseCommand):
+    """Django command to import a bank statement file into an account"""
+    help = 'Import the operations of a CSV or OFX bank statement'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Statement file to import')
+        parser.add_argument(
+            '--account',
+            type=int,
+            required=True,
+            help='Id of the account receiving the operations'
+        )
+        parser.add_argument(
+            '--format',
+            dest='file_format',
+            choices=('csv', 'ofx'),
+            help='Format of the file, guessed from its extension by default'
+        )
+        parser.add_argument('--batch-size', type=int,
+                            default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--encoding', default='utf-8-sig')
+        parser.add_argument('--delimiter', default=',')
+        parser.add_argument('--date-format', default='%Y-%m-%d')
+        parser.add_argument('--decimal-separator', default='.',
+                            choices=('.', ','))
+        parser.add_argument('--date-column', default='date')
+        parser.add_argument('--name-column', default='name')
+        parser.add_argument('--value-column', default='value')
+        parser.add_argument('--description-column', default='description')
+
+    def _account(self, pk):
+        """Return the account with the given id, from whichever shard"""
+        for database in settings.SHARD_DATABASES:
+            account = Account.objects.using(database).filter(pk=pk).first()
+            if account is not None:
+                account.user = get_user_model().objects.get(
+                    pk=account.user_id
+                )
+                return account
+        raise CommandError(f'Account {pk} not found')
+
+    def handle(self, *args, **options):
+        account = self._account(options['account'])
+
+        file_format = options['file_format'] or (
+            options['path'].rsplit('.', 1)[-1].lower()
+        )
+        if file_format == 'csv':
+            parser = CSVStatementParser(
+                date_column=options['date_column'],
+                name_column=options['name_column'],
+                value_column=options['value_column'],
+                description_column=options['description_column'],
+                delimiter=options['delimiter'],
+                date_format=options['date_format'],
+                decimal_separator=options['decimal_separator'],
+            )
+        elif file_format == 'ofx':
+            parser = OFXStatementParser()
+        else:
+            raise CommandError('Unable to guess the format, use --format')
+
+        try:
+            with open(options['path'], 'rb') as binary:
+                report = import_statement(
+                    account.user,
+                    account,
+                    parser.parse(text_stream(binary, options['encoding'])),
+                    batch_size=options['batch_size']
+                )
+        except (OSError, LookupError, StatementLineError) as error:
+            raise CommandError(str(error))
+
+        for error in report.errors:
+            self.stderr.write(f'Line {error["line"]}: {error["error"]}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {report.created} operations, {report.skipped} '
+            f'already imported, {report.failed} failed, '
+            f'in {report.elapsed:.2f}s ({report.rows_per_second:.0f} rows/s)'
+        ))
@@ -0,0 +1,197 @@
+import csv
+import re
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from core.models import Operation
+
+
+_VALUE_FIELD = Operation._meta.get_field('value')
+_MAX_VALUE = Decimal(10) ** (
+    _VALUE_FIELD.max_digits - _VALUE_FIELD.decimal_places
+)
+_CENTS = Decimal(10) ** -_VALUE_FIELD.decimal_places
+_MAX_NAME = Operation._meta.get_field('name').max_length
+_MAX_DESCRIPTION = Operation._meta.get_field('description').max_length
+
+
+class StatementLineError(ValueError):
+    """A statement line that cannot become an operation"""
+
+
+def clean_line(date_value, name, description, value):
+    """Return the operation fields of a statement line, or raise"""
+    name = (name or '').strip()
+    description = (description or '').strip()
+    if not name:
+        raise StatementLineError('The name is empty.')
+    if len(name) > _MAX_NAME:
+        raise StatementLineError(f'The name is over {_MAX_NAME} characters.')
+    if len(description) > _MAX_DESCRIPTION:
+        raise StatementLineError(
+            f'The description is over {_MAX_DESCRIPTION} characters.'
+        )
+    if not value.is_finite():
+        raise StatementLineError(f'Invalid value "{value}".')
+    # Check the rounded value, as rounding may carry up to _MAX_VALUE
+    try:
+        rounded = value.quantize(_CENTS)
+    except InvalidOperation:
+        rounded = None
+    if rounded is None or abs(rounded) >= _MAX_VALUE:
+        raise StatementLineError(f'The value {value} is too large.')
+
+    return {
+        'date': date_value,
+        'name': name,
+        'description': description,
+        'value': rounded,
+    }
+
+
+class CSVStatementParser:
+    """
+    Parse bank statements exported as CSV
+
+    Every line is mapped to operation fields through the named columns, and
+    the description column is optional.
+    """
+
+    def __init__(self, date_column='date', name_column='name',
+                 value_column='value', description_column='description',
+                 delimiter=',', date_format='%Y-%m-%d',
+                 decimal_separator='.'):
+        self.date_column = date_column
+        self.name_column = name_column
+        self.value_column = value_column
+        self.description_column = description_column
+        self.delimiter = delimiter
+        self.date_format = date_format
+        self.decimal_separator = decimal_separator
+
+    def parse(self, stream):
+        """
+        Yield (line number, operation fields, error) for every line
+
+        The stream is read one line at a time, so the size of the file does
+        not matter. Either the fields or the error is None.
+        """
+        reader = csv.DictReader(stream, delimiter=self.delimiter)
+        missing = {
+            self.date_column, self.name_column, self.value_column
+        } - set(reader.fieldnames or ())
+        if missing:
+            raise StatementLineError(
+                f'Missing columns: {", ".join(sorted(missing))}.'
+            )
+
+        rows = iter(reader)
+        while True:
+            try:
+                row = next(rows)
+            except StopIteration:
+                return
+            except csv.Error as error:
+                raise StatementLineError(f'Line {reader.line_num}: {error}')
+            try:
+                fields = clean_line(
+                    self._parse_date(row[self.date_column]),
+                    row[self.name_column],
+                    row.get(self.description_column),
+                    self._parse_value(row[self.value_column])
+                )
+            except StatementLineError as error:
+                yield reader.line_num, None, str(error)
+            else:
+                yield reader.line_num, fields, None
+
+    def _parse_date(self, value):
+        value = (value or '').strip()
+        try:
+            if self.date_format == '%Y-%m-%d':
+                return date.fromisoformat(value)
+            return datetime.strptime(value, self.date_format).date()
+        except ValueError:
+            raise StatementLineError(f'Invalid date "{value}".')
+
+    def _parse_value(self, value):
+        value = (value or '').strip()
+        if self.decimal_separator != '.':
+            value = value.replace('.', '').replace(self.decimal_separator, '.')
+        try:
+            return Decimal(value.replace(',', ''))
+        except InvalidOperation:
+            raise StatementLineError(f'Invalid value "{value}".')
+
+
+class OFXStatementParser:
+    """
+    Parse bank statements in the OFX format, both SGML and XML flavours
+
+    The file is tokenized in fixed-size chunks and every STMTTRN aggregate
+    becomes an operation, with NAME as name and MEMO as description.
+    """
+    token = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+    chunk_size = 64 * 1024
+
+    def parse(self, stream):
+        """Yield (transaction number, operation fields, error)"""
+        number, transaction = 0, None
+        for closing, tag, text in self._tokens(stream):
+            if tag == 'STMTTRN':
+                if transaction is not None:
+                    yield self._clean(number, transaction)
+                    transaction = None
+                if not closing:
+                    number += 1
+                    transaction = {}
+            elif transaction is not None and not closing:
+                transaction[tag] = text
+        if transaction is not None:
+            yield self._clean(number, transaction)
+
+    def _tokens(self, stream):
+        """Yield (closing, tag, text) for every tag of the stream"""
+        buffer = ''
+        while True:
+            chunk = stream.read(self.chunk_size)
+            buffer += chunk
+            end = buffer.rfind('<') if chunk else len(buffer)
+            if end < 0:
+                end = 0
+            for match in self.token.finditer(buffer, 0, end):
+                closing, tag, text = match.groups()
+                yield closing == '/', tag.upper(), text.strip()
+            buffer = buffer[end:]
+            if not chunk:
+                return
+
+    def _clean(self, number, transaction):
+        try:
+            posted = transaction.get('DTPOSTED', '')
+            try:
+                posted = datetime.strptime(posted[:8], '%Y%m%d').date()
+            except ValueError:
+                raise StatementLineError(f'Invalid date "{posted}".')
+            amount = transaction.get('TRNAMT', '').replace(',', '.')
+            try:
+                amount = Decimal(amount)
+            except InvalidOperation:
+                raise StatementLineError(f'Invalid value "{amount}".')
+            fields = clean_line(
+                posted,
+                transaction.get('NAME') or transaction.get('PAYEE') or
+                transaction.get('MEMO'),
+                transaction.get('MEMO', ''),
+                amount
+            )
+        except StatementLineError as error:
+            return number, None, str(error)
+
+        return number, fields, None
+
+
+PARSERS = {
+    'csv': CSVStatementParser,
+    'ofx': OFXStatementParser,
+}
@@ -0,0 +1,75 @@
+import codecs
+
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import serializers
+
+from core.metrics import TimedSerializerMixin
+from core.models import Account
+
+from statement.parsers import PARSERS
+
+
+class StatementImportSerializer(TimedSerializerMixin,
+                                serializers.Serializer):
+    """Serializer for a statement file uploaded for import"""
+    file = serializers.FileField()
+    account = serializers.PrimaryKeyRelatedField(
+        queryset=Account.objects.all()
+    )
+    file_format = serializers.ChoiceField(
+        choices=sorted(PARSERS),
+        required=False
+    )
+    encoding = serializers.CharField(default='utf-8-sig')
+    delimiter = serializers.CharField(default=',', max_length=1)
+    date_format = serializers.CharField(default='%Y-%m-%d')
+    decimal_separator = serializers.ChoiceField(
+        choices=('.', ','),
+        default='.'
+    )
+    date_column = serializers.CharField(default='date')
+    name_column = serializers.CharField(default='name')
+    value_column = serializers.CharField(default='value')
+    description_column = serializers.CharField(default='description')
+
+    def validate_encoding(self, encoding):
+        """Only allow encodings Python knows about"""
+        try:
+            codecs.lookup(encoding)
+        except LookupError:
+            raise serializers.ValidationError(_('Unknown encoding.'))
+        return encoding
+
+    def validate_account(self, account):
+        """Only allow importing into accounts of the user"""
+        if account.user_id != self.context['request'].user.id:
+            msg = _('Invalid pk "{pk_value}" - object does not exist.')
+            raise serializers.ValidationError(msg.format(pk_value=account.pk))
+        return account
+
+    def validate(self, attrs):
+        """Guess the format of the file from its name when not given"""
+        if 'file_format' not in attrs:
+            extension = attrs['file'].name.rsplit('.', 1)[-1].lower()
+            if extension not in PARSERS:
+                raise serializers.ValidationError(
+                    {'file_format': _('Unable to guess the file format.')}
+                )
+            attrs['file_format'] = extension
+        return attrs
+
+    def get_parser(self):
+        """Return the parser configured by the validated options"""
+        data = self.validated_data
+        if data['file_format'] == 'csv':
+            return PARSERS['csv'](
+                date_column=data['date_column'],
+                name_column=data['name_column'],
+                value_column=data['value_column'],
+                description_column=data['description_column'],
+                delimiter=data['delimiter'],
+                date_format=data['date_format'],
+                decimal_separator=data['decimal_separator'],
+            )
+        return PARSERS[data['file_format']]()
@@ -0,0 +1,354 @@
+import os
+import tempfile
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.urls import reverse
+from django.test import TestCase
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Account, AccountBalance, Operation
+from core.versions import current_version
+
+from statement.importer import import_statement
+from statement.parsers import (CSVStatementParser, OFXStatementParser,
+                               StatementLineError, clean_line)
+
+
+IMPORT_URL = reverse('statement:import')
+
+SAMPLE_CSV = (
+    'date,name,description,value\n'
+    '2021-01-02,Supermarket,Weekly groceries,-50.25\n'
+    '2021-01-03,Salary,,1000.00\n'
+    'not a date,Broken,,10.00\n'
+    '2021-01-04,Broken,,ten\n'
+)
+
+SAMPLE_SGML_OFX = (
+    'OFXHEADER:100\nDATA:OFXSGML\nVERSION:102\n\n'
+    '<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>\n'
+    '<STMTTRN>\n<TRNTYPE>DEBIT\n<DTPOSTED>20210105120000[-3:BRT]\n'
+    '<TRNAMT>-12.50\n<FITID>1\n<NAME>Bakery\n<MEMO>Bread\n'
+    '<STMTTRN>\n<TRNTYPE>CREDIT\n<DTPOSTED>20210106\n'
+    '<TRNAMT>20,00\n<FITID>2\n<PAYEE>Refund\n'
+    '</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>\n'
+)
+
+SAMPLE_XML_OFX = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<OFX><BANKTRANLIST>'
+    '<STMTTRN><DTPOSTED>20210107</DTPOSTED><TRNAMT>-3.10</TRNAMT>'
+    '<NAME>Coffee</NAME></STMTTRN>'
+    '<STMTTRN><DTPOSTED>2021</DTPOSTED><TRNAMT>1</TRNAMT>'
+    '<NAME>Broken</NAME></STMTTRN>'
+    '</BANKTRANLIST></OFX>'
+)
+
+
+def sample_account(user, name='Sample Account'):
+    """Create and return a sample account"""
+    return Account.objects.create(user=user, name=name)
+
+
+class StatementParserTests(TestCase):
+    """Test parsing statement files"""
+
+    def test_parse_csv(self):
+        """Test valid lines become operation fields and others errors"""
+        lines = list(CSVStatementParser().parse(StringIO(SAMPLE_CSV)))
+
+        self.assertEqual(len(lines), 4)
+        line, fields, error = lines[0]
+        self.assertEqual(line, 2)
+        self.assertIsNone(error)
+        self.assertEqual(fields, {
+            'date': date(2021, 1, 2),
+            'name': 'Supermarket',
+            'description': 'Weekly groceries',
+            'value': Decimal('-50.25'),
+        })
+        self.assertIsNone(lines[1][2])
+        self.assertEqual(lines[2][0], 4)
+        self.assertIn('Invalid date', lines[2][2])
+        self.assertIn('Invalid value', lines[3][2])
+
+    def test_parse_csv_local_format(self):
+        """Test parsing a CSV with custom columns and number format"""
+        stream = StringIO('Data;Historico;Valor\n05/01/2021;Rent;-1.234,56\n')
+        parser = CSVStatementParser(
+            date_column='Data',
+            name_column='Historico',
+            value_column='Valor',
+            delimiter=';',
+            date_format='%d/%m/%Y',
+            decimal_separator=','
+        )
+
+        (_, fields, error), = parser.parse(stream)
+
+        self.assertIsNone(error)
+        self.assertEqual(fields['date'], date(2021, 1, 5))
+        self.assertEqual(fields['value'], Decimal('-1234.56'))
+        self.assertEqual(fields['description'], '')
+
+    def test_parse_csv_missing_columns(self):
+        """Test a CSV without the required columns is rejected"""
+        with self.assertRaises(StatementLineError):
+            list(CSVStatementParser().parse(StringIO('date,value\n')))
+
+    def test_clean_line_checks_the_rounded_value(self):
+        """Test values rounding up to the limit are too large"""
+        day = date(2021, 1, 1)
+
+        fields = clean_line(day, 'Rent', '', Decimal('9999.994'))
+        self.assertEqual(fields['value'], Decimal('9999.99'))
+        for value in ('9999.995', '-9999.995', '1E+30'):
+            with self.assertRaisesMessage(StatementLineError, 'too large'):
+                clean_line(day, 'Rent', '', Decimal(value))
+
+    def test_parse_sgml_ofx(self):
+        """Test parsing the SGML flavour of OFX"""
+        lines = list(OFXStatementParser().parse(StringIO(SAMPLE_SGML_OFX)))
+
+        self.assertEqual(lines, [
+            (1, {
+                'date': date(2021, 1, 5),
+                'name': 'Bakery',
+                'description': 'Bread',
+                'value': Decimal('-12.50'),
+            }, None),
+            (2, {
+                'date': date(2021, 1, 6),
+                'name': 'Refund',
+                'description': '',
+                'value': Decimal('20.00'),
+            }, None),
+        ])
+
+    def test_parse_xml_ofx_in_small_chunks(self):
+        """Test tags split across chunks are parsed"""
+        parser = OFXStatementParser()
+        parser.chunk_size = 7
+
+        lines = list(parser.parse(StringIO(SAMPLE_XML_OFX)))
+
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(lines[0][1]['name'], 'Coffee')
+        self.assertEqual(lines[0][1]['value'], Decimal('-3.10'))
+        self.assertIsNone(lines[1][1])
+        self.assertIn('Invalid date', lines[1][2])
+
+
+class StatementImportApiTests(TestCase):
+    """Test importing statements through the API"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'sample_user@gmail.com',
+            'testpass123'
+        )
+        self.client.force_authenticate(self.user)
+        self.account = sample_account(user=self.user)
+
+    def test_login_required(self):
+        """Test that authentication is required to import"""
+        res = APIClient().post(IMPORT_URL, {})
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_import_csv(self):
+        """Test importing a CSV creates the valid operations"""
+        upload = SimpleUploadedFile('statement.csv', SAMPLE_CSV.encode())
+
+        res = self.client.post(
+            IMPORT_URL,
+            {'file': upload, 'account': self.account.id},
+            format='multipart'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['created'], 2)
+        self.assertEqual(res.data['failed'], 2)
+        self.assertEqual([e['line'] for e in res.data['errors']], [4, 5])
+        self.assertIn('rows_per_second', res.data)
+        operations = Operation.objects.filter(account=self.account)
+        self.assertEqual(operations.count(), 2)
+        self.assertTrue(operations.filter(user=self.user).exists())
+        balance = AccountBalance.objects.get(account=self.account)
+        self.assertEqual(balance.balance, Decimal('949.75'))
+
+    def test_import_twice(self):
+        """Test importing the same statement again skips its lines"""
+        statement = SAMPLE_CSV + '2021-01-03,Salary,,1000.00\n'
+        version = current_version(self.user.id)
+        for _ in range(2):
+            res = self.client.post(
+                IMPORT_URL,
+                {'file': SimpleUploadedFile('s.csv', statement.encode()),
+                 'account': self.account.id},
+                format='multipart'
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['created'], 0)
+        self.assertEqual(res.data['skipped'], 3)
+        self.assertEqual(current_version(self.user.id), version + 1)
+        self.assertEqual(
+            Operation.objects.filter(account=self.account).count(), 3
+        )
+        balance = AccountBalance.objects.get(account=self.account)
+        self.assertEqual(balance.balance, Decimal('1949.75'))
+
+    def test_import_skips_operations_created_one_at_a_time(self):
+        """Test importing skips lines already entered through the API"""
+        self.client.post(reverse('operation:operation-list'), {
+            'name': 'Salary',
+            'value': '1000.00',
+            'date': '2021-01-03',
+            'account': self.account.id,
+            'tags': [],
+        }, format='json')
+
+        res = self.client.post(
+            IMPORT_URL,
+            {'file': SimpleUploadedFile('s.csv', SAMPLE_CSV.encode()),
+             'account': self.account.id},
+            format='multipart'
+        )
+
+        self.assertEqual(res.data['created'], 1)
+        self.assertEqual(res.data['skipped'], 1)
+        self.assertEqual(
+            Operation.objects.filter(account=self.account).count(), 2
+        )
+
+    def test_import_ofx(self):
+        """Test importing an OFX file guessed from its extension"""
+        upload = SimpleUploadedFile(
+            'statement.ofx', SAMPLE_SGML_OFX.encode('latin-1')
+        )
+
+        res = self.client.post(
+            IMPORT_URL,
+            {'file': upload, 'account': self.account.id,
+             'encoding': 'latin-1'},
+            format='multipart'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['created'], 2)
+        self.assertEqual(
+            Operation.objects.filter(account=self.account).count(), 2
+        )
+
+    def test_import_in_batches(self):
+        """Test a statement larger than a batch is fully imported"""
+        stream = StringIO('date,name,value\n' + ''.join(
+            f'2021-02-{day:02d},Line {day},1.00\n' for day in range(1, 29)
+        ))
+
+        report = import_statement(
+            self.user,
+            self.account,
+            CSVStatementParser().parse(stream),
+            batch_size=10
+        )
+
+        self.assertEqual(report.created, 28)
+        self.assertEqual(report.failed, 0)
+        balance = AccountBalance.objects.get(account=self.account)
+        self.assertEqual(balance.balance, Decimal('28.00'))
+
+    def test_import_other_user_account(self):
+        """Test importing into an account of another user fails"""
+        other = get_user_model().objects.create_user(
+            'other@gmail.com',
+            'testpass123'
+        )
+        account = sample_account(user=other)
+        upload = SimpleUploadedFile('statement.csv', SAMPLE_CSV.encode())
+
+        res = self.client.post(
+            IMPORT_URL,
+            {'file': upload, 'account': account.id},
+            format='multipart'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Operation.objects.exists())
+
+    def test_import_unknown_format(self):
+        """Test a file whose format cannot be guessed is rejected"""
+        upload = SimpleUploadedFile('statement.txt', SAMPLE_CSV.encode())
+
+        res = self.client.post(
+            IMPORT_URL,
+            {'file': upload, 'account': self.account.id},
+            format='multipart'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('file_format', res.data)
+
+    def test_import_missing_columns(self):
+        """Test a CSV without the required columns is rejected"""
+        upload = SimpleUploadedFile('statement.csv', b'when,what\n')
+
+        res = self.client.post(
+            IMPORT_URL,
+            {'file': upload, 'account': self.account.id},
+            format='multipart'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('file', res.data)
+
+
+class ImportStatementCommandTests(TestCase):
+    """Test the import_statement command"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'sample_user@gmail.com',
+            'testpass123'
+        )
+        self.account = sample_account(user=self.user)
+        handle, self.path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(handle, 'w') as statement:
+            statement.write(SAMPLE_CSV)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_import_statement(self):
+        """Test the command imports the file and reports the throughput"""
+        out, err = StringIO(), StringIO()
+
+        call_command(
+            'import_statement', self.path,
+            account=self.account.id, batch_size=1, stdout=out, stderr=err
+        )
+
+        self.assertIn(
+            'Imported 2 operations, 0 already imported, 2 failed',
+            out.getvalue()
+        )
+        self.assertIn('rows/s', out.getvalue())
+        self.assertIn('Line 4:', err.getvalue())
+        self.assertEqual(
+            Operation.objects.filter(account=self.account).count(), 2
+        )
+
+    def test_import_statement_unknown_account(self):
+        """Test the command fails for an unknown account"""
+        with self.assertRaises(CommandError):
+            call_command('import_statement', self.path, account=0)
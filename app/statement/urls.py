@@ -0,0 +1,10 @@
+from django.urls import path
+
+from statement import views
+
+
+app_name = 'statement'
+
+urlpatterns = [
+    path('import/', views.StatementImportView.as_view(), name='import'),
+]
@@ -0,0 +1,37 @@
+from rest_framework import generics, status
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from statement.importer import import_statement, text_stream
+from statement.parsers import StatementLineError
+from statement.serializers import StatementImportSerializer
+
+
+class StatementImportView(generics.GenericAPIView):
+    """Import the operations of a bank statement into an account"""
+    serializer_class = StatementImportSerializer
+    permission_classes = (IsAuthenticated,)
+    parser_classes = (MultiPartParser,)
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        stream = text_stream(data['file'].file, data['encoding'])
+        try:
+            report = import_statement(
+                request.user,
+                data['account'],
+                serializer.get_parser().parse(stream)
+            )
+        except StatementLineError as error:
+            return Response(
+                data={'file': [str(error)]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        finally:
+            stream.detach()
+
+        return Response(data=report.as_dict(), status=status.HTTP_201_CREATED)
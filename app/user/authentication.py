@@ -0,0 +1,71 @@
+import hashlib
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import router
+
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+TOKEN_CACHE = 'tokens'
+CACHED_USER_FIELDS = {
+    'id', 'email', 'name', 'is_active', 'is_staff', 'is_superuser'
+}
+
+
+def _cached_fields(user_model):
+    """Return the cached user fields, in the order from_db() expects"""
+    return [
+        field.attname for field in user_model._meta.concrete_fields
+        if field.attname in CACHED_USER_FIELDS
+    ]
+
+
+def token_cache_key(key):
+    """Return the cache key of a token, which does not reveal the token"""
+    return f'token:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def forget_tokens(keys):
+    """Drop the cached users of the given token keys"""
+    caches[TOKEN_CACHE].delete_many([token_cache_key(key) for key in keys])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication that caches the user of each token
+
+    Only active users are cached, without their password, and the entries
+    are dropped when their token is deleted or their user is saved, so a
+    password change or deactivation takes effect on the next request.
+    Changes that skip save(), such as queryset updates, are picked up when
+    the entry expires after TOKEN_CACHE_TIMEOUT.
+    """
+
+    def authenticate_credentials(self, key):
+        cache = caches[TOKEN_CACHE]
+        cache_key = token_cache_key(key)
+        user_model = get_user_model()
+        fields = _cached_fields(user_model)
+        cached = cache.get(cache_key)
+        if cached is None:
+            user, token = super().authenticate_credentials(key)
+            cache.set(cache_key, (
+                [getattr(user, name) for name in fields],
+                token.created
+            ))
+            return user, token
+
+        values, created = cached
+        user = user_model.from_db(
+            router.db_for_read(user_model), fields, values
+        )
+        token = Token.from_db(
+            router.db_for_read(Token),
+            ('key', 'user_id', 'created'),
+            (key, user.pk, created)
+        )
+        token.user = user
+
+        return user, token
@@ -0,0 +1,22 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from rest_framework.authtoken.models import Token
+
+from user.authentication import forget_tokens
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    """Stop authenticating with a deleted token at once"""
+    forget_tokens([instance.key])
+
+
+@receiver(post_save, sender=get_user_model())
+def forget_user_tokens(sender, instance, created, using, **kwargs):
+    """Drop the cached copies of a saved user, such as a new password"""
+    if not created:
+        forget_tokens(Token.objects.using(using).filter(
+            user_id=instance.pk
+        ).values_list('key', flat=True))
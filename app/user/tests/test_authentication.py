@@ -0,0 +1,79 @@
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from user.authentication import TOKEN_CACHE
+
+
+ME_URL = reverse('user:me')
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Test authenticating with tokens whose users are cached"""
+
+    def setUp(self):
+        caches[TOKEN_CACHE].clear()
+        self.user = get_user_model().objects.create_user(
+            'test@gmail.com',
+            'testpass',
+            name='Test name'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_cached_token_skips_the_query(self):
+        """Test the user of a token is read from the database once"""
+        with self.assertNumQueries(1):
+            self.client.get(ME_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['email'], self.user.email)
+
+    def test_invalid_token(self):
+        """Test an unknown token is rejected and not cached"""
+        self.client.credentials(HTTP_AUTHORIZATION='Token invalid')
+
+        for _ in range(2):
+            res = self.client.get(ME_URL)
+
+            self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_token_is_rejected(self):
+        """Test a deleted token stops working at once"""
+        self.client.get(ME_URL)
+        self.token.delete()
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_is_rejected(self):
+        """Test the token of a deactivated user stops working at once"""
+        self.client.get(ME_URL)
+        self.user.is_active = False
+        self.user.save()
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_change_drops_the_cached_user(self):
+        """Test changing the password reads the user again"""
+        self.client.get(ME_URL)
+
+        res = self.client.patch(ME_URL, {'password': 'newPass123'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(1):
+            self.client.get(ME_URL)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('newPass123'))